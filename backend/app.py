@@ -1,150 +1,289 @@
-
-
-
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, Response, stream_with_context
 from flask_cors import CORS
+from werkzeug.local import LocalProxy
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split, cross_val_score
-from sklearn.preprocessing import StandardScaler, MinMaxScaler, LabelEncoder, RobustScaler
-from sklearn.linear_model import LogisticRegression
-from sklearn.tree import DecisionTreeClassifier
-from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
-from sklearn.svm import SVC
-from sklearn.neighbors import KNeighborsClassifier
-from sklearn.metrics import (
-    accuracy_score, precision_score, recall_score, f1_score, 
-    confusion_matrix, classification_report
-)
-import io
-import base64
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import seaborn as sns
+import os
+import re
+import threading
+import time
+import uuid
 import warnings
+from concurrent.futures import as_completed
+from contextlib import contextmanager
 import traceback
 
+from sessions import SessionStore, SESSION_COOKIE, SESSION_HEADER, estimate_nbytes, default_session_state
+from jobs import JobManager, JobCancelled, JobQueueFull
+from training import (
+    build_model, train_and_evaluate, cross_validate_job, limit_threads, job_cores,
+    MODEL_TYPES, INCREMENTAL_MODEL_TYPES, NON_NEGATIVE_MODEL_TYPES
+)
+from cache import LRUCache, stage_key, params_key
+from incremental import train_incremental
+from preprocessing import FeaturePipeline, HashSplit, IndexSplit, MISSING_STRATEGIES
+from encoders import ENCODINGS, HASH_BUCKETS, HASH_BUCKETS_MAX
+from search import search_and_train, SEARCH_METHODS, SEARCH_WORKERS
+from ingest import read_csv_streaming, sniff_encoding
+from artifacts import ModelArtifact
+from registry import ModelRegistry, ModelNotFound
+from serialization import (
+    to_jsonable, records, dumps_json, dumps_msgpack, wants_msgpack, arrow_stream,
+    JSON_MIMETYPE, MSGPACK_MIMETYPES, ARROW_MIMETYPE
+)
+from plots import PlotRenderer, PLOT_KINDS, available_plots, evaluation_from_response
+from profiling import profile_frame, profile_batches
+from datasets import DatasetCache, DatasetMissing
+from telemetry import (
+    telemetry, span, Stopwatch, begin_trace, end_trace, server_timing,
+    current_rss, peak_rss, reset_peak_rss, MEMORY_BUCKETS
+)
+
 warnings.filterwarnings('ignore')
 
 app = Flask(__name__)
-CORS(app)
-
-
-def convert_to_serializable(obj):
-    """Recursively convert numpy types to Python native types"""
-    if obj is None:
-        return None
-    elif isinstance(obj, dict):
-        return {str(key): convert_to_serializable(value) for key, value in obj.items()}
-    elif isinstance(obj, (list, tuple)):
-        return [convert_to_serializable(item) for item in obj]
-    elif isinstance(obj, np.integer):
-        return int(obj)
-    elif isinstance(obj, np.floating):
-        if np.isnan(obj) or np.isinf(obj):
-            return None
-        return float(obj)
-    elif isinstance(obj, np.bool_):
-        return bool(obj)
-    elif isinstance(obj, np.ndarray):
-        return [convert_to_serializable(item) for item in obj.tolist()]
-    elif isinstance(obj, (pd.Timestamp, pd.Timedelta)):
-        return str(obj)
-    elif isinstance(obj, float):
-        if np.isnan(obj) or np.isinf(obj):
-            return None
-        return float(obj)
-    elif isinstance(obj, bool):
-        return bool(obj)
-    elif isinstance(obj, int):
-        return int(obj)
-    elif isinstance(obj, str):
-        return str(obj)
-    elif pd.isna(obj):
-        return None
-    else:
-        try:
-            return str(obj)
-        except:
-            return None
+PROFILE_HEADER = 'X-Profile'
+CORS(app, supports_credentials=True, expose_headers=[SESSION_HEADER, 'Server-Timing', 'X-Profile-File'])
 
 
 def safe_jsonify(data):
-    """Safely convert data to JSON-serializable format"""
+    """Serialize a response as JSON, or as MessagePack when the client asks for it"""
     try:
-        converted = convert_to_serializable(data)
-        return jsonify(converted)
+        with span('serialize'):
+            if wants_msgpack(request.accept_mimetypes):
+                response = Response(dumps_msgpack(data), mimetype=MSGPACK_MIMETYPES[0])
+            else:
+                response = Response(dumps_json(data), mimetype=JSON_MIMETYPE)
+        response.vary.add('Accept')
+        return response
     except Exception as e:
         print(f"JSON serialization error: {e}")
         traceback.print_exc()
         return jsonify({'error': f'Serialization error: {str(e)}'}), 500
 
 
-# Global storage for session data
-session_data = {}
+# Per-client session storage
+session_store = SessionStore.from_env()
 
+# Parsed uploads, stored on disk by content hash
+dataset_cache = DatasetCache()
+model_registry = ModelRegistry()
+# Result plots, rendered off the request path and cached by model id
+plot_renderer = PlotRenderer()
 
-def reset_session():
-    """Reset all session data"""
-    global session_data
-    session_data = {
-        'original_df': None,
-        'processed_df': None,
-        'X_train': None,
-        'X_test': None,
-        'y_train': None,
-        'y_test': None,
-        'target_column': None,
-        'feature_columns': None,
-        'scaler': None,
-        'model': None,
-        'label_encoder': None,
-        'feature_encoders': {}
-    }
+# Default for the preprocess "compact" option: float32 features, small integer
+# labels and categorical string columns
+COMPACT_DTYPES = os.environ.get('COMPACT_DTYPES', '').lower() in ['1', 'true', 'yes', 'on']
+
+# Cross-validation scores keyed by (split, model type, estimator params)
+cv_cache = LRUCache(int(os.environ.get('CV_CACHE_ENTRIES', 1000)))
+CV_WORKERS = int(os.environ.get('CV_WORKERS', min(5, os.cpu_count() or 1)))
 
+# Preprocess and split outputs keyed by stage_key(upstream key, request params),
+# so flipping back to a previous option is a lookup instead of a recompute
+stage_cache = LRUCache(
+    max_entries=int(os.environ.get('STAGE_CACHE_ENTRIES', 64)),
+    max_bytes=int(float(os.environ.get('STAGE_CACHE_MB', 512)) * 1024 * 1024),
+    sizeof=lambda entry: estimate_nbytes(entry['state'])
+)
+# Training responses by (split, model, params); the fitted model lives in the registry
+train_cache = LRUCache(int(os.environ.get('TRAIN_CACHE_ENTRIES', 256)))
+
+PREPROCESS_STATE = [
+    'feature_pipeline', 'streaming', 'preprocess_key', 'X', 'y', 'scaler',
+    'label_encoder', 'feature_encoders', 'target_column', 'feature_columns'
+]
+SPLIT_STATE = ['split', 'stream_split', 'split_id']
+
+# Process pool for training jobs
+job_manager = JobManager()
+
+# Resolves to the data dict of the session bound to the current request
+session_data = LocalProxy(lambda: g.session.data)
+
+# Requests carrying the X-Profile header are run under cProfile when this is
+# on; the stats are written to PROFILE_DIR and named in X-Profile-File
+PROFILE_REQUESTS = os.environ.get('PROFILE_REQUESTS', '').lower() in ['1', 'true', 'yes', 'on']
+PROFILE_DIR = os.environ.get(
+    'PROFILE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'profiles')
+)
 
-# Initialize session
-reset_session()
+# Probed by monitoring without a session cookie; they only read the client's
+# session, if any, and never bind or create one
+SESSIONLESS_ENDPOINTS = ['metrics', 'health_check']
 
+_in_flight = 0
+_in_flight_lock = threading.Lock()
 
-def detect_column_type(series):
-    """Detect the semantic type of a column"""
+
+@app.before_request
+def start_request_timing():
+    """Open the request's trace, reset the memory high-water mark and start cProfile if asked"""
+    global _in_flight
+    g.started = time.perf_counter()
+    begin_trace()
+    with _in_flight_lock:
+        _in_flight += 1
+        g.in_flight = True
+        # Only reset when no other request is running, so theirs keep their peak
+        g.peak_tracked = _in_flight > 1 or reset_peak_rss()
+    if PROFILE_REQUESTS and request.headers.get(PROFILE_HEADER):
+        import cProfile
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+@app.before_request
+def load_session():
+    """Bind the client's session to this request and lock it"""
+    # CORS preflights carry no cookie and never touch session state
+    if request.method == 'OPTIONS' or request.endpoint in SESSIONLESS_ENDPOINTS:
+        return
+    g.session = session_store.acquire(client_session_id())
+
+
+def client_session_id():
+    return request.headers.get(SESSION_HEADER) or request.cookies.get(SESSION_COOKIE)
+
+
+@app.after_request
+def save_session(response):
+    """Hand the session ID back to the client"""
+    session = g.get('session')
+    if session is not None:
+        response.headers[SESSION_HEADER] = session.id
+        if request.cookies.get(SESSION_COOKIE) != session.id:
+            response.set_cookie(
+                SESSION_COOKIE, session.id, max_age=session_store.ttl_seconds,
+                httponly=True, samesite='Lax'
+            )
+    return response
+
+
+@app.after_request
+def finish_request_timing(response):
+    """
+    Record the request's latency and peak memory, and report its stages as Server-Timing.
+
+    Streamed bodies (predictions) are generated after this point, so their
+    time shows up in the stage histograms but not in the request latency.
+    """
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        route = re.sub(r'[^A-Za-z0-9]+', '-', request.path).strip('-') or 'root'
+        name = f'{route}-{time.strftime("%Y%m%d-%H%M%S")}-{uuid.uuid4().hex[:8]}.prof'
+        profiler.dump_stats(os.path.join(PROFILE_DIR, name))
+        response.headers['X-Profile-File'] = name
+    
+    started = g.pop('started', None)
+    if started is None:
+        return response
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    telemetry.observe('http_request_duration_seconds', time.perf_counter() - started,
+                      {'method': request.method, 'route': route, 'status': str(response.status_code)},
+                      help_text='Request latency, up to the start of the response body.')
+    if g.pop('peak_tracked', False):
+        telemetry.observe('http_request_peak_rss_bytes', peak_rss(), {'route': route}, MEMORY_BUCKETS,
+                          help_text='Process RSS high-water mark while the request ran.')
+    spans = end_trace()
+    if spans:
+        response.headers['Server-Timing'] = server_timing(spans)
+    return response
+
+
+@app.teardown_request
+def release_session(exc):
+    session = g.pop('session', None)
+    if session is not None:
+        session_store.release(session)
+
+
+def release_session_early():
+    """
+    Unlock the request's session while its response streams, so the
+    client's other requests (status polls, cancels) are not blocked.
+    session_data is unbound until relock_session() binds it again.
+    """
+    session = g.pop('session', None)
+    if session is not None:
+        session_store.release(session)
+    return session
+
+
+@contextmanager
+def relock_session(session):
+    """Bind and lock a session released by release_session_early() for a short update"""
+    session_store.reacquire(session)
+    g.session = session
     try:
-        non_null = series.dropna()
-        
-        if len(non_null) == 0:
-            return 'empty'
-        
-        if pd.api.types.is_numeric_dtype(series):
-            unique_count = non_null.nunique()
-            if unique_count <= 10 and unique_count < len(non_null) * 0.05:
-                return 'categorical_numeric'
-            return 'numeric'
-        
-        if pd.api.types.is_datetime64_any_dtype(series):
-            return 'datetime'
-        
-        if series.dtype == 'object' or str(series.dtype) == 'category':
-            unique_count = non_null.nunique()
-            
-            try:
-                numeric_series = pd.to_numeric(non_null, errors='coerce')
-                valid_numeric = numeric_series.notna().sum()
-                if valid_numeric / len(non_null) > 0.8:
-                    return 'numeric_string'
-            except:
-                pass
-            
-            if unique_count <= 50 or unique_count / len(non_null) < 0.5:
-                return 'categorical'
-            
-            return 'text'
-        
-        return 'unknown'
-    except Exception as e:
-        print(f"Error detecting column type: {e}")
-        return 'unknown'
+        yield
+    finally:
+        g.pop('session', None)
+        session_store.release(session)
+
+
+@app.teardown_request
+def end_request_timing(exc):
+    global _in_flight
+    end_trace()
+    if g.pop('in_flight', False):
+        with _in_flight_lock:
+            _in_flight -= 1
+
+
+def remember_stage(key, names, response):
+    """Cache a stage's session outputs and response under its key"""
+    stage_cache.put(key, {'state': {name: session_data.get(name) for name in names}, 'response': response})
+    return response
+
+
+def restore_stage(key):
+    """Install a cached stage's outputs into the session; returns its response or None"""
+    entry = stage_cache.get(key)
+    if entry is None:
+        return None
+    session_data.update(entry['state'])
+    return entry['response']
+
+
+def data_id():
+    """Identity of the rows models train on: the current preprocessing and split"""
+    if session_data.get('split_id') is None:
+        return None
+    return stage_key('data', session_data.get('preprocess_key'), session_data.get('split_id'))
+
+
+def clear_split():
+    """Drop the session's split; it no longer matches once X and y are replaced"""
+    for name in SPLIT_STATE:
+        session_data[name] = None
+
+
+def feature_range_error(model_type):
+    """Why model_type cannot fit the current features, or None; checked before a job is queued"""
+    if model_type not in NON_NEGATIVE_MODEL_TYPES:
+        return None
+    pipeline = session_data['feature_pipeline']
+    X = session_data.get('X')
+    if pipeline.scaling_method in ['standard', 'robust']:
+        negative = True
+    elif X is not None:
+        negative = np.min(X.data if pipeline.sparse else X, initial=0) < 0
+    else:
+        # Streaming: only dense minmax scaling maps every value into [0, 1]
+        negative = pipeline.negative_ and (pipeline.scaling_method == 'none' or pipeline.sparse)
+    if negative:
+        setting = 'scalingMethod "minmax" and sparse false' if pipeline.sparse else 'scalingMethod "minmax"'
+        return f'Model "{model_type}" needs non-negative features. Preprocess with {setting} to use it.'
+    return None
+
+
+def reset_session():
+    """Reset all data for the current session"""
+    g.session.reset()
 
 
 def ensure_integer_labels(y):
@@ -167,10 +306,53 @@ def ensure_integer_labels(y):
             return np.array([mapping[val] for val in y], dtype=int)
     
     # For other types, use label encoding
+    from sklearn.preprocessing import LabelEncoder
     le = LabelEncoder()
     return le.fit_transform(y.astype(str))
 
 
+def build_upload_summary(sample_df, profile):
+    """Column info, sample rows and data quality for an upload, from its profile"""
+    column_info = []
+    for column in profile:
+        info = {
+            'name': str(column.name),
+            'type': str(column.type),
+            'dtype': str(column.dtype),
+            'nullCount': int(column.null_count),
+            'nullPercent': round(float(column.null_count / profile.rows * 100), 1),
+            'uniqueCount': int(column.unique_count),
+            'isNumeric': bool(column.is_numeric),
+            'isUsable': bool(column.is_usable),
+            'sampleValues': to_jsonable(list(column.sample_values))
+        }
+        if column.estimate is not None:
+            info['estimate'] = column.estimate
+        column_info.append(info)
+    
+    # Sample data
+    sample_data = records(sample_df, 10)
+    
+    total_nulls = profile.total_nulls
+    total_cells = int(profile.rows * len(profile))
+    
+    return to_jsonable({
+        'rows': int(profile.rows),
+        'columns': int(len(profile)),
+        'profileMode': profile.mode,
+        'columnInfo': column_info,
+        'sampleData': sample_data,
+        'dataQuality': {
+            'totalNulls': total_nulls,
+            'totalCells': total_cells,
+            'completeness': round(float((1 - total_nulls / total_cells) * 100), 1) if total_cells > 0 else 0.0,
+            'numericColumns': int(sum(1 for c in column_info if c.get('isNumeric', False))),
+            'categoricalColumns': int(sum(1 for c in column_info if c.get('type') == 'categorical')),
+            'usableColumns': int(sum(1 for c in column_info if c.get('isUsable', False)))
+        }
+    })
+
+
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
     try:
@@ -190,95 +372,81 @@ def upload_file():
         if not any(filename.endswith(ext) for ext in valid_extensions):
             return safe_jsonify({'error': 'Unsupported file format. Use CSV or Excel.'}), 400
         
-        try:
-            file.seek(0)
-            
-            if filename.endswith('.csv'):
-                encodings = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']
-                df = None
-                
-                for encoding in encodings:
-                    try:
-                        file.seek(0)
-                        df = pd.read_csv(file, encoding=encoding, low_memory=False)
-                        break
-                    except:
-                        continue
-                
-                if df is None:
-                    file.seek(0)
-                    df = pd.read_csv(file, encoding='utf-8', errors='ignore', low_memory=False)
-            else:
-                df = pd.read_excel(file, engine='openpyxl')
-                
-        except Exception as e:
-            return safe_jsonify({'error': f'Error reading file: {str(e)}'}), 400
-        
-        if df is None or df.empty:
-            return safe_jsonify({'error': 'The file is empty or could not be read.'}), 400
-        
-        # Clean data
-        df.columns = df.columns.astype(str).str.strip()
-        df = df.dropna(axis=1, how='all')
-        df = df.loc[:, ~df.columns.duplicated()]
-        
-        session_data['original_df'] = df.copy()
-        
-        # Analyze columns
-        column_info = []
-        for col in df.columns:
+        # Approximate profiling trades exact unique counts and type checks
+        # for sketches and a row sample on very large files
+        profile_mode = str(request.form.get('profileMode', request.args.get('profileMode', 'exact'))).lower()
+        if profile_mode not in ['exact', 'approximate']:
+            return safe_jsonify({'error': 'profileMode must be "exact" or "approximate".'}), 400
+        profile_options = {}
+        if profile_mode == 'approximate':
             try:
-                col_type = detect_column_type(df[col])
-                null_count = int(df[col].isnull().sum())
-                null_percent = round(float(null_count / len(df) * 100), 1)
-                unique_count = int(df[col].nunique())
-                
-                is_numeric = col_type in ['numeric', 'numeric_string', 'categorical_numeric']
-                is_usable = col_type not in ['empty', 'text', 'datetime', 'unknown']
-                
-                sample_values = []
-                for val in df[col].dropna().head(3).tolist():
-                    sample_values.append(convert_to_serializable(val))
+                sample_size = int(request.form.get('sampleSize', request.args.get('sampleSize', 10000)))
+            except (TypeError, ValueError):
+                return safe_jsonify({'error': 'sampleSize must be an integer.'}), 400
+            profile_options = {'approximate': True, 'sample_size': max(1000, min(sample_size, 1000000))}
+        
+        kind = 'csv' if filename.endswith('.csv') else 'excel'
+        dataset_key = dataset_cache.content_key(file.stream, kind)
+        dataset = dataset_cache.get(dataset_key)
+        
+        if dataset is not None:
+            print(f"Re-using cached dataset {dataset_key[:12]} for {file.filename}")
+            if profile_mode == 'exact' and dataset.profile.mode != 'exact':
+                # Cached with an approximate profile; compute exact stats from the stored columns
+                dtypes = dataset.schema.empty_table().to_pandas().dtypes
+                with span('profile'):
+                    profile = profile_batches(dataset.iter_batches(), dataset.columns, dtypes)
+                sample_df = dataset.read_table().slice(0, 10).to_pandas()
+                dataset_cache.update_profile(dataset, build_upload_summary(sample_df, profile), profile)
+        else:
+            writer = None
+            try:
+                file.seek(0)
                 
-                column_info.append({
-                    'name': str(col),
-                    'type': str(col_type),
-                    'dtype': str(df[col].dtype),
-                    'nullCount': null_count,
-                    'nullPercent': null_percent,
-                    'uniqueCount': unique_count,
-                    'isNumeric': bool(is_numeric),
-                    'isUsable': bool(is_usable),
-                    'sampleValues': sample_values
-                })
+                if kind == 'csv':
+                    # Single chunked pass: parses, stores and collects column stats
+                    # together, so 'parse' includes the nested 'profile' stage
+                    with span('parse'):
+                        writer, profile, encoding = read_csv_streaming(
+                            file.stream, lambda: dataset_cache.writer(dataset_key), **profile_options
+                        )
+                    print(f"Parsed {file.filename} as {encoding}")
+                    if writer is None:
+                        return safe_jsonify({'error': 'The file is empty or could not be read.'}), 400
+                else:
+                    with span('parse'):
+                        df = pd.read_excel(file, engine='openpyxl')
+                        
+                        # Clean data
+                        df.columns = df.columns.astype(str).str.strip()
+                        df = df.dropna(axis=1, how='all')
+                        df = df.loc[:, ~df.columns.duplicated()]
+                    with span('profile'):
+                        profile = profile_frame(df, **profile_options)
+                    
             except Exception as e:
-                print(f"Error processing column {col}: {e}")
-                continue
-        
-        # Sample data
-        sample_data = []
-        for _, row in df.head(10).iterrows():
-            row_dict = {str(col): convert_to_serializable(row[col]) for col in df.columns}
-            sample_data.append(row_dict)
+                return safe_jsonify({'error': f'Error reading file: {str(e)}'}), 400
+            
+            if writer is not None:
+                try:
+                    dataset = writer.commit(build_upload_summary(writer.head(10), profile), profile)
+                except BaseException:
+                    writer.abort()
+                    raise
+            else:
+                if df is None or df.empty:
+                    return safe_jsonify({'error': 'The file is empty or could not be read.'}), 400
+                
+                dataset = dataset_cache.put(dataset_key, df, build_upload_summary(df.head(10), profile), profile)
+                del df
         
-        total_nulls = int(df.isnull().sum().sum())
-        total_cells = int(df.shape[0] * df.shape[1])
+        session_data['dataset'] = dataset
         
         return safe_jsonify({
             'success': True,
             'filename': str(file.filename),
-            'rows': int(len(df)),
-            'columns': int(len(df.columns)),
-            'columnInfo': column_info,
-            'sampleData': sample_data,
-            'dataQuality': {
-                'totalNulls': total_nulls,
-                'totalCells': total_cells,
-                'completeness': round(float((1 - total_nulls / total_cells) * 100), 1) if total_cells > 0 else 0.0,
-                'numericColumns': int(sum(1 for c in column_info if c.get('isNumeric', False))),
-                'categoricalColumns': int(sum(1 for c in column_info if c.get('type') == 'categorical')),
-                'usableColumns': int(sum(1 for c in column_info if c.get('isUsable', False)))
-            }
+            'datasetId': dataset.key,
+            **dataset.summary
         })
         
     except Exception as e:
@@ -286,163 +454,179 @@ def upload_file():
         return safe_jsonify({'error': f'Upload error: {str(e)}'}), 500
 
 
+@app.route('/api/datasets/<dataset_id>/load', methods=['POST'])
+def load_dataset(dataset_id):
+    """Attach a previously uploaded dataset to this session, e.g. after a restart"""
+    try:
+        dataset = dataset_cache.get(dataset_id)
+        if dataset is None:
+            return safe_jsonify({'error': 'Dataset not found. Please upload the file again.'}), 404
+        
+        reset_session()
+        session_data['dataset'] = dataset
+        
+        return safe_jsonify({
+            'success': True,
+            'datasetId': dataset.key,
+            **dataset.summary
+        })
+    except Exception as e:
+        traceback.print_exc()
+        return safe_jsonify({'error': f'Load error: {str(e)}'}), 500
+
+
 @app.route('/api/preprocess', methods=['POST'])
 def preprocess_data():
     try:
-        if session_data.get('original_df') is None:
+        dataset = session_data.get('dataset')
+        if dataset is None:
             return safe_jsonify({'error': 'No data uploaded. Please upload a file first.'}), 400
         
         data = request.json or {}
         scaling_method = data.get('scalingMethod', 'standard')
         handle_missing = data.get('handleMissing', 'auto')
+        fill_value = data.get('fillValue', 0)
+        encoding = data.get('encoding', 'auto')
+        encodings = data.get('encodings') or {}
+        hash_buckets = data.get('hashBuckets', HASH_BUCKETS)
+        sparse = data.get('sparse', 'auto')
         selected_features = data.get('selectedFeatures', [])
         target_column = data.get('targetColumn', None)
         auto_select = data.get('autoSelect', False)
         
-        df = session_data['original_df'].copy()
+        all_columns = dataset.columns
         
         # Auto-select target if not provided
         if not target_column:
             potential_targets = ['target', 'label', 'class', 'y', 'output', 'result', 'species']
             for pt in potential_targets:
-                matching = [c for c in df.columns if pt in c.lower()]
+                matching = [c for c in all_columns if pt in c.lower()]
                 if matching:
                     target_column = matching[0]
                     break
             if not target_column:
-                target_column = df.columns[-1]
+                target_column = all_columns[-1]
         
-        if target_column not in df.columns:
+        if target_column not in all_columns:
             return safe_jsonify({'error': f'Target column "{target_column}" not found.'}), 400
         
+        if handle_missing not in MISSING_STRATEGIES:
+            return safe_jsonify({'error': f'handleMissing must be one of: {", ".join(MISSING_STRATEGIES)}.'}), 400
+        try:
+            fill_value = float(fill_value)
+        except (TypeError, ValueError):
+            fill_value = float('nan')
+        if not np.isfinite(fill_value):
+            return safe_jsonify({'error': 'fillValue must be a finite number.'}), 400
+        if handle_missing != 'constant':
+            fill_value = 0.0
+        if not isinstance(encodings, dict):
+            return safe_jsonify({'error': 'encodings must map column names to encodings.'}), 400
+        if encoding not in ENCODINGS or any(e not in ENCODINGS for e in encodings.values()):
+            return safe_jsonify({'error': f'encoding must be one of: {", ".join(ENCODINGS)}.'}), 400
+        try:
+            hash_buckets = int(hash_buckets)
+        except (TypeError, ValueError):
+            hash_buckets = 0
+        if not 1 <= hash_buckets <= HASH_BUCKETS_MAX:
+            return safe_jsonify({'error': f'hashBuckets must be an integer between 1 and {HASH_BUCKETS_MAX}.'}), 400
+        if isinstance(sparse, str):
+            sparse = {'true': True, 'false': False, 'auto': 'auto'}.get(sparse.strip().lower())
+        if not isinstance(sparse, bool) and sparse != 'auto':
+            return safe_jsonify({'error': 'sparse must be true, false or "auto".'}), 400
+        encoding_options = {'encoding': encoding, 'encodings': encodings, 'hash_buckets': hash_buckets,
+                            'sparse': sparse}
+        
+        # Column types come from the profile computed once at upload
+        column_types = dataset.profile.types()
+        
         # Auto-select features
         if auto_select or not selected_features:
-            selected_features = []
-            for col in df.columns:
-                if col == target_column:
-                    continue
-                col_type = detect_column_type(df[col])
-                if col_type in ['numeric', 'numeric_string', 'categorical_numeric', 'categorical']:
-                    selected_features.append(col)
-        
-        selected_features = [f for f in selected_features if f != target_column and f in df.columns]
+            selected_features = [
+                col for col in all_columns
+                if col != target_column
+                and column_types[col] in ['numeric', 'numeric_string', 'categorical_numeric', 'categorical']
+            ]
+        
+        selected_features = [f for f in selected_features if f != target_column and f in column_types]
+        streaming = bool(data.get('streaming'))
+        compact = bool(data.get('compact', COMPACT_DTYPES))
+        
+        preprocess_key = stage_key(
+            'preprocess', dataset.key, target_column, selected_features,
+            scaling_method, handle_missing, fill_value, streaming, compact,
+            encoding, sorted(encodings.items()), hash_buckets, sparse
+        )
+        cached = restore_stage(preprocess_key)
+        if cached is not None:
+            # A split indexes the rows of the X it was made from; re-split after preprocessing
+            clear_split()
+            return safe_jsonify(cached)
+        
+        if streaming:
+            return preprocess_streaming(dataset, preprocess_key, target_column, selected_features,
+                                        column_types, scaling_method, handle_missing, compact, fill_value,
+                                        encoding_options)
+        
+        # Load only the columns this request needs from the on-disk dataset
+        wanted = set(selected_features) | {target_column}
+        df = dataset.read([c for c in all_columns if c in wanted], categorical=compact)
         
         if not selected_features:
             return safe_jsonify({'error': 'No suitable feature columns found.'}), 400
         
-        # Handle missing target values
-        target_series = df[target_column].copy()
-        valid_indices = target_series.notna()
-        df = df[valid_indices].reset_index(drop=True)
-        target_series = df[target_column].copy()
+        # Fit the same FeaturePipeline used for streaming and prediction on the
+        # in-memory frame, so every path applies identical transforms
+        try:
+            pipeline = FeaturePipeline(target_column, selected_features, column_types, scaling_method, compact,
+                                       handle_missing, fill_value, **encoding_options)
+            pipeline.fit(lambda frame=df: iter([frame]))
+        except ValueError as e:
+            return safe_jsonify({'error': str(e)}), 400
         
-        if len(df) == 0:
+        if pipeline.n_rows_ == 0:
             return safe_jsonify({'error': 'No valid data remaining.'}), 400
         
-        # Encode target - ALWAYS encode as integers for classification
-        le = LabelEncoder()
-        target_encoded = le.fit_transform(target_series.astype(str))
-        session_data['label_encoder'] = le
-        
-        # Ensure integer type
-        target_encoded = target_encoded.astype(int)
-        
-        # Check classes
-        unique_classes, class_counts = np.unique(target_encoded, return_counts=True)
-        n_classes = len(unique_classes)
-        
-        if n_classes < 2:
+        if pipeline.n_classes < 2:
             return safe_jsonify({'error': 'Target must have at least 2 classes.'}), 400
         
-        # Process features
-        processed_features = pd.DataFrame()
-        feature_encoders = {}
-        
-        for col in selected_features:
-            if col not in df.columns:
-                continue
-            
-            col_type = detect_column_type(df[col])
-            series = df[col].copy()
-            
-            try:
-                if col_type in ['numeric', 'numeric_string']:
-                    series = pd.to_numeric(series, errors='coerce')
-                    fill_val = series.mean() if series.notna().sum() > 0 else 0
-                    series = series.fillna(fill_val)
-                    processed_features[col] = series
-                    
-                elif col_type in ['categorical', 'categorical_numeric']:
-                    series = series.fillna('Unknown').astype(str)
-                    le_feat = LabelEncoder()
-                    processed_features[col] = le_feat.fit_transform(series)
-                    feature_encoders[col] = le_feat
-            except Exception as e:
-                print(f"Warning: Could not process {col}: {e}")
-                continue
-        
-        session_data['feature_encoders'] = feature_encoders
-        
-        if processed_features.empty:
+        if not pipeline.features:
             return safe_jsonify({'error': 'No features could be processed.'}), 400
         
-        # Handle remaining NaN
-        for col in processed_features.columns:
-            if processed_features[col].isnull().any():
-                fill_val = processed_features[col].mean()
-                if pd.isna(fill_val):
-                    fill_val = 0
-                processed_features[col] = processed_features[col].fillna(fill_val)
-        
-        # Ensure same length
-        min_len = min(len(processed_features), len(target_encoded))
-        processed_features = processed_features.iloc[:min_len].reset_index(drop=True)
-        target_encoded = target_encoded[:min_len]
-        
-        if len(processed_features) < 10:
-            return safe_jsonify({'error': f'Not enough samples ({len(processed_features)}). Need at least 10.'}), 400
+        if pipeline.n_rows_ < 10:
+            return safe_jsonify({'error': f'Not enough samples ({pipeline.n_rows_}). Need at least 10.'}), 400
         
-        # Re-check classes
-        unique_classes, class_counts = np.unique(target_encoded, return_counts=True)
-        n_classes = len(unique_classes)
+        unique_classes = np.arange(pipeline.n_classes)
+        class_counts = pipeline.class_counts_
+        n_classes = pipeline.n_classes
         min_class_count = int(class_counts.min())
         
         if min_class_count < 2:
             return safe_jsonify({'error': 'Some classes have fewer than 2 samples.'}), 400
         
-        # Apply scaling
-        X = processed_features.values.astype(float)
-        X = np.nan_to_num(X, nan=0.0, posinf=1e10, neginf=-1e10)
-        
-        if scaling_method == 'standard':
-            scaler = StandardScaler()
-            X_scaled = scaler.fit_transform(X)
-        elif scaling_method == 'minmax':
-            scaler = MinMaxScaler()
-            X_scaled = scaler.fit_transform(X)
-        elif scaling_method == 'robust':
-            scaler = RobustScaler()
-            X_scaled = scaler.fit_transform(X)
-        else:
-            X_scaled = X
-            scaler = None
-        
-        session_data['scaler'] = scaler
-        
-        # Create processed dataframe - store target as INTEGER
-        processed_df = pd.DataFrame(X_scaled, columns=processed_features.columns)
-        processed_df['__target__'] = target_encoded.astype(int)
-        
-        session_data['processed_df'] = processed_df
+        with span('transform'):
+            X_scaled, target_encoded = pipeline.transform(df)
+        del df
+        
+        clear_split()
+        session_data['feature_pipeline'] = pipeline
+        session_data['streaming'] = False
+        session_data['preprocess_key'] = preprocess_key
+        session_data['scaler'] = pipeline.scaler
+        session_data['label_encoder'] = pipeline.label_encoder()
+        session_data['feature_encoders'] = pipeline.feature_encoders()
+        
+        # One feature matrix and INTEGER target per session; splits only index into them
+        session_data['X'] = X_scaled
+        session_data['y'] = target_encoded
         session_data['target_column'] = '__target__'
-        session_data['feature_columns'] = list(processed_features.columns)
+        session_data['feature_columns'] = pipeline.output_features
         
         # Prepare response
-        sample_data = []
-        for i in range(min(10, len(processed_df))):
-            row = processed_df.iloc[i]
-            row_dict = {str(col): convert_to_serializable(row[col]) for col in processed_df.columns}
-            sample_data.append(row_dict)
+        head = X_scaled[:10].toarray() if pipeline.sparse else X_scaled[:10]
+        sample = pd.DataFrame(head, columns=session_data['feature_columns'])
+        sample['__target__'] = target_encoded[:10]
+        sample_data = records(sample, 10)
         
         class_distribution = {str(int(k)): int(v) for k, v in zip(unique_classes, class_counts)}
         
@@ -455,14 +639,19 @@ def preprocess_data():
         min_count = int(class_counts.min())
         is_balanced = bool((max_count / min_count) < 3) if min_count > 0 else False
         
-        return safe_jsonify({
+        response = remember_stage(preprocess_key, PREPROCESS_STATE, {
             'success': True,
             'scalingMethod': str(scaling_method),
             'handleMissing': str(handle_missing),
-            'rowsAfterProcessing': int(len(processed_df)),
-            'rowsRemoved': int(len(session_data['original_df']) - len(processed_df)),
-            'featuresUsed': [str(f) for f in processed_features.columns],
-            'featuresCount': int(len(processed_features.columns)),
+            'compact': compact,
+            'rowsAfterProcessing': int(X_scaled.shape[0]),
+            'rowsRemoved': int(len(dataset) - X_scaled.shape[0]),
+            'featuresUsed': [str(f) for f in pipeline.features],
+            'featuresCount': int(len(pipeline.features)),
+            'encodings': {str(col): e for col, e in pipeline.encodings_.items()},
+            'encodedFeaturesCount': int(X_scaled.shape[1]),
+            'sparse': pipeline.sparse,
+            'density': float(X_scaled.nnz / max(1, X_scaled.shape[0] * X_scaled.shape[1])) if pipeline.sparse else 1.0,
             'targetColumn': str(target_column),
             'sampleData': sample_data,
             'classDistribution': class_distribution,
@@ -471,16 +660,95 @@ def preprocess_data():
             'minClassCount': int(min_class_count),
             'isBalanced': is_balanced
         })
+        return safe_jsonify(response)
         
+    except DatasetMissing as e:
+        return safe_jsonify({'error': str(e)}), 410
     except Exception as e:
         traceback.print_exc()
         return safe_jsonify({'error': f'Preprocessing error: {str(e)}'}), 500
 
 
+def preprocess_streaming(dataset, preprocess_key, target_column, selected_features, column_types,
+                         scaling_method, handle_missing, compact=False, fill_value=0.0, encoding_options=None):
+    """Fit the preprocessing over the stored dataset in batches instead of in memory"""
+    if not selected_features:
+        return safe_jsonify({'error': 'No suitable feature columns found.'}), 400
+    
+    try:
+        pipeline = FeaturePipeline(target_column, selected_features, column_types, scaling_method, compact,
+                                   handle_missing, fill_value, **(encoding_options or {}))
+        if not pipeline.features:
+            return safe_jsonify({'error': 'No features could be processed.'}), 400
+        pipeline.fit(lambda: dataset.iter_batches(pipeline.columns))
+    except ValueError as e:
+        return safe_jsonify({'error': str(e)}), 400
+    
+    if pipeline.n_rows_ == 0:
+        return safe_jsonify({'error': 'No valid data remaining.'}), 400
+    if pipeline.n_classes < 2:
+        return safe_jsonify({'error': 'Target must have at least 2 classes.'}), 400
+    if pipeline.n_rows_ < 10:
+        return safe_jsonify({'error': f'Not enough samples ({pipeline.n_rows_}). Need at least 10.'}), 400
+    
+    class_counts = pipeline.class_counts_
+    min_class_count = int(class_counts.min())
+    if min_class_count < 2:
+        return safe_jsonify({'error': 'Some classes have fewer than 2 samples.'}), 400
+    
+    # Streaming mode keeps no processed frame in the session, only the fitted pipeline
+    session_data['X'] = session_data['y'] = None
+    clear_split()
+    session_data['feature_pipeline'] = pipeline
+    session_data['streaming'] = True
+    session_data['preprocess_key'] = preprocess_key
+    session_data['scaler'] = pipeline.scaler
+    session_data['label_encoder'] = pipeline.label_encoder()
+    session_data['feature_encoders'] = pipeline.feature_encoders()
+    session_data['target_column'] = target_column
+    session_data['feature_columns'] = pipeline.output_features
+    
+    head = next(dataset.iter_batches(pipeline.columns, batch_rows=50), None)
+    X_head, y_head = pipeline.transform(head)
+    if pipeline.sparse:
+        X_head = X_head.toarray()
+    sample = pd.DataFrame(X_head[:10], columns=[str(col) for col in session_data['feature_columns']])
+    sample['__target__'] = y_head[:10]
+    sample_data = records(sample)
+    
+    max_count = int(class_counts.max())
+    
+    response = remember_stage(preprocess_key, PREPROCESS_STATE, {
+        'success': True,
+        'streaming': True,
+        'scalingMethod': str(scaling_method),
+        'handleMissing': str(handle_missing),
+        'compact': compact,
+        'rowsAfterProcessing': int(pipeline.n_rows_),
+        'rowsRemoved': int(len(dataset) - pipeline.n_rows_),
+        'featuresUsed': [str(f) for f in pipeline.features],
+        'featuresCount': int(len(pipeline.features)),
+        'encodings': {str(col): e for col, e in pipeline.encodings_.items()},
+        'encodedFeaturesCount': int(len(session_data['feature_columns'])),
+        'sparse': pipeline.sparse,
+        'targetColumn': str(target_column),
+        'sampleData': sample_data,
+        'classDistribution': {str(i): int(c) for i, c in enumerate(class_counts)},
+        'classLabels': {str(i): str(label) for i, label in enumerate(pipeline.classes_)},
+        'numClasses': int(pipeline.n_classes),
+        'minClassCount': min_class_count,
+        'isBalanced': bool((max_count / min_class_count) < 3)
+    })
+    return safe_jsonify(response)
+
+
 @app.route('/api/split', methods=['POST'])
 def split_data():
     try:
-        if session_data.get('processed_df') is None:
+        if session_data.get('streaming'):
+            return split_streaming()
+        
+        if session_data.get('X') is None:
             return safe_jsonify({'error': 'No processed data. Please preprocess first.'}), 400
         
         data = request.json or {}
@@ -490,15 +758,20 @@ def split_data():
         if split_ratio <= 0.1 or split_ratio >= 0.99:
             return safe_jsonify({'error': 'Split ratio must be between 0.1 and 0.99'}), 400
         
-        df = session_data['processed_df']
-        target_col = session_data['target_column']
-        feature_cols = session_data['feature_columns']
+        # Content-derived, so an identical re-split keeps results trained on it valid
+        split_id = stage_key('split', session_data.get('preprocess_key'), split_ratio, random_state)
+        cached = restore_stage(split_id)
+        if cached is not None:
+            return safe_jsonify(cached)
         
-        X = df[feature_cols].values.astype(float)
-        # IMPORTANT: Ensure y is integer for classification
-        y = df[target_col].values.astype(int)
+        from sklearn.model_selection import train_test_split
         
-        n_samples = len(X)
+        feature_cols = session_data['feature_columns']
+        # Only row indices are split; X and y stay as preprocessing stored them
+        y = session_data['y']
+        rows = np.arange(len(y))
+        
+        n_samples = len(y)
         
         if n_samples < 4:
             return safe_jsonify({'error': 'Not enough samples for splitting.'}), 400
@@ -513,35 +786,35 @@ def split_data():
         
         warnings_list = []
         
-        try:
-            if can_stratify and n_classes > 1:
-                X_train, X_test, y_train, y_test = train_test_split(
-                    X, y, train_size=split_ratio, random_state=random_state, stratify=y
-                )
-                stratified = True
-            else:
-                X_train, X_test, y_train, y_test = train_test_split(
-                    X, y, train_size=split_ratio, random_state=random_state
+        with span('split'):
+            try:
+                if can_stratify and n_classes > 1:
+                    train_index, test_index = train_test_split(
+                        rows, train_size=split_ratio, random_state=random_state, stratify=y
+                    )
+                    stratified = True
+                else:
+                    train_index, test_index = train_test_split(
+                        rows, train_size=split_ratio, random_state=random_state
+                    )
+                    stratified = False
+                    if not can_stratify:
+                        warnings_list.append(f"Stratification disabled: minimum class has {min_class_count} samples.")
+            except ValueError as e:
+                train_index, test_index = train_test_split(
+                    rows, train_size=split_ratio, random_state=random_state
                 )
                 stratified = False
-                if not can_stratify:
-                    warnings_list.append(f"Stratification disabled: minimum class has {min_class_count} samples.")
-        except ValueError as e:
-            X_train, X_test, y_train, y_test = train_test_split(
-                X, y, train_size=split_ratio, random_state=random_state
-            )
-            stratified = False
-            warnings_list.append(f"Used random split: {str(e)}")
+                warnings_list.append(f"Used random split: {str(e)}")
         
-        # IMPORTANT: Store as integers
-        session_data['X_train'] = X_train.astype(float)
-        session_data['X_test'] = X_test.astype(float)
-        session_data['y_train'] = y_train.astype(int)
-        session_data['y_test'] = y_test.astype(int)
+        # Splitting the row numbers picks the same rows train_test_split(X, y) would
+        split = IndexSplit(train_index, test_index)
+        session_data['split'] = split
+        session_data['split_id'] = split_id
         
         # Distributions
-        train_unique, train_counts = np.unique(y_train, return_counts=True)
-        test_unique, test_counts = np.unique(y_test, return_counts=True)
+        train_unique, train_counts = np.unique(split.train(y), return_counts=True)
+        test_unique, test_counts = np.unique(split.test(y), return_counts=True)
         
         train_dist = {str(int(k)): int(v) for k, v in zip(train_unique, train_counts)}
         test_dist = {str(int(k)): int(v) for k, v in zip(test_unique, test_counts)}
@@ -551,10 +824,10 @@ def split_data():
             for i, label in enumerate(session_data['label_encoder'].classes_):
                 class_labels[str(i)] = str(label)
         
-        return safe_jsonify({
+        response = remember_stage(split_id, SPLIT_STATE, {
             'success': True,
-            'trainSize': int(len(X_train)),
-            'testSize': int(len(X_test)),
+            'trainSize': int(split.n_train),
+            'testSize': int(split.n_test),
             'totalSize': int(n_samples),
             'splitRatio': float(split_ratio),
             'trainDistribution': train_dist,
@@ -565,12 +838,116 @@ def split_data():
             'stratified': bool(stratified),
             'warnings': warnings_list if warnings_list else None
         })
+        return safe_jsonify(response)
         
     except Exception as e:
         traceback.print_exc()
         return safe_jsonify({'error': f'Split error: {str(e)}'}), 500
 
 
+def split_streaming():
+    """Assign rows to train/test by hashing their position; only the target column is read"""
+    data = request.json or {}
+    split_ratio = float(data.get('splitRatio', 0.8))
+    random_state = int(data.get('randomState', 42))
+    
+    if split_ratio <= 0.1 or split_ratio >= 0.99:
+        return safe_jsonify({'error': 'Split ratio must be between 0.1 and 0.99'}), 400
+    
+    split_id = stage_key('split-streaming', session_data.get('preprocess_key'), split_ratio, random_state)
+    cached = restore_stage(split_id)
+    if cached is not None:
+        return safe_jsonify(cached)
+    
+    dataset = session_data['dataset']
+    pipeline = session_data['feature_pipeline']
+    split = HashSplit(split_ratio, random_state)
+    
+    n_classes = pipeline.n_classes
+    train_counts = np.zeros(n_classes, dtype=np.int64)
+    test_counts = np.zeros(n_classes, dtype=np.int64)
+    start = 0
+    # Dropping rows with missing features needs the features too; otherwise the target is enough
+    columns = pipeline.columns if pipeline.missing == 'drop' else [pipeline.target_column]
+    with span('split'):
+        for batch in dataset.iter_batches(columns):
+            target = batch[pipeline.target_column]
+            valid = pipeline.kept_rows(batch)
+            is_train = split.is_train(start, len(batch))[valid]
+            start += len(batch)
+            y = pipeline._encode(target[valid].astype(str), pipeline.classes_)
+            train_counts += np.bincount(y[is_train], minlength=n_classes)
+            test_counts += np.bincount(y[~is_train], minlength=n_classes)
+    
+    n_train = int(train_counts.sum())
+    n_test = int(test_counts.sum())
+    if n_train < 2 or n_test < 1:
+        return safe_jsonify({'error': 'Not enough samples for splitting.'}), 400
+    
+    session_data['stream_split'] = split
+    session_data['split_id'] = split_id
+    
+    response = remember_stage(split_id, SPLIT_STATE, {
+        'success': True,
+        'streaming': True,
+        'trainSize': n_train,
+        'testSize': n_test,
+        'totalSize': n_train + n_test,
+        'splitRatio': float(split_ratio),
+        'trainDistribution': {str(i): int(c) for i, c in enumerate(train_counts) if c},
+        'testDistribution': {str(i): int(c) for i, c in enumerate(test_counts) if c},
+        'classLabels': {str(i): str(label) for i, label in enumerate(pipeline.classes_)},
+        'features': [str(f) for f in session_data['feature_columns']],
+        'numFeatures': int(len(session_data['feature_columns'])),
+        'stratified': False,
+        'warnings': ['Streaming split assigns rows by hash, so class proportions are approximate.']
+    })
+    return safe_jsonify(response)
+
+
+def train_streaming(model_type, model_params):
+    """Queue a partial_fit training job over the stored dataset"""
+    if session_data.get('stream_split') is None:
+        return safe_jsonify({'error': 'No training data available. Please split the data first.'}), 400
+    
+    if model_type not in INCREMENTAL_MODEL_TYPES:
+        return safe_jsonify({
+            'error': f'Model "{model_type}" does not support streaming training. '
+                     f'Use one of: {", ".join(INCREMENTAL_MODEL_TYPES)}.'
+        }), 400
+    range_error = feature_range_error(model_type)
+    if range_error:
+        return safe_jsonify({'error': range_error}), 400
+    
+    pipeline = session_data['feature_pipeline']
+    epochs = max(1, min(int(model_params.get('epochs', 1)), 20))
+    batch_rows = max(100, min(int(model_params.get('batchSize', 10000)), 1000000))
+    
+    model, model_display_name = build_model(model_type, model_params, pipeline.n_rows_)
+    
+    try:
+        job = job_manager.submit(
+            g.session.id, 'train', train_incremental,
+            model, model_type, model_display_name,
+            session_data['dataset'], pipeline, session_data['stream_split'],
+            epochs=epochs, batch_rows=batch_rows,
+            meta={'modelType': str(model_type), 'dataId': data_id(), 'params': model_params}
+        )
+    except JobQueueFull as e:
+        return safe_jsonify({'error': str(e)}), 429
+    
+    print(f"Queued streaming {model_display_name} as job {job.id}")
+    
+    return safe_jsonify({
+        'success': True,
+        'jobId': job.id,
+        'status': job.status,
+        'streaming': True,
+        'modelType': str(model_type),
+        'modelDisplayName': str(model_display_name)
+    }), 202
+
+
 @app.route('/api/train', methods=['POST'])
 def train_model():
     try:
@@ -578,8 +955,12 @@ def train_model():
         print("TRAIN REQUEST RECEIVED")
         print("=" * 50)
         
+        if session_data.get('streaming'):
+            data = request.json or {}
+            return train_streaming(data.get('modelType', 'sgd'), data.get('params', {}))
+        
         # Check if data exists
-        if session_data.get('X_train') is None:
+        if session_data.get('split') is None:
             print("ERROR: No training data available")
             return safe_jsonify({'error': 'No training data available. Please split the data first.'}), 400
         
@@ -590,328 +971,641 @@ def train_model():
         print(f"Model type: {model_type}")
         print(f"Model params: {model_params}")
         
-        X_train = session_data['X_train'].astype(float)
-        X_test = session_data['X_test'].astype(float)
-        # CRITICAL: Ensure y is integer for classification
-        y_train = session_data['y_train'].astype(int)
-        y_test = session_data['y_test'].astype(int)
-        
-        print(f"X_train shape: {X_train.shape}, dtype: {X_train.dtype}")
-        print(f"y_train shape: {y_train.shape}, dtype: {y_train.dtype}")
-        print(f"y_train unique values: {np.unique(y_train)}")
+        split = session_data['split']
         
         # Validate data
-        if len(X_train) < 2:
+        if split.n_train < 2:
             return safe_jsonify({'error': 'Not enough training samples.'}), 400
         
-        if len(X_test) < 1:
+        if split.n_test < 1:
             return safe_jsonify({'error': 'Not enough test samples.'}), 400
         
-        # Clean X data
-        X_train = np.nan_to_num(X_train, nan=0.0, posinf=1e10, neginf=-1e10)
-        X_test = np.nan_to_num(X_test, nan=0.0, posinf=1e10, neginf=-1e10)
-        
-        n_classes = len(np.unique(y_train))
-        print(f"Number of classes: {n_classes}")
+        range_error = feature_range_error(model_type)
+        if range_error:
+            return safe_jsonify({'error': range_error}), 400
         
         # Create model
         try:
-            if model_type == 'logistic_regression':
-                max_iter = int(model_params.get('maxIter', 1000))
-                C = float(model_params.get('C', 1.0))
-                max_iter = max(100, min(max_iter, 5000))
-                C = max(0.001, min(C, 100))
-                
-                model = LogisticRegression(
-                    max_iter=max_iter, C=C, random_state=42,
-                    solver='lbfgs', multi_class='auto', n_jobs=-1
-                )
-                model_display_name = "Logistic Regression"
-                
-            elif model_type == 'decision_tree':
-                max_depth = model_params.get('maxDepth')
-                min_samples_split = int(model_params.get('minSamplesSplit', 2))
-                
-                if max_depth is not None and str(max_depth).strip() not in ['', 'null', 'None']:
-                    max_depth = max(1, min(int(max_depth), 30))
-                else:
-                    max_depth = None
-                min_samples_split = max(2, min(min_samples_split, max(2, len(X_train) // 4)))
-                
-                model = DecisionTreeClassifier(
-                    max_depth=max_depth, min_samples_split=min_samples_split, random_state=42
-                )
-                model_display_name = "Decision Tree"
-                
-            elif model_type == 'random_forest':
-                n_estimators = int(model_params.get('nEstimators', 100))
-                max_depth = model_params.get('maxDepth')
-                
-                n_estimators = max(10, min(n_estimators, 500))
-                if max_depth is not None and str(max_depth).strip() not in ['', 'null', 'None']:
-                    max_depth = max(1, min(int(max_depth), 30))
-                else:
-                    max_depth = None
-                
-                model = RandomForestClassifier(
-                    n_estimators=n_estimators, max_depth=max_depth, random_state=42, n_jobs=-1
-                )
-                model_display_name = "Random Forest"
-                
-            elif model_type == 'gradient_boosting':
-                n_estimators = int(model_params.get('nEstimators', 100))
-                learning_rate = float(model_params.get('learningRate', 0.1))
-                
-                n_estimators = max(10, min(n_estimators, 500))
-                learning_rate = max(0.01, min(learning_rate, 1.0))
-                
-                model = GradientBoostingClassifier(
-                    n_estimators=n_estimators, learning_rate=learning_rate, random_state=42
-                )
-                model_display_name = "Gradient Boosting"
-                
-            elif model_type == 'svm':
-                C = float(model_params.get('C', 1.0))
-                kernel = str(model_params.get('kernel', 'rbf'))
-                
-                C = max(0.001, min(C, 100))
-                if kernel not in ['linear', 'rbf', 'poly']:
-                    kernel = 'rbf'
-                
-                model = SVC(C=C, kernel=kernel, random_state=42, probability=True)
-                model_display_name = "Support Vector Machine"
-                
-            elif model_type == 'knn':
-                n_neighbors = int(model_params.get('nNeighbors', 5))
-                n_neighbors = max(1, min(n_neighbors, min(50, len(X_train) - 1)))
-                
-                model = KNeighborsClassifier(n_neighbors=n_neighbors, n_jobs=-1)
-                model_display_name = "K-Nearest Neighbors"
-                
-            else:
-                print(f"ERROR: Unknown model type: {model_type}")
-                return safe_jsonify({'error': f'Unknown model type: {model_type}'}), 400
-                
+            model, model_display_name = build_model(model_type, model_params, split.n_train)
+        except ValueError as e:
+            print(f"ERROR: {e}")
+            return safe_jsonify({'error': str(e)}), 400
         except Exception as e:
             print(f"ERROR creating model: {e}")
             traceback.print_exc()
             return safe_jsonify({'error': f'Error creating model: {str(e)}'}), 400
         
-        # Train model
-        print(f"Training {model_display_name}...")
-        try:
-            model.fit(X_train, y_train)
-            print("Training complete!")
-        except Exception as e:
-            print(f"ERROR training model: {e}")
-            traceback.print_exc()
-            return safe_jsonify({'error': f'Training failed: {str(e)}'}), 400
+        label_encoder = session_data.get('label_encoder')
+        class_names = [str(c) for c in label_encoder.classes_] if label_encoder is not None else None
+        
+        # CV can be skipped ("cv": false) and run later via /api/cv; scores
+        # for an identical split and configuration are reused
+        run_cv = data.get('cv', True) not in [False, 'false', 'off', 'defer']
+        cv_key = stage_key('cv', data_id(), model_type, params_key(model))
+        train_key = stage_key('train', data_id(), model_type, params_key(model), run_cv)
+        meta = {'modelType': str(model_type), 'dataId': data_id(),
+                'params': model_params, 'cvKey': cv_key, 'trainKey': train_key}
+        
+        job = cached_training_job(train_key, meta)
+        if job is not None:
+            print(f"Reusing stored {model_display_name} as job {job.id}")
+        else:
+            # The job's share of the CPU budget bounds the estimator, its CV folds and BLAS
+            cores = job_cores(model, job_manager.job_cores, cv=run_cv)
+            limit_threads(model, cores)
+            try:
+                job = job_manager.submit(
+                    g.session.id, 'train', train_and_evaluate,
+                    model, model_type, model_display_name,
+                    session_data['X'], session_data['y'], split,
+                    list(session_data['feature_columns']), class_names,
+                    cv=run_cv, cv_scores=cv_cache.get(cv_key), cv_jobs=min(CV_WORKERS, cores),
+                    feature_sources=session_data['feature_pipeline'].feature_sources,
+                    meta=meta, cores=cores
+                )
+            except JobQueueFull as e:
+                return safe_jsonify({'error': str(e)}), 429
+            
+            print(f"Queued {model_display_name} as job {job.id}")
         
-        session_data['model'] = model
+        return safe_jsonify({
+            'success': True,
+            'jobId': job.id,
+            'status': job.status,
+            'modelType': str(model_type),
+            'modelDisplayName': str(model_display_name)
+        }), 202
         
-        # Predictions
-        y_pred_train = model.predict(X_train)
-        y_pred_test = model.predict(X_test)
+    except Exception as e:
+        print(f"TRAIN ERROR: {e}")
+        traceback.print_exc()
+        return safe_jsonify({'error': f'Training error: {str(e)}'}), 500
+
+
+def cached_training_job(train_key, meta):
+    """An already-finished job for a configuration trained before on this split, if its model is still stored"""
+    entry = train_cache.get(train_key)
+    if entry is None:
+        return None
+    try:
+        artifact = model_registry.load(entry['modelId'], owner=g.session.id)
+    except ModelNotFound:
+        return None
+    result = {'response': dict(entry['response']), 'model': artifact.model, 'cv_scores': None}
+    return job_manager.completed(g.session.id, 'train', result, meta={**meta, 'modelId': artifact.model_id})
+
+
+def plot_urls(model_id, evaluation):
+    """Image URLs of the plots a stored model has, keyed like the train response fields"""
+    return {
+        PLOT_KINDS[kind]: f'/api/models/{model_id}/plots/{kind}.png'
+        for kind in available_plots(evaluation)
+    }
+
+
+def collect_training_result(job, install=True):
+    """Store a finished training job's model and install it into the session it was trained for"""
+    result = job_manager.result(job)
+    if result.get('cv_scores') is not None and job.meta.get('cvKey'):
+        cv_cache.put(job.meta['cvKey'], result['cv_scores'])
+    if not job.collected and job.meta.get('modelId') and job.meta.get('dataId') == data_id():
+        # Served from the train cache: the artifact is already in the registry
+        if install:
+            artifact = model_registry.load(job.meta['modelId'], owner=g.session.id)
+            session_data['model'] = artifact.model
+            session_data['model_artifact'] = artifact
+        job.collected = True
+    elif not job.collected and job.meta.get('dataId') == data_id():
+        evaluation = evaluation_from_response(result['response'])
+        artifact = ModelArtifact(
+            session_data['feature_pipeline'], result['model'],
+            result['response']['modelType'], result['response']['modelDisplayName'],
+            result['response']['metrics'], evaluation
+        )
+        artifact.cv_key = job.meta.get('cvKey')
+        if install:
+            session_data['model'] = result['model']
+            session_data['model_artifact'] = artifact
+        job.collected = True
+        try:
+            params = result.get('params', job.meta.get('params'))
+            saved = model_registry.save(artifact, owner=g.session.id, params=params)
+            result['response']['modelId'] = saved['modelId']
+            result['response']['plots'] = plot_urls(saved['modelId'], evaluation)
+            plot_renderer.prefetch(saved['modelId'], evaluation, artifact.model_display_name)
+            if job.meta.get('trainKey'):
+                train_cache.put(job.meta['trainKey'], {'response': result['response'], 'modelId': saved['modelId']})
+        except OSError as e:
+            print(f"Could not store model in registry: {e}")
+    return result['response']
+
+
+@app.route('/api/search', methods=['POST'])
+def search_model():
+    """Queue a hyperparameter search whose best candidate becomes the session's model"""
+    try:
+        if session_data.get('streaming'):
+            return safe_jsonify({'error': 'Search needs an in-memory split. Preprocess without streaming.'}), 400
+        if session_data.get('split') is None:
+            return safe_jsonify({'error': 'No training data available. Please split the data first.'}), 400
         
-        # Metrics
-        train_accuracy = float(accuracy_score(y_train, y_pred_train))
-        test_accuracy = float(accuracy_score(y_test, y_pred_test))
+        data = request.json or {}
+        model_type = data.get('modelType', 'random_forest')
+        method = data.get('method', 'halving')
+        n_candidates = max(2, min(int(data.get('nCandidates', 20)), 200))
+        cv_folds = max(2, min(int(data.get('cvFolds', 3)), 10))
+        factor = max(2, min(int(data.get('factor', 3)), 10))
+        
+        if model_type not in MODEL_TYPES:
+            return safe_jsonify({'error': f'Unknown model type: {model_type}'}), 400
+        if method not in SEARCH_METHODS:
+            return safe_jsonify({'error': f'Method must be one of: {", ".join(SEARCH_METHODS)}.'}), 400
+        range_error = feature_range_error(model_type)
+        if range_error:
+            return safe_jsonify({'error': range_error}), 400
+        
+        split = session_data['split']
+        if split.n_train < cv_folds * 2 or split.n_test < 1:
+            return safe_jsonify({'error': 'Not enough training samples.'}), 400
         
-        print(f"Train accuracy: {train_accuracy:.4f}")
-        print(f"Test accuracy: {test_accuracy:.4f}")
+        label_encoder = session_data.get('label_encoder')
+        class_names = [str(c) for c in label_encoder.classes_] if label_encoder is not None else None
+        cores = min(SEARCH_WORKERS, job_manager.job_cores)
         
-        # Precision, recall, F1
         try:
-            if n_classes == 2:
-                unique_labels = np.unique(y_test)
-                pos_label = int(unique_labels[1]) if len(unique_labels) > 1 else int(unique_labels[0])
-                precision = float(precision_score(y_test, y_pred_test, pos_label=pos_label, zero_division=0))
-                recall = float(recall_score(y_test, y_pred_test, pos_label=pos_label, zero_division=0))
-                f1 = float(f1_score(y_test, y_pred_test, pos_label=pos_label, zero_division=0))
-            else:
-                precision = float(precision_score(y_test, y_pred_test, average='weighted', zero_division=0))
-                recall = float(recall_score(y_test, y_pred_test, average='weighted', zero_division=0))
-                f1 = float(f1_score(y_test, y_pred_test, average='weighted', zero_division=0))
-        except Exception as e:
-            print(f"Metrics error: {e}")
-            precision = recall = f1 = 0.0
+            job = job_manager.submit(
+                g.session.id, 'search', search_and_train,
+                model_type, method, session_data['X'], session_data['y'], split,
+                list(session_data['feature_columns']), class_names,
+                n_candidates=n_candidates, cv_folds=cv_folds, factor=factor, n_jobs=cores,
+                feature_sources=session_data['feature_pipeline'].feature_sources,
+                meta={'modelType': str(model_type), 'dataId': data_id(),
+                      'method': method},
+                cores=cores
+            )
+        except JobQueueFull as e:
+            return safe_jsonify({'error': str(e)}), 429
         
-        # Cross-validation
-        cv_mean = None
-        cv_std = None
-        if len(X_train) >= 10:
-            try:
-                n_splits = min(5, len(X_train) // 2)
-                if n_splits >= 2:
-                    cv_scores = cross_val_score(model, X_train, y_train, cv=n_splits, scoring='accuracy')
-                    cv_mean = float(np.mean(cv_scores))
-                    cv_std = float(np.std(cv_scores))
-            except Exception as e:
-                print(f"CV warning: {e}")
+        print(f"Queued {method} search for {model_type} as job {job.id}")
         
-        # Confusion matrix
-        cm = confusion_matrix(y_test, y_pred_test)
+        return safe_jsonify({
+            'success': True,
+            'jobId': job.id,
+            'status': job.status,
+            'modelType': str(model_type),
+            'method': method
+        }), 202
         
-        # Class labels
-        cm_labels = []
-        if session_data.get('label_encoder') is not None:
-            try:
-                all_classes = session_data['label_encoder'].classes_
-                present_classes = sorted(set(y_test.tolist() + y_pred_test.tolist()))
-                for i in present_classes:
-                    if i < len(all_classes):
-                        cm_labels.append(str(all_classes[i]))
-                    else:
-                        cm_labels.append(str(i))
-            except Exception as e:
-                print(f"Label error: {e}")
-                cm_labels = [str(i) for i in range(cm.shape[0])]
-        else:
-            cm_labels = [str(i) for i in range(cm.shape[0])]
+    except Exception as e:
+        traceback.print_exc()
+        return safe_jsonify({'error': f'Search error: {str(e)}'}), 500
+
+
+# Models compared by /api/train/all when none are named
+COMPARE_MODEL_TYPES = [m for m in MODEL_TYPES if m not in INCREMENTAL_MODEL_TYPES]
+
+
+def leaderboard_key(entry):
+    metrics = entry['metrics']
+    cv_mean = metrics.get('cvMean')
+    return (metrics.get('testAccuracy') or 0.0, cv_mean if cv_mean is not None else -1.0)
+
+
+@app.route('/api/train/all', methods=['POST'])
+def train_all_models():
+    """
+    Train several models on the current split in parallel.
+
+    Streams one NDJSON line per model as it finishes, then a leaderboard
+    ranked by test accuracy and CV mean. The winner becomes the session's
+    current model; every model is kept in the registry.
+    """
+    try:
+        if session_data.get('streaming'):
+            return safe_jsonify({'error': 'Train all needs an in-memory split. Preprocess without streaming.'}), 400
+        if session_data.get('split') is None:
+            return safe_jsonify({'error': 'No training data available. Please split the data first.'}), 400
+        
+        data = request.json or {}
+        model_types = data.get('models') or COMPARE_MODEL_TYPES
+        all_params = data.get('params', {})
+        
+        unknown = [m for m in model_types if m not in MODEL_TYPES]
+        if unknown:
+            return safe_jsonify({'error': f'Unknown model type: {", ".join(unknown)}'}), 400
+        model_types = list(dict.fromkeys(model_types))
+        range_errors = [feature_range_error(m) for m in model_types]
+        if any(range_errors):
+            return safe_jsonify({'error': ' '.join(e for e in range_errors if e)}), 400
+        
+        split = session_data['split']
+        if split.n_train < 2 or split.n_test < 1:
+            return safe_jsonify({'error': 'Not enough training samples.'}), 400
         
-        # Generate confusion matrix plot
-        print("Generating confusion matrix plot...")
-        cm_image = None
+        label_encoder = session_data.get('label_encoder')
+        class_names = [str(c) for c in label_encoder.classes_] if label_encoder is not None else None
+        
+        jobs = []
         try:
-            plt.figure(figsize=(8, 6))
-            plt.clf()
-            
-            sns.heatmap(cm, annot=True, fmt='d', cmap='Blues', cbar=True,
-                        xticklabels=cm_labels, yticklabels=cm_labels,
-                        annot_kws={'size': 12})
-            plt.title(f'Confusion Matrix - {model_display_name}', fontsize=14, fontweight='bold', pad=20)
-            plt.ylabel('Actual', fontsize=12)
-            plt.xlabel('Predicted', fontsize=12)
-            plt.tight_layout()
-            
-            buffer = io.BytesIO()
-            plt.savefig(buffer, format='png', dpi=120, bbox_inches='tight', facecolor='white')
-            buffer.seek(0)
-            cm_image = base64.b64encode(buffer.getvalue()).decode('utf-8')
-            plt.close()
-        except Exception as e:
-            print(f"Error generating confusion matrix: {e}")
-            plt.close('all')
+            for model_type in model_types:
+                model_params = all_params.get(model_type, {})
+                model, model_display_name = build_model(model_type, model_params, split.n_train)
+                run_cv = data.get('cv', True) not in [False, 'false', 'off', 'defer']
+                cv_key = stage_key('cv', data_id(), model_type, params_key(model))
+                cv_scores = cv_cache.get(cv_key)
+                # Models queue for the CPU budget; each gets the cores it can use
+                cores = job_cores(model, job_manager.job_cores, cv=run_cv and cv_scores is None)
+                limit_threads(model, cores)
+                jobs.append(job_manager.submit(
+                    g.session.id, 'train', train_and_evaluate,
+                    model, model_type, model_display_name,
+                    session_data['X'], session_data['y'], split,
+                    list(session_data['feature_columns']), class_names,
+                    cv=run_cv, cv_scores=cv_scores, cv_jobs=min(CV_WORKERS, cores),
+                    feature_sources=session_data['feature_pipeline'].feature_sources,
+                    meta={'modelType': str(model_type), 'dataId': data_id(),
+                          'params': model_params, 'modelDisplayName': str(model_display_name),
+                          'cvKey': cv_key},
+                    cores=cores
+                ))
+        except JobQueueFull as e:
+            for job in jobs:
+                job_manager.cancel(job)
+            return safe_jsonify({'error': str(e)}), 429
+        except ValueError as e:
+            for job in jobs:
+                job_manager.cancel(job)
+            return safe_jsonify({'error': str(e)}), 400
+        
+        print(f"Queued {len(jobs)} models for comparison on a {job_manager.budget.total} core budget")
         
-        # Feature importance
-        feature_importance = None
-        feature_importance_image = None
+        def line(payload):
+            return dumps_json(payload) + b'\n'
         
-        if hasattr(model, 'feature_importances_'):
+        def generate():
+            # Waiting on the jobs can take minutes; the session is only locked to store results
+            session = release_session_early()
+            by_future = {job.future: job for job in jobs}
+            finished = []
             try:
-                importance = model.feature_importances_
-                feature_names = session_data['feature_columns']
-                
-                feature_importance = {str(name): float(imp) for name, imp in zip(feature_names, importance)}
-                
-                plt.figure(figsize=(10, max(6, len(feature_names) * 0.35)))
-                plt.clf()
-                
-                sorted_idx = np.argsort(importance)
-                colors = plt.cm.viridis(np.linspace(0.3, 0.9, len(sorted_idx)))
-                
-                y_pos = np.arange(len(sorted_idx))
-                plt.barh(y_pos, importance[sorted_idx], align='center', color=colors)
-                plt.yticks(y_pos, [feature_names[i] for i in sorted_idx])
-                plt.xlabel('Feature Importance', fontsize=12)
-                plt.title(f'Feature Importance - {model_display_name}', fontsize=14, fontweight='bold', pad=20)
-                plt.tight_layout()
+                yield line({'type': 'queued', 'jobs': [job.to_dict() for job in jobs]})
+                for future in as_completed(by_future):
+                    job = by_future[future]
+                    entry = {
+                        'type': 'result',
+                        'jobId': job.id,
+                        'modelType': job.meta['modelType'],
+                        'modelDisplayName': job.meta['modelDisplayName']
+                    }
+                    try:
+                        with relock_session(session):
+                            response_data = collect_training_result(job, install=False)
+                        entry.update({
+                            'status': 'done',
+                            'modelId': response_data.get('modelId'),
+                            'metrics': response_data['metrics'],
+                            'result': response_data
+                        })
+                        finished.append(entry)
+                    except JobCancelled:
+                        entry.update({'status': 'cancelled', 'error': 'Training was cancelled.'})
+                    except Exception as e:
+                        entry.update({'status': 'failed', 'error': str(e)})
+                    yield line(entry)
                 
-                buffer = io.BytesIO()
-                plt.savefig(buffer, format='png', dpi=120, bbox_inches='tight', facecolor='white')
-                buffer.seek(0)
-                feature_importance_image = base64.b64encode(buffer.getvalue()).decode('utf-8')
-                plt.close()
-            except Exception as e:
-                print(f"Error generating feature importance: {e}")
-                plt.close('all')
+                leaderboard = [
+                    {
+                        'rank': rank,
+                        'modelType': entry['modelType'],
+                        'modelDisplayName': entry['modelDisplayName'],
+                        'modelId': entry['modelId'],
+                        'jobId': entry['jobId'],
+                        'testAccuracy': entry['metrics'].get('testAccuracy'),
+                        'cvMean': entry['metrics'].get('cvMean'),
+                        'cvStd': entry['metrics'].get('cvStd'),
+                        'f1Score': entry['metrics'].get('f1Score')
+                    }
+                    for rank, entry in enumerate(sorted(finished, key=leaderboard_key, reverse=True), start=1)
+                ]
+                best = leaderboard[0] if leaderboard else None
+                if best is not None and best['modelId']:
+                    artifact = model_registry.load(best['modelId'], owner=session.id)
+                    with relock_session(session):
+                        session_data['model'] = artifact.model
+                        session_data['model_artifact'] = artifact
+                yield line({'type': 'leaderboard', 'leaderboard': leaderboard,
+                            'bestModelId': best['modelId'] if best else None})
+            finally:
+                # Client went away mid-stream: stop whatever is still running
+                for job in jobs:
+                    if not job.future.done():
+                        job_manager.cancel(job)
+        
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
         
-        # Coefficients
-        coefficients = None
-        coefficients_image = None
+    except Exception as e:
+        print(f"TRAIN ERROR: {e}")
+        traceback.print_exc()
+        return safe_jsonify({'error': f'Training error: {str(e)}'}), 500
+
+
+def cv_summary(scores, cached):
+    return {
+        'success': True,
+        'cvMean': round(float(np.mean(scores)), 4),
+        'cvStd': round(float(np.std(scores)), 4),
+        'cvScores': [round(float(s), 4) for s in scores],
+        'cached': cached
+    }
+
+
+def apply_cv_to_model(model_id, summary):
+    """Record deferred CV scores on the session's model and in the registry"""
+    metrics = {'cvMean': summary['cvMean'], 'cvStd': summary['cvStd']}
+    artifact = session_data.get('model_artifact')
+    if artifact is not None and artifact.model_id == model_id:
+        artifact.metrics = {**artifact.metrics, **metrics}
+    if model_id:
+        try:
+            model_registry.update_metrics(model_id, metrics)
+        except ModelNotFound:
+            pass
+
+
+def collect_cv_result(job):
+    result = job_manager.result(job)
+    cv_cache.put(job.meta['cvKey'], result['cv_scores'])
+    summary = cv_summary(result['cv_scores'], cached=False)
+    if not job.collected:
+        apply_cv_to_model(job.meta.get('modelId'), summary)
+        job.collected = True
+    return summary
+
+
+@app.route('/api/cv', methods=['POST'])
+def cross_validate_model():
+    """Cross-validate the session's current model, e.g. after training with "cv": false"""
+    from sklearn.base import clone
+    
+    try:
+        artifact = session_data.get('model_artifact')
+        if artifact is None:
+            return safe_jsonify({'error': 'No trained model. Please train a model first.'}), 400
+        if session_data.get('split') is None:
+            return safe_jsonify({'error': 'No training data available. Please split the data first.'}), 400
         
-        if hasattr(model, 'coef_'):
-            try:
-                feature_names = session_data['feature_columns']
-                
-                if model.coef_.ndim == 1:
-                    coef = model.coef_
-                elif model.coef_.shape[0] == 1:
-                    coef = model.coef_[0]
-                else:
-                    coef = np.mean(model.coef_, axis=0)
-                
-                coefficients = {str(name): float(c) for name, c in zip(feature_names, coef)}
-                
-                plt.figure(figsize=(10, max(6, len(feature_names) * 0.35)))
-                plt.clf()
-                
-                sorted_idx = np.argsort(np.abs(coef))
-                colors = ['#ef4444' if c < 0 else '#22c55e' for c in coef[sorted_idx]]
-                
-                y_pos = np.arange(len(sorted_idx))
-                plt.barh(y_pos, coef[sorted_idx], align='center', color=colors)
-                plt.yticks(y_pos, [feature_names[i] for i in sorted_idx])
-                plt.xlabel('Coefficient Value', fontsize=12)
-                plt.title(f'Feature Coefficients - {model_display_name}', fontsize=14, fontweight='bold', pad=20)
-                plt.axvline(x=0, color='black', linestyle='-', linewidth=0.5)
-                plt.tight_layout()
-                
-                buffer = io.BytesIO()
-                plt.savefig(buffer, format='png', dpi=120, bbox_inches='tight', facecolor='white')
-                buffer.seek(0)
-                coefficients_image = base64.b64encode(buffer.getvalue()).decode('utf-8')
-                plt.close()
-            except Exception as e:
-                print(f"Error generating coefficients: {e}")
-                plt.close('all')
+        # Keyed by the current data: the model may have been trained before a re-preprocess
+        cv_key = stage_key('cv', data_id(), artifact.model_type, params_key(artifact.model))
+        cached = cv_cache.get(cv_key)
+        if cached is not None:
+            summary = cv_summary(cached, cached=True)
+            apply_cv_to_model(artifact.model_id, summary)
+            return safe_jsonify(summary)
         
-        print("Building response...")
+        cores = min(CV_WORKERS, job_manager.job_cores)
+        try:
+            job = job_manager.submit(
+                g.session.id, 'cv', cross_validate_job,
+                clone(artifact.model), session_data['X'], session_data['y'], session_data['split'],
+                cv_jobs=cores,
+                meta={'modelType': str(artifact.model_type), 'dataId': data_id(),
+                      'cvKey': cv_key, 'modelId': artifact.model_id},
+                cores=cores
+            )
+        except JobQueueFull as e:
+            return safe_jsonify({'error': str(e)}), 429
         
-        response_data = {
-            'success': True,
-            'modelType': str(model_type),
-            'modelDisplayName': str(model_display_name),
-            'metrics': {
-                'trainAccuracy': round(train_accuracy, 4),
-                'testAccuracy': round(test_accuracy, 4),
-                'precision': round(precision, 4),
-                'recall': round(recall, 4),
-                'f1Score': round(f1, 4),
-                'cvMean': round(cv_mean, 4) if cv_mean is not None else None,
-                'cvStd': round(cv_std, 4) if cv_std is not None else None
-            },
-            'confusionMatrix': [[int(cell) for cell in row] for row in cm.tolist()],
-            'confusionMatrixImage': cm_image,
-            'classLabels': cm_labels,
-            'featureImportance': feature_importance,
-            'featureImportanceImage': feature_importance_image,
-            'coefficients': coefficients,
-            'coefficientsImage': coefficients_image,
-            'numClasses': int(n_classes),
-            'trainSamples': int(len(X_train)),
-            'testSamples': int(len(X_test)),
-            'numFeatures': int(len(session_data['feature_columns']))
-        }
+        return safe_jsonify({'success': True, 'jobId': job.id, 'status': job.status}), 202
+        
+    except Exception as e:
+        traceback.print_exc()
+        return safe_jsonify({'error': f'Cross-validation error: {str(e)}'}), 500
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_manager.get(job_id, g.session.id)
+    if job is None:
+        return safe_jsonify({'error': 'Job not found.'}), 404
+    return safe_jsonify(job.to_dict())
+
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = job_manager.get(job_id, g.session.id)
+    if job is None:
+        return safe_jsonify({'error': 'Job not found.'}), 404
+    cancelled = job_manager.cancel(job)
+    return safe_jsonify({'success': bool(cancelled), **job.to_dict()})
+
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    try:
+        job = job_manager.get(job_id, g.session.id)
+        if job is None:
+            return safe_jsonify({'error': 'Job not found.'}), 404
+        
+        if not job.future.done():
+            return safe_jsonify(job.to_dict()), 202
+        
+        try:
+            if job.kind == 'cv':
+                return safe_jsonify({'jobId': job.id, **collect_cv_result(job)})
+            response_data = collect_training_result(job)
+        except JobCancelled:
+            return safe_jsonify({**job.to_dict(), 'error': 'Training was cancelled.'}), 409
+        except ValueError as e:
+            return safe_jsonify({'error': str(e)}), 400
         
         print("=" * 50)
         print("TRAINING COMPLETE - Sending response")
         print("=" * 50)
         
-        return safe_jsonify(response_data)
+        return safe_jsonify({'jobId': job.id, **response_data})
         
     except Exception as e:
         print(f"TRAIN ERROR: {e}")
         traceback.print_exc()
-        plt.close('all')
         return safe_jsonify({'error': f'Training error: {str(e)}'}), 500
 
 
+PREDICT_CHUNK_ROWS = 50000
+
+
+def read_prediction_input():
+    """Prediction rows from a CSV upload or a JSON body, as an iterator of DataFrames"""
+    if 'file' in request.files:
+        stream = request.files['file'].stream
+        encoding = sniff_encoding(stream)
+        return pd.read_csv(stream, encoding=encoding, chunksize=PREDICT_CHUNK_ROWS, low_memory=False), 'csv'
+    
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        if 'columns' in data and 'data' in data:
+            df = pd.DataFrame(data['data'], columns=data['columns'])
+        else:
+            df = pd.DataFrame(data.get('rows', []))
+    elif isinstance(data, list):
+        df = pd.DataFrame(data)
+    else:
+        raise ValueError('Send a CSV file or a JSON body with "rows".')
+    return iter([df]), 'ndjson'
+
+
+@app.route('/api/predict', methods=['POST'])
+def predict():
+    try:
+        model_id = request.args.get('modelId')
+        if model_id:
+            try:
+                artifact = model_registry.load(model_id, owner=g.session.id)
+            except ModelNotFound as e:
+                return safe_jsonify({'error': str(e)}), 404
+        else:
+            artifact = session_data.get('model_artifact')
+        if artifact is None:
+            return safe_jsonify({'error': 'No trained model. Please train a model first.'}), 400
+        
+        try:
+            batches, default_format = read_prediction_input()
+            first = next(batches, None)
+        except (ValueError, pd.errors.ParserError) as e:
+            return safe_jsonify({'error': f'Could not read prediction input: {str(e)}'}), 400
+        
+        if first is None:
+            return safe_jsonify({'error': 'No rows to predict.'}), 400
+        
+        first.columns = [str(c).strip() for c in first.columns]
+        missing = artifact.pipeline.missing_columns(first.columns)
+        if missing:
+            return safe_jsonify({'error': f'Missing feature columns: {", ".join(missing)}'}), 400
+        
+        output_format = request.args.get('format', default_format)
+        if output_format not in ['csv', 'ndjson', 'arrow']:
+            return safe_jsonify({'error': 'Format must be "csv", "ndjson" or "arrow".'}), 400
+        
+        def predictions():
+            # Runs while the body streams, after the request's trace has closed;
+            # it only needs the artifact, so the session is not held meanwhile
+            release_session_early()
+            predicting = Stopwatch('predict')
+            offset = 0
+            batch = first
+            try:
+                while batch is not None:
+                    batch.columns = [str(c).strip() for c in batch.columns]
+                    batch.index = pd.RangeIndex(offset, offset + len(batch), name='row')
+                    with predicting:
+                        out = artifact.predict_frame(batch)
+                    yield out
+                    offset += len(batch)
+                    batch = next(batches, None)
+            finally:
+                predicting.record()
+        
+        if output_format == 'arrow':
+            return Response(stream_with_context(arrow_stream(predictions())), mimetype=ARROW_MIMETYPE)
+        
+        def generate():
+            for i, out in enumerate(predictions()):
+                if output_format == 'csv':
+                    yield out.to_csv(header=i == 0)
+                else:
+                    yield out.reset_index().to_json(orient='records', lines=True).rstrip('\n') + '\n'
+        
+        mimetype = 'text/csv' if output_format == 'csv' else 'application/x-ndjson'
+        return Response(stream_with_context(generate()), mimetype=mimetype)
+        
+    except Exception as e:
+        traceback.print_exc()
+        return safe_jsonify({'error': f'Prediction error: {str(e)}'}), 500
+
+
+@app.route('/api/model', methods=['GET'])
+def model_info():
+    artifact = session_data.get('model_artifact')
+    if artifact is None:
+        return safe_jsonify({'error': 'No trained model. Please train a model first.'}), 404
+    return safe_jsonify(artifact.describe())
+
+
+@app.route('/api/model/artifact', methods=['GET'])
+def download_artifact():
+    artifact = session_data.get('model_artifact')
+    if artifact is None:
+        return safe_jsonify({'error': 'No trained model. Please train a model first.'}), 404
+    return Response(
+        artifact.dumps(), mimetype='application/octet-stream',
+        headers={'Content-Disposition': f'attachment; filename="{artifact.model_type}.joblib"'}
+    )
+
+
+@app.route('/api/models', methods=['GET'])
+def list_models():
+    return safe_jsonify({'models': model_registry.list(owner=g.session.id)})
+
+
+@app.route('/api/models/<model_id>', methods=['GET'])
+def get_stored_model(model_id):
+    try:
+        return safe_jsonify(model_registry.describe(model_id, owner=g.session.id))
+    except ModelNotFound as e:
+        return safe_jsonify({'error': str(e)}), 404
+
+
+@app.route('/api/models/<model_id>', methods=['DELETE'])
+def delete_stored_model(model_id):
+    try:
+        model_registry.delete(model_id, owner=g.session.id)
+    except ModelNotFound as e:
+        return safe_jsonify({'error': str(e)}), 404
+    artifact = session_data.get('model_artifact')
+    if artifact is not None and artifact.model_id == model_id:
+        session_data['model'] = None
+        session_data['model_artifact'] = None
+    return safe_jsonify({'success': True, 'modelId': model_id})
+
+
+@app.route('/api/models/<model_id>/plots/<kind>.png', methods=['GET'])
+def get_model_plot(model_id, kind):
+    """A stored model's result plot as a PNG, rendered on first request"""
+    try:
+        meta = model_registry.describe(model_id, owner=g.session.id)
+    except ModelNotFound as e:
+        return safe_jsonify({'error': str(e)}), 404
+    evaluation = meta.get('evaluation')
+    if kind not in available_plots(evaluation):
+        return safe_jsonify({'error': f'Model has no {kind} plot.'}), 404
+    
+    try:
+        png = plot_renderer.render(model_id, kind, evaluation, meta['modelDisplayName'])
+    except Exception as e:
+        print(f"PLOT ERROR: {e}")
+        traceback.print_exc()
+        return safe_jsonify({'error': f'Plot error: {str(e)}'}), 500
+    
+    # Stored models never change, so neither do their plots
+    return Response(png, mimetype='image/png',
+                    headers={'Cache-Control': 'private, max-age=86400, immutable'})
+
+
+@app.route('/api/models/<model_id>/load', methods=['POST'])
+def load_stored_model(model_id):
+    """Make a stored model the session's current model without retraining"""
+    try:
+        artifact = model_registry.load(model_id, owner=g.session.id)
+    except ModelNotFound as e:
+        return safe_jsonify({'error': str(e)}), 404
+    session_data['model'] = artifact.model
+    session_data['model_artifact'] = artifact
+    return safe_jsonify({'success': True, **artifact.describe()})
+
+
 @app.route('/api/reset', methods=['POST'])
 def reset_pipeline():
     try:
         reset_session()
-        plt.close('all')
         return safe_jsonify({'success': True, 'message': 'Pipeline reset successfully'})
     except Exception as e:
         return safe_jsonify({'error': f'Reset failed: {str(e)}'}), 500
@@ -919,20 +1613,62 @@ def reset_pipeline():
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
+    session = session_store.get(client_session_id())
+    state = session.data if session is not None else default_session_state()
     return safe_jsonify({
         'status': 'healthy',
         'sessionState': {
-            'hasData': session_data.get('original_df') is not None,
-            'hasProcessedData': session_data.get('processed_df') is not None,
-            'hasSplitData': session_data.get('X_train') is not None,
-            'hasModel': session_data.get('model') is not None
-        }
+            'hasData': state.get('dataset') is not None,
+            'hasProcessedData': state.get('feature_pipeline') is not None,
+            'hasSplitData': state.get('split') is not None or state.get('stream_split') is not None,
+            'hasModel': state.get('model') is not None
+        },
+        'sessions': session_store.stats(),
+        'jobs': job_manager.stats(),
+        'models': model_registry.stats(),
+        'cvCache': cv_cache.stats(),
+        'plots': plot_renderer.stats(),
+        'stageCache': stage_cache.stats(),
+        'trainCache': train_cache.stats()
     })
 
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text exposition: latency, stage and memory histograms plus cache and job gauges"""
+    caches = {
+        'cv': cv_cache.stats(), 'stage': stage_cache.stats(), 'train': train_cache.stats(),
+        'plots': plot_renderer.stats(), 'models': model_registry.stats()
+    }
+    sessions = session_store.stats()
+    jobs = job_manager.stats()
+    samples = [
+        ('process_resident_memory_bytes', 'gauge', 'Resident memory of the API process.',
+         [({}, current_rss())]),
+        ('process_peak_resident_memory_bytes', 'gauge', 'RSS high-water mark since the last idle request.',
+         [({}, peak_rss())]),
+        ('sessions', 'gauge', 'Live client sessions.', [({}, sessions['sessions'])]),
+        ('session_bytes', 'gauge', 'Estimated memory held by client sessions.', [({}, sessions['totalBytes'])]),
+        ('jobs', 'gauge', 'Tracked jobs by state.',
+         [({'state': state}, jobs[state]) for state in ['queued', 'running', 'finished']]),
+        ('cpu_budget_cores', 'gauge', 'Cores running jobs may use together.', [({}, jobs['cpuBudget'])]),
+        ('cpu_cores_in_use', 'gauge', 'Cores granted to running jobs.', [({}, jobs['coresInUse'])]),
+        ('cache_hits_total', 'counter', 'Cache lookups that hit.',
+         [({'cache': name}, stats['hits']) for name, stats in caches.items()]),
+        ('cache_misses_total', 'counter', 'Cache lookups that missed.',
+         [({'cache': name}, stats['misses']) for name, stats in caches.items()]),
+        ('cache_entries', 'gauge', 'Entries held by each cache.',
+         [({'cache': name}, stats['entries']) for name, stats in caches.items() if 'entries' in stats]),
+    ]
+    return Response(telemetry.render(samples), mimetype='text/plain; version=0.0.4')
+
+
 if __name__ == '__main__':
+    # Development server; production runs under gunicorn (see gunicorn.conf.py)
+    port = int(os.environ.get('PORT', 5000))
+    debug = os.environ.get('FLASK_DEBUG', '1').lower() in ['1', 'true', 'yes', 'on']
     print("=" * 50)
-    print("Starting ML Pipeline Backend...")
-    print("Server running at http://localhost:5000")
+    print("Starting ML Pipeline Backend (development server)...")
+    print(f"Server running at http://localhost:{port}")
     print("=" * 50)
-    app.run(debug=True, port=5000, threaded=True)
\ No newline at end of file
+    app.run(debug=debug, port=port, threaded=True)
\ No newline at end of file
@@ -0,0 +1,84 @@
+import io
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+
+class ModelArtifact:
+    """
+    A fitted FeaturePipeline and model, scored together as one unit.
+
+    Raw rows go in with the original column names and class labels come
+    out, using exactly the transforms the model was trained on. The whole
+    artifact serializes with joblib.
+    """
+
+    def __init__(self, pipeline, model, model_type, model_display_name, metrics=None, evaluation=None):
+        self.pipeline = pipeline
+        self.model = model
+        self.model_type = model_type
+        self.model_display_name = model_display_name
+        self.metrics = metrics or {}
+        # Test-set numbers the result plots are drawn from
+        self.evaluation = evaluation
+        self.created_at = time.time()
+        self.model_id = None
+        self.cv_key = None
+
+    @property
+    def features(self):
+        return self.pipeline.features
+
+    @property
+    def class_names(self):
+        return [str(c) for c in self.pipeline.classes_]
+
+    def predict_frame(self, df):
+        """Predict a DataFrame of raw rows; returns prediction and confidence columns"""
+        X = self.pipeline.transform_features(df)
+        if getattr(self.pipeline, 'sparse', False):
+            from training import accepts_sparse, as_features
+            X = as_features(X, not accepts_sparse(self.model))
+        out = pd.DataFrame(index=df.index)
+        if X.shape[0] == 0:
+            out['prediction'] = pd.Series(dtype=object)
+            return out
+        # The label always comes from predict(): SVC(probability=True) calibrates
+        # predict_proba separately, so its argmax can disagree with predict
+        codes = self.model.predict(X)
+        out['prediction'] = self.pipeline.classes_[codes]
+        if hasattr(self.model, 'predict_proba'):
+            try:
+                proba = self.model.predict_proba(X)
+                # Confidence is the probability given to the predicted class
+                column = np.searchsorted(self.model.classes_, codes)
+                out['confidence'] = proba[np.arange(len(codes)), column]
+            except AttributeError:
+                # e.g. SGDClassifier with hinge loss exposes the method but cannot use it
+                pass
+        return out
+
+    def describe(self):
+        return {
+            'modelId': self.model_id,
+            'modelType': str(self.model_type),
+            'modelDisplayName': str(self.model_display_name),
+            'features': [str(f) for f in self.features],
+            'targetColumn': str(self.pipeline.target_column),
+            'classLabels': self.class_names,
+            'scalingMethod': str(self.pipeline.scaling_method),
+            'metrics': self.metrics,
+            'evaluation': getattr(self, 'evaluation', None),
+            'createdAt': self.created_at
+        }
+
+    def dumps(self):
+        buffer = io.BytesIO()
+        joblib.dump(self, buffer, compress=3)
+        return buffer.getvalue()
+
+    @staticmethod
+    def loads(data):
+        return joblib.load(io.BytesIO(data))
@@ -0,0 +1,75 @@
+"""
+Cold-start benchmark: time from a fresh interpreter to the first /api/health response.
+
+Each run starts a new Python process, imports the app and answers one
+health request through the Flask test client, so nothing is shared with a
+warm interpreter. Also reports which heavy libraries were already imported
+by then; they should only be loaded on first use.
+
+    python benchmarks/cold_start.py [--runs 5] [--json out.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ['sklearn', 'scipy', 'matplotlib', 'seaborn', 'openpyxl']
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+response = app.app.test_client().get('/api/health')
+answered = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({
+    'importSeconds': imported - start,
+    'firstHealthSeconds': answered - start,
+    'loaded': [m for m in %r if m in sys.modules]
+}))
+""" % (HEAVY_MODULES,)
+
+
+def run_once():
+    out = subprocess.run(
+        [sys.executable, '-c', PROBE], cwd=BACKEND_DIR,
+        capture_output=True, text=True, check=True
+    ).stdout
+    # The app prints while importing; the probe's result is the last line
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    # One untimed run so .pyc files exist, as they would after a deploy's first boot
+    run_once()
+    runs = [run_once() for _ in range(args.runs)]
+
+    result = {'runs': args.runs, 'heavyModulesLoaded': sorted({m for r in runs for m in r['loaded']})}
+    for key in ['importSeconds', 'firstHealthSeconds']:
+        values = [r[key] for r in runs]
+        result[key] = {'median': round(statistics.median(values), 4), 'min': round(min(values), 4)}
+
+    print(f"import app:         {result['importSeconds']['median']:.3f}s median, {result['importSeconds']['min']:.3f}s min")
+    print(f"first /api/health:  {result['firstHealthSeconds']['median']:.3f}s median, "
+          f"{result['firstHealthSeconds']['min']:.3f}s min")
+    print(f"heavy modules loaded at first response: {', '.join(result['heavyModulesLoaded']) or 'none'}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+    return result
+
+
+if __name__ == '__main__':
+    main()
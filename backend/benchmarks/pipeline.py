@@ -0,0 +1,384 @@
+"""
+Pipeline benchmark: upload, preprocess, split and train on synthetic data at scale.
+
+Datasets are generated with a given number of rows, feature columns,
+categorical cardinality and target classes, then pushed through
+/api/upload, /api/preprocess, /api/split and /api/train with the Flask
+test client, once per model type. Each stage records its latency,
+throughput, peak RSS and the server's own stage breakdown (Server-Timing,
+or the job's timings for training) into a JSON baseline. A later run can
+be compared against that baseline and fails when a stage got slower or
+bigger than the tolerance allows.
+
+The default grid is small enough for a laptop; --preset full sweeps each
+dimension in turn (rows up to 10M, columns up to 5k) around a base
+scenario. Scenarios from --streaming-rows rows up are preprocessed with
+streaming on and trained with the incremental models only.
+
+    python benchmarks/pipeline.py [--preset quick|full] [--json baseline.json]
+    python benchmarks/pipeline.py --rows 1000,100000 --columns 10,100 --models sgd,knn
+    python benchmarks/pipeline.py --compare baseline.json [--tolerance 0.25]
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# One dimension varies at a time around BASE_SCENARIO in the full preset
+BASE_SCENARIO = {'rows': 100000, 'columns': 50, 'cardinality': 100, 'classes': 2}
+SWEEPS = {
+    'rows': [1000, 10000, 100000, 1000000, 10000000],
+    'columns': [10, 100, 1000, 5000],
+    'cardinality': [10, 1000, 100000],
+    'classes': [2, 10, 100]
+}
+QUICK_GRID = {'rows': [1000, 10000], 'columns': [10, 100], 'cardinality': [10], 'classes': [2]}
+
+# Share of feature columns that are categorical strings; the rest are floats
+CATEGORICAL_SHARE = 0.2
+# Largest training set each model is run on; above it the model is recorded as skipped
+MODEL_ROW_LIMITS = {'svm': 20000, 'knn': 200000, 'gradient_boosting': 200000, 'random_forest': 1000000}
+# Scenarios larger than this (rows x columns) are skipped unless --max-cells says otherwise
+MAX_CELLS = 200_000_000
+GENERATE_CHUNK_ROWS = 100000
+# Untimed run first, so worker start-up and library imports are not charged to the first scenario
+WARMUP_SCENARIO = {'rows': 500, 'columns': 10, 'cardinality': 10, 'classes': 2}
+POLL_SECONDS = 0.05
+
+
+def scenarios(preset, overrides):
+    """Scenario dicts for a preset, or the cross product of explicitly given dimensions"""
+    if any(overrides.values()):
+        grid = {key: overrides[key] or [BASE_SCENARIO[key]] for key in BASE_SCENARIO}
+    elif preset == 'quick':
+        grid = QUICK_GRID
+    else:
+        found = [dict(BASE_SCENARIO)]
+        for key, values in SWEEPS.items():
+            found += [{**BASE_SCENARIO, key: value} for value in values if value != BASE_SCENARIO[key]]
+        return found
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def scenario_name(scenario):
+    return 'rows={rows} columns={columns} cardinality={cardinality} classes={classes}'.format(**scenario)
+
+
+def write_dataset(path, rows, columns, cardinality, classes, seed):
+    """
+    Write a synthetic CSV in chunks: float features, categorical 'c<k>'
+    features and a 'target' column that depends on a few of the floats, so
+    models have something to learn. Returns the file size in bytes.
+    """
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    n_categorical = min(columns - 1, int(round(columns * CATEGORICAL_SHARE))) if columns > 1 else 0
+    n_numeric = columns - n_categorical
+    weights = rng.normal(size=min(n_numeric, 5))
+    labels = np.array([f'class_{k}' for k in range(classes)], dtype=object)
+    categories = np.array([f'c{k}' for k in range(cardinality)], dtype=object)
+
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        for start in range(0, rows, GENERATE_CHUNK_ROWS):
+            n = min(GENERATE_CHUNK_ROWS, rows - start)
+            numeric = rng.normal(size=(n, n_numeric)).astype(np.float32)
+            frame = pd.DataFrame(numeric, columns=[f'num_{i}' for i in range(n_numeric)])
+            for i in range(n_categorical):
+                frame[f'cat_{i}'] = categories[rng.integers(0, cardinality, n)]
+            score = numeric[:, :len(weights)] @ weights + rng.normal(scale=0.5, size=n)
+            # Quantile bins of the score give roughly balanced classes
+            edges = np.quantile(score, np.linspace(0, 1, classes + 1)[1:-1]) if classes > 1 else []
+            frame['target'] = labels[np.searchsorted(edges, score)]
+            frame.to_csv(f, header=start == 0, index=False, float_format='%.5g')
+    return os.path.getsize(path)
+
+
+def parse_server_timing(value):
+    """{stage: seconds} from a Server-Timing header; repeated stages are summed"""
+    stages = {}
+    for entry in filter(None, (part.strip() for part in (value or '').split(','))):
+        name, _, duration = entry.partition(';dur=')
+        try:
+            stages[name] = stages.get(name, 0.0) + float(duration) / 1000
+        except ValueError:
+            continue
+    return stages
+
+
+def measure(client, method, url, rows, **kwargs):
+    """Run one request; latency, rows per second, peak RSS and the server's stage breakdown"""
+    from telemetry import peak_rss, reset_peak_rss
+
+    reset_peak_rss()
+    started = time.perf_counter()
+    response = getattr(client, method)(url, **kwargs)
+    body = response.get_json()
+    seconds = time.perf_counter() - started
+    if response.status_code >= 400:
+        raise RuntimeError(f'{url} returned {response.status_code}: {(body or {}).get("error")}')
+    return body, {
+        'seconds': round(seconds, 4),
+        'rowsPerSecond': round(rows / seconds, 1) if seconds > 0 else None,
+        'peakRssBytes': peak_rss(),
+        'stages': {k: round(v, 4) for k, v in parse_server_timing(response.headers.get('Server-Timing')).items()}
+    }
+
+
+def train(client, model_type, rows, timeout, cv):
+    """Submit a training job and wait for its result; the job's own timings and worker peak RSS are kept"""
+    started = time.perf_counter()
+    body, _ = measure(client, 'post', '/api/train', rows, json={'modelType': model_type, 'params': {}, 'cv': cv})
+    job_id = body['jobId']
+    while True:
+        job = client.get(f'/api/jobs/{job_id}').get_json()
+        if job['status'] in ['done', 'failed', 'cancelled']:
+            break
+        if time.perf_counter() - started > timeout:
+            client.post(f'/api/jobs/{job_id}/cancel')
+            return {'skipped': f'timed out after {timeout}s'}
+        time.sleep(POLL_SECONDS)
+    result = client.get(f'/api/jobs/{job_id}/result')
+    seconds = time.perf_counter() - started
+    if result.status_code >= 400:
+        raise RuntimeError(f'{model_type} training failed: {(result.get_json() or {}).get("error")}')
+    progress = job.get('progress') or {}
+    stages = {}
+    for stage, duration in progress.get('timings', []):
+        stages[stage] = stages.get(stage, 0.0) + duration
+    return {
+        'seconds': round(seconds, 4),
+        'rowsPerSecond': round(rows / seconds, 1) if seconds > 0 else None,
+        'peakRssBytes': progress.get('peakMemoryBytes'),
+        'stages': {k: round(v, 4) for k, v in stages.items()},
+        'testAccuracy': (result.get_json().get('metrics') or {}).get('testAccuracy')
+    }
+
+
+def run_scenario(app, scenario, models, args, seed):
+    """All stages of one scenario on a fresh session; returns {stage: measurement}"""
+    from training import INCREMENTAL_MODEL_TYPES
+
+    rows = scenario['rows']
+    streaming = rows >= args.streaming_rows
+    n_train = int(rows * args.split_ratio)
+    results = {'streaming': streaming}
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'benchmark.csv')
+        started = time.perf_counter()
+        size = write_dataset(path, seed=seed, **scenario)
+        results['generate'] = {'seconds': round(time.perf_counter() - started, 4), 'bytes': size}
+
+        client = app.test_client()
+        with open(path, 'rb') as f:
+            _, results['upload'] = measure(
+                client, 'post', '/api/upload', rows,
+                data={'file': (f, 'benchmark.csv'), 'profileMode': args.profile_mode},
+                content_type='multipart/form-data'
+            )
+        results['upload']['megabytesPerSecond'] = round(size / 2 ** 20 / results['upload']['seconds'], 2)
+
+    body, results['preprocess'] = measure(client, 'post', '/api/preprocess', rows, json={
+        'targetColumn': 'target', 'scalingMethod': args.scaling, 'autoSelect': True,
+        'streaming': streaming, 'encoding': args.encoding
+    })
+    results['preprocess']['features'] = body.get('encodedFeaturesCount')
+    _, results['split'] = measure(client, 'post', '/api/split', rows, json={'splitRatio': args.split_ratio})
+
+    results['train'] = {}
+    for model_type in models:
+        limit = MODEL_ROW_LIMITS.get(model_type)
+        if streaming and model_type not in INCREMENTAL_MODEL_TYPES:
+            results['train'][model_type] = {'skipped': 'not incremental (streaming scenario)'}
+        elif limit and n_train > limit and not args.no_limits:
+            results['train'][model_type] = {'skipped': f'over {limit} training rows'}
+        else:
+            try:
+                results['train'][model_type] = train(client, model_type, n_train, args.timeout, args.cv)
+            except RuntimeError as e:
+                results['train'][model_type] = {'error': str(e)}
+
+    client.post('/api/reset')
+    return results
+
+
+def describe(measurement):
+    if 'seconds' not in measurement:
+        return measurement.get('skipped') or measurement.get('error')
+    peak = measurement.get('peakRssBytes')
+    peak = f'{peak / 2 ** 20:.0f}MB peak' if peak else 'peak n/a'
+    return f"{measurement['seconds']:.3f}s  {measurement.get('rowsPerSecond') or 0:,.0f} rows/s  {peak}"
+
+
+def median_runs(runs):
+    """Combine repeats of a scenario: median seconds, max peak RSS, other fields from the first run"""
+    def combine(measurements):
+        timed = [m for m in measurements if 'seconds' in m]
+        if len(timed) < len(measurements) or not timed:
+            return measurements[0]
+        combined = dict(timed[0])
+        combined['seconds'] = round(statistics.median(m['seconds'] for m in timed), 4)
+        if combined.get('rowsPerSecond'):
+            combined['rowsPerSecond'] = round(statistics.median(m['rowsPerSecond'] for m in timed), 1)
+        peaks = [m['peakRssBytes'] for m in timed if m.get('peakRssBytes')]
+        combined['peakRssBytes'] = max(peaks) if peaks else None
+        return combined
+
+    result = {'streaming': runs[0]['streaming']}
+    for stage in ['generate', 'upload', 'preprocess', 'split']:
+        result[stage] = combine([run[stage] for run in runs])
+    result['train'] = {model: combine([run['train'][model] for run in runs]) for model in runs[0]['train']}
+    return result
+
+
+def flatten(scenario_result):
+    """{(stage, model or ''): measurement} over the timed stages of one scenario"""
+    flat = {(stage, ''): scenario_result[stage] for stage in ['upload', 'preprocess', 'split']}
+    flat.update({('train', model): m for model, m in scenario_result['train'].items()})
+    return flat
+
+
+def compare(result, baseline, tolerance, min_seconds):
+    """Regressions of result against baseline: slower or bigger than (1 + tolerance) times the baseline"""
+    regressions = []
+    previous = {s['name']: s for s in baseline.get('scenarios', []) if 'results' in s}
+    for scenario in result['scenarios']:
+        before = previous.get(scenario['name'])
+        if before is None or 'results' not in scenario:
+            continue
+        old = flatten(before['results'])
+        for key, new in flatten(scenario['results']).items():
+            if key not in old or 'seconds' not in new or 'seconds' not in old[key]:
+                continue
+            label = f"{scenario['name']} {key[0]}{' ' + key[1] if key[1] else ''}"
+            if new['seconds'] > max(min_seconds, old[key]['seconds'] * (1 + tolerance)):
+                regressions.append(f"{label}: {old[key]['seconds']:.3f}s -> {new['seconds']:.3f}s")
+            old_peak, new_peak = old[key].get('peakRssBytes'), new.get('peakRssBytes')
+            if old_peak and new_peak and new_peak > old_peak * (1 + tolerance):
+                regressions.append(f"{label}: peak RSS {old_peak / 2 ** 20:.0f}MB -> {new_peak / 2 ** 20:.0f}MB")
+    return regressions
+
+
+def environment():
+    import numpy
+    import pandas
+    import sklearn
+
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpuCount': os.cpu_count(),
+        'numpy': numpy.__version__,
+        'pandas': pandas.__version__,
+        'sklearn': sklearn.__version__,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z')
+    }
+
+
+def int_list(value):
+    return [int(float(v)) for v in value.split(',') if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--preset', choices=['quick', 'full'], default='quick')
+    parser.add_argument('--rows', type=int_list, help='comma separated, e.g. 1000,1e6')
+    parser.add_argument('--columns', type=int_list)
+    parser.add_argument('--cardinality', type=int_list)
+    parser.add_argument('--classes', type=int_list)
+    parser.add_argument('--models', help='comma separated model types (default: all)')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per scenario; the median is kept')
+    parser.add_argument('--split-ratio', type=float, default=0.8)
+    parser.add_argument('--encoding', default='auto')
+    # Min-max keeps features non-negative, which multinomial naive Bayes requires
+    parser.add_argument('--scaling', default='minmax')
+    parser.add_argument('--profile-mode', choices=['exact', 'approximate'], default='exact')
+    parser.add_argument('--cv', action='store_true', help='include cross-validation in training')
+    parser.add_argument('--streaming-rows', type=int, default=1000000,
+                        help='scenarios with at least this many rows use streaming preprocessing')
+    parser.add_argument('--no-limits', action='store_true', help='ignore the per-model training row limits')
+    parser.add_argument('--max-cells', type=int, default=MAX_CELLS)
+    parser.add_argument('--timeout', type=float, default=1800, help='seconds before a training job is abandoned')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--compare', help='baseline JSON to check the results against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative slowdown or growth')
+    parser.add_argument('--min-seconds', type=float, default=0.1,
+                        help='stages faster than this never count as a regression')
+    args = parser.parse_args()
+
+    # Keep parsed datasets and stored models out of the app's own cache, so
+    # neither side sees the other's entries
+    cache_dir = tempfile.mkdtemp(prefix='benchmark-cache-')
+    os.environ.setdefault('DATASET_CACHE_DIR', os.path.join(cache_dir, 'datasets'))
+    os.environ.setdefault('MODEL_REGISTRY_DIR', os.path.join(cache_dir, 'models'))
+    sys.path.insert(0, BACKEND_DIR)
+    from training import MODEL_TYPES
+    import app as app_module
+
+    models = args.models.split(',') if args.models else list(MODEL_TYPES)
+    unknown = [m for m in models if m not in MODEL_TYPES]
+    if unknown:
+        parser.error(f"unknown model types: {', '.join(unknown)}")
+
+    overrides = {'rows': args.rows, 'columns': args.columns, 'cardinality': args.cardinality, 'classes': args.classes}
+    result = {'environment': environment(), 'options': {
+        'splitRatio': args.split_ratio, 'scaling': args.scaling, 'encoding': args.encoding,
+        'profileMode': args.profile_mode,
+        'cv': args.cv, 'streamingRows': args.streaming_rows, 'repeat': args.repeat
+    }, 'scenarios': []}
+
+    try:
+        run_scenario(app_module.app, WARMUP_SCENARIO, models, args, seed=args.seed + 10 ** 6)
+        for index, scenario in enumerate(scenarios(args.preset, overrides)):
+            name = scenario_name(scenario)
+            if scenario['rows'] * scenario['columns'] > args.max_cells:
+                print(f'{name}: skipped, over --max-cells')
+                result['scenarios'].append({'name': name, **scenario, 'skipped': 'over max cells'})
+                continue
+            print(name)
+            # A new seed per run: identical content would be served from the dataset and stage caches
+            runs = [
+                run_scenario(app_module.app, scenario, models, args, seed=args.seed + 1000 * index + repeat)
+                for repeat in range(args.repeat)
+            ]
+            results = median_runs(runs)
+            for stage in ['upload', 'preprocess', 'split']:
+                print(f'  {stage:<26} {describe(results[stage])}')
+            for model_type, measurement in results['train'].items():
+                print(f'  train {model_type:<20} {describe(measurement)}')
+            result['scenarios'].append({'name': name, **scenario, 'results': results})
+    finally:
+        app_module.job_manager.shutdown()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.tolerance, args.min_seconds)
+        for line in regressions:
+            print(f'REGRESSION {line}')
+        if regressions:
+            sys.exit(1)
+        print(f'No regressions against {args.compare}')
+    return result
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+
+def stage_key(*parts):
+    """Stable hash of a pipeline stage's upstream key and request parameters"""
+    payload = json.dumps(parts, sort_keys=True, default=repr, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def params_key(model):
+    """Hash of the estimator parameters that affect its fitted result"""
+    params = {k: v for k, v in model.get_params().items() if k not in ('n_jobs', 'verbose')}
+    return stage_key(type(model).__name__, params)
+
+
+class LRUCache:
+    """
+    Thread-safe mapping bounded by entry count and, optionally, total size.
+
+    The least recently used entries are dropped first. When max_bytes is
+    set, sizeof(value) gives each entry's estimated size in bytes.
+    """
+
+    def __init__(self, max_entries=1000, max_bytes=None, sizeof=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def put(self, key, value):
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._sizes.pop(key)
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._sizes[key] = size
+            self._total_bytes += size
+            while len(self._entries) > self.max_entries or (
+                    self.max_bytes is not None and self._total_bytes > self.max_bytes):
+                evicted, _ = self._entries.popitem(last=False)
+                self._total_bytes -= self._sizes.pop(evicted)
+
+    def stats(self):
+        with self._lock:
+            stats = {'entries': len(self._entries), 'maxEntries': self.max_entries,
+                     'hits': self._hits, 'misses': self._misses}
+            if self.max_bytes is not None:
+                stats.update({'totalBytes': self._total_bytes, 'maxBytes': self.max_bytes})
+            return stats
@@ -0,0 +1,299 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import pyarrow as pa
+
+from profiling import DatasetProfile
+
+
+CACHE_DIR = os.environ.get(
+    'DATASET_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'datasets')
+)
+CACHE_MAX_BYTES = int(float(os.environ.get('DATASET_CACHE_MAX_MB', 10240)) * 1024 * 1024)
+
+STORE_BATCH_ROWS = 65536
+
+_HASH_BLOCK = 1024 * 1024
+
+
+class DatasetMissing(Exception):
+    """Raised when a cached dataset file has been evicted or removed"""
+
+
+class Dataset:
+    """
+    Handle to an uploaded dataset stored as an uncompressed Arrow IPC file.
+
+    The file is memory-mapped on read, so selecting columns only touches
+    the pages for those columns. The handle itself is small enough to keep
+    in a session in place of the DataFrame.
+    """
+
+    def __init__(self, key, path, summary, profile):
+        self.key = key
+        self.path = path
+        self.summary = summary
+        self.profile = profile
+        with pa.memory_map(path, 'r') as source:
+            reader = pa.ipc.open_file(source)
+            self.schema = reader.schema
+            self.num_rows = sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+
+    @property
+    def columns(self):
+        return list(self.schema.names)
+
+    def __len__(self):
+        return self.num_rows
+
+    def read_table(self, columns=None):
+        if not os.path.exists(self.path):
+            raise DatasetMissing('The uploaded dataset is no longer available. Please upload it again.')
+        source = pa.memory_map(self.path, 'r')
+        table = pa.ipc.open_file(source).read_all()
+        if columns is not None:
+            table = table.select(list(columns))
+        return table
+
+    def read(self, columns=None, categorical=False):
+        """Load the dataset (or just the given columns) as a DataFrame; string columns as categoricals if asked"""
+        return self.read_table(columns).to_pandas(
+            split_blocks=True, self_destruct=True, strings_to_categorical=categorical
+        )
+
+    def iter_batches(self, columns=None, batch_rows=100000):
+        """Yield the dataset as DataFrames of at most batch_rows rows"""
+        table = self.read_table(columns)
+        for batch in table.to_batches(max_chunksize=batch_rows):
+            yield batch.to_pandas()
+
+
+def _to_arrow(df):
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Object columns mixing Python types (e.g. from Excel) are stored as text
+        df = df.copy()
+        for col in df.columns:
+            if df[col].dtype == 'object':
+                df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+
+class DatasetWriter:
+    """
+    Writes a dataset into the cache one DataFrame chunk at a time.
+
+    Chunks are appended to a temporary Arrow IPC file under the first
+    chunk's schema, so only one chunk is held in memory. A column that a
+    later chunk cannot be cast to that schema without loss is written as
+    nulls and listed in conflicts; rewrite() can then supply it again.
+    commit() moves the file into the cache.
+    """
+
+    def __init__(self, cache, key):
+        self.cache = cache
+        self.key = key
+        data_path, _ = cache._paths(key)
+        self._tmp_path = f'{data_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        self._sink = None
+        self._writer = None
+        self.schema = None
+        self.rows = 0
+        # Arrow type of each column over the chunks where it has values
+        self.types = {}
+        self.conflicts = set()
+
+    def _conform(self, table):
+        columns = []
+        for field in self.schema:
+            column = table.column(field.name)
+            if column.null_count < len(column):
+                previous = self.types.get(field.name)
+                try:
+                    self.types[field.name] = column.type if previous is None else pa.unify_schemas(
+                        [pa.schema([field.with_type(previous)]), pa.schema([field.with_type(column.type)])],
+                        promote_options='permissive'
+                    ).field(field.name).type
+                except (pa.ArrowInvalid, pa.ArrowTypeError):
+                    # e.g. booleans in one chunk, text in another: kept as text
+                    self.types[field.name] = pa.string()
+                    self.conflicts.add(field.name)
+            if column.type != field.type:
+                try:
+                    column = column.cast(field.type)
+                except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+                    self.conflicts.add(field.name)
+                    column = pa.nulls(len(column), field.type)
+            columns.append(column)
+        return pa.Table.from_arrays(columns, schema=self.schema)
+
+    def write(self, df):
+        table = _to_arrow(df)
+        if self._writer is None:
+            self.schema = table.schema
+            self._sink = pa.OSFile(self._tmp_path, 'wb')
+            self._writer = pa.ipc.new_file(self._sink, self.schema)
+        table = self._conform(table)
+        # Bounded record batches so streaming readers never see one huge batch
+        self._writer.write_table(table, max_chunksize=STORE_BATCH_ROWS)
+        self.rows += table.num_rows
+
+    def _close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._sink.close()
+            self._writer = self._sink = None
+
+    def read_table(self):
+        """Everything written so far, memory-mapped from the temporary file"""
+        self._close()
+        return pa.ipc.open_file(pa.memory_map(self._tmp_path, 'r')).read_all()
+
+    def head(self, n):
+        return self.read_table().slice(0, n).to_pandas()
+
+    def rewrite(self, schema, replacements=None, batch_rows=STORE_BATCH_ROWS):
+        """
+        Rewrite the file under schema, casting each column and dropping the
+        ones not in it. replacements, if given, yields consecutive DataFrames
+        covering every row, whose columns are taken in place of the written ones.
+        """
+        table = self.read_table()
+        if replacements is None:
+            replacements = (None for _ in range(0, table.num_rows, batch_rows))
+        rewrite_path = self._tmp_path + '.rewrite'
+        offset = 0
+        with pa.OSFile(rewrite_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, schema) as writer:
+                for part in replacements:
+                    n_rows = batch_rows if part is None else len(part)
+                    piece = table.slice(offset, n_rows)
+                    replaced = None if part is None else _to_arrow(part)
+                    columns = []
+                    for field in schema:
+                        source = replaced if replaced is not None and field.name in replaced.column_names else piece
+                        # Unchecked like a pandas concat: int64 ids beyond 2**53 may round as float64
+                        columns.append(source.column(field.name).cast(field.type, safe=False))
+                    writer.write_table(pa.Table.from_arrays(columns, schema=schema), max_chunksize=STORE_BATCH_ROWS)
+                    offset += piece.num_rows
+        del table
+        os.replace(rewrite_path, self._tmp_path)
+        self.schema = schema
+        self.conflicts = set()
+
+    def commit(self, summary, profile):
+        self._close()
+        data_path, _ = self.cache._paths(self.key)
+        os.replace(self._tmp_path, data_path)
+        self.cache._write_meta(self.key, summary, profile)
+        self.cache._prune(keep=self.key)
+        return Dataset(self.key, data_path, summary, profile)
+
+    def abort(self):
+        self._close()
+        for path in (self._tmp_path, self._tmp_path + '.rewrite'):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class DatasetCache:
+    """Content-addressed on-disk store of parsed uploads"""
+
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def content_key(stream, kind):
+        """Hash of the raw upload bytes plus the parser that will read them"""
+        digest = hashlib.sha256(kind.encode('utf-8') + b':')
+        stream.seek(0)
+        for block in iter(lambda: stream.read(_HASH_BLOCK), b''):
+            digest.update(block)
+        stream.seek(0)
+        return digest.hexdigest()
+
+    def _paths(self, key):
+        base = os.path.join(self.root, key)
+        return base + '.arrow', base + '.json'
+
+    def get(self, key):
+        if not all(c in '0123456789abcdef' for c in key):
+            return None
+        data_path, meta_path = self._paths(key)
+        if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+            return None
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            profile = DatasetProfile.from_dict(meta['profile'])
+            dataset = Dataset(key, data_path, meta['summary'], profile)
+        except (OSError, ValueError, KeyError, pa.ArrowException) as e:
+            print(f"Discarding unreadable cached dataset {key[:12]}: {e}")
+            return None
+        now = time.time()
+        os.utime(data_path, (now, now))
+        return dataset
+
+    def _write_meta(self, key, summary, profile):
+        _, meta_path = self._paths(key)
+        tmp_meta = f'{meta_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_meta, 'w', encoding='utf-8') as f:
+            json.dump({'summary': summary, 'profile': profile.to_dict()}, f)
+        os.replace(tmp_meta, meta_path)
+
+    def update_profile(self, dataset, summary, profile):
+        """Replace the stored summary and profile of a cached dataset"""
+        self._write_meta(dataset.key, summary, profile)
+        dataset.summary = summary
+        dataset.profile = profile
+        return dataset
+
+    def writer(self, key):
+        """A DatasetWriter that stores a dataset under key chunk by chunk"""
+        return DatasetWriter(self, key)
+
+    def put(self, key, df, summary, profile):
+        writer = self.writer(key)
+        try:
+            writer.write(df)
+            return writer.commit(summary, profile)
+        except BaseException:
+            writer.abort()
+            raise
+
+    def _prune(self, keep):
+        """Delete least recently used datasets beyond the size budget"""
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.root):
+                if not name.endswith('.arrow'):
+                    continue
+                path = os.path.join(self.root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name[:-len('.arrow')]))
+            total = sum(size for _, size, _ in entries)
+            for _, size, key in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if key == keep:
+                    continue
+                for path in self._paths(key):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                total -= size
+                print(f"Evicted cached dataset {key[:12]} ({size} bytes)")
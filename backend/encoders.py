@@ -0,0 +1,202 @@
+"""
+Encoders for categorical feature columns.
+
+Each batch of a column is factorized once, so string conversion, lookups
+and counting happen per distinct value rather than per row. Frequency and
+target encoders are fitted in the same pass over the data as the rest of
+the FeaturePipeline; feature hashing has no fitted state at all, which is
+what makes it usable on columns too wide to keep a category list for.
+One-hot and hashed blocks are built as scipy CSR matrices.
+"""
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+
+# Values accepted for the preprocess encoding option ('auto' hashes text
+# columns and label-encodes the other categoricals)
+ENCODINGS = ['auto', 'label', 'onehot', 'hashing', 'frequency', 'target']
+
+# Output columns shared by every hashed feature, by default and at most
+HASH_BUCKETS = 256
+HASH_BUCKETS_MAX = 65536
+# Importances of hashed buckets cannot be told apart by feature; they are reported under this name
+HASHED_SOURCE = 'hashed features'
+# One-hot columns a single feature may expand into; wider columns should be hashed
+ONEHOT_MAX_CATEGORIES = 1000
+# Out-of-fold target encoding: folds, and the prior's weight in rows
+TARGET_FOLDS = 5
+TARGET_SMOOTHING = 10.0
+
+
+def factorize_strings(column, missing_label='Unknown'):
+    """
+    (codes, labels) for a column: labels are its distinct values as sorted
+    strings, missing ones as missing_label, and codes index them per row.
+    """
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        codes = column.cat.codes.to_numpy().astype(np.intp)
+        labels = column.cat.categories.astype(str).to_numpy(dtype=object)
+    else:
+        codes, uniques = pd.factorize(column)
+        labels = pd.Index(uniques).astype(str).to_numpy(dtype=object)
+    labels = np.append(labels, np.array([missing_label], dtype=object))
+    codes = np.where(codes < 0, len(labels) - 1, codes)
+    # Distinct raw values can share a string form (1 and '1'); merge them
+    labels, inverse = np.unique(labels, return_inverse=True)
+    return inverse[codes], labels
+
+
+def _lookup(categories, labels):
+    """Position of each label in sorted categories; unseen labels map to -1"""
+    if len(categories) == 0:
+        return np.full(len(labels), -1, dtype=np.intp)
+    positions = np.minimum(np.searchsorted(categories, labels), len(categories) - 1)
+    return np.where(categories[positions] == labels, positions, -1)
+
+
+def one_hot(codes, n_categories):
+    """CSR indicator matrix for category codes; -1 (unseen) rows stay empty"""
+    from scipy import sparse
+
+    rows = np.flatnonzero(codes >= 0)
+    data = np.ones(len(rows))
+    return sparse.csr_matrix((data, (rows, codes[rows])), shape=(len(codes), n_categories))
+
+
+class CategoryHasher:
+    """Signed hashing of (column, value) pairs into n_buckets shared output columns"""
+
+    def __init__(self, n_buckets=HASH_BUCKETS):
+        self.n_buckets = int(n_buckets)
+
+    @staticmethod
+    def _column_key(name):
+        # hash_array takes a 16 character key; one per column keeps equal values in
+        # different columns apart
+        return hashlib.md5(str(name).encode('utf-8')).hexdigest()[:16]
+
+    def transform(self, columns, n_rows):
+        """CSR matrix for [(name, codes, labels), ...]; collisions add up"""
+        from scipy import sparse
+
+        rows, cols, data = [], [], []
+        for name, codes, labels in columns:
+            hashed = pd.util.hash_array(labels, hash_key=self._column_key(name), categorize=False)
+            bucket = (hashed % np.uint64(self.n_buckets)).astype(np.intp)
+            # The top bit picks the sign, so collisions cancel out on average
+            sign = np.where(hashed >> np.uint64(63), -1.0, 1.0)
+            rows.append(np.arange(n_rows))
+            cols.append(bucket[codes])
+            data.append(sign[codes])
+        if not rows:
+            return sparse.csr_matrix((n_rows, self.n_buckets))
+        matrix = sparse.coo_matrix(
+            (np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+            shape=(n_rows, self.n_buckets)
+        )
+        return matrix.tocsr()
+
+
+class FrequencyEncoder:
+    """Each value as the share of training rows that have it; unseen values get 0"""
+
+    def __init__(self):
+        self.categories_ = None
+        self.frequencies_ = None
+        self._counts = None
+
+    def update(self, codes, labels):
+        counts = np.bincount(codes, minlength=len(labels))
+        batch = pd.Series(counts, index=labels)[counts > 0]
+        self._counts = batch if self._counts is None else self._counts.add(batch, fill_value=0)
+
+    def finish(self, n_rows):
+        counts = self._counts if self._counts is not None else pd.Series(dtype=np.int64)
+        counts = counts.sort_index()
+        self.categories_ = counts.index.to_numpy(dtype=object)
+        self.frequencies_ = counts.to_numpy(dtype=np.float64) / max(1, n_rows)
+        self._counts = None
+        return self
+
+    def output_names(self, name):
+        return [name]
+
+    def transform(self, codes, labels):
+        positions = _lookup(self.categories_, labels)[codes]
+        return np.append(self.frequencies_, 0.0)[positions][:, None]
+
+
+class TargetEncoder:
+    """
+    Each value as its smoothed per-class target rate.
+
+    Rates are blended with the overall class shares, weighted by
+    TARGET_SMOOTHING rows, so rare values fall back to the prior. Training
+    rows are encoded out of fold: a row in fold f only sees statistics of
+    the other folds, so its own label never leaks into its features.
+    Binary targets produce one column (the rate of the second class),
+    multiclass targets one per class.
+    """
+
+    def __init__(self, n_folds=TARGET_FOLDS, smoothing=TARGET_SMOOTHING):
+        self.n_folds = int(n_folds)
+        self.smoothing = float(smoothing)
+        self.categories_ = None
+        self.classes_ = None
+        self.fold_counts_ = None
+        self.counts_ = None
+        self.prior_ = None
+        self._counts = None
+
+    def update(self, codes, labels, targets, folds):
+        """Count (value, class, fold) triples for a batch; targets are the rows' class labels"""
+        target_codes, target_labels = pd.factorize(targets)
+        n_targets = len(target_labels)
+        keys = (codes * n_targets + target_codes) * self.n_folds + folds
+        counts = np.bincount(keys)
+        present = np.flatnonzero(counts)
+        value, rest = np.divmod(present, n_targets * self.n_folds)
+        target, fold = np.divmod(rest, self.n_folds)
+        index = pd.MultiIndex.from_arrays([labels[value], np.asarray(target_labels, dtype=object)[target], fold])
+        batch = pd.Series(counts[present], index=index)
+        self._counts = batch if self._counts is None else self._counts.add(batch, fill_value=0)
+
+    def finish(self, classes):
+        self.classes_ = np.asarray(classes, dtype=object)
+        counts = self._counts if self._counts is not None else pd.Series(
+            dtype=np.int64, index=pd.MultiIndex.from_arrays([[], [], []]))
+        values = counts.index.get_level_values(0).to_numpy(dtype=object)
+        self.categories_ = np.unique(values) if len(values) else np.array([], dtype=object)
+        fold_counts = np.zeros((self.n_folds, len(self.categories_), len(self.classes_)))
+        np.add.at(fold_counts, (
+            counts.index.get_level_values(2).to_numpy(dtype=np.intp),
+            np.searchsorted(self.categories_, values),
+            np.searchsorted(self.classes_, counts.index.get_level_values(1).to_numpy(dtype=object))
+        ), counts.to_numpy(dtype=np.float64))
+        self.fold_counts_ = fold_counts
+        self.counts_ = fold_counts.sum(axis=0)
+        total = self.counts_.sum()
+        self.prior_ = self.counts_.sum(axis=0) / total if total else np.full(len(self.classes_), 1 / max(1, len(self.classes_)))
+        self._counts = None
+        return self
+
+    @property
+    def _outputs(self):
+        return [1] if len(self.classes_) == 2 else list(range(len(self.classes_)))
+
+    def output_names(self, name):
+        return [f'{name}_target_{self.classes_[k]}' for k in self._outputs]
+
+    def transform(self, codes, labels, folds=None):
+        """Encoded rates; with folds (training rows) each row's own fold is left out"""
+        positions = _lookup(self.categories_, labels)[codes]
+        seen = positions >= 0
+        counts = np.zeros((len(codes), len(self.classes_)))
+        counts[seen] = self.counts_[positions[seen]]
+        if folds is not None:
+            counts[seen] -= self.fold_counts_[folds[seen], positions[seen]]
+        n = counts.sum(axis=1, keepdims=True)
+        rates = (counts + self.smoothing * self.prior_) / (n + self.smoothing)
+        return rates[:, self._outputs]
@@ -0,0 +1,88 @@
+"""
+Gunicorn settings for serving the backend in production:
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Sessions, jobs and caches live in the memory of the web worker process,
+so a client has to reach the same worker on every request. The default is
+therefore one worker with many threads: requests only parse, preprocess
+and serve results, while training, CV and search run in the JobManager's
+process pool (TRAIN_WORKERS), which is what spreads CPU work across
+cores. More web workers only make sense behind a proxy that pins each
+session to one of them.
+
+The app and the libraries it imports lazily are loaded once in the master
+before forking, so workers start warm and share those pages. Nothing in
+the master starts a thread or runs BLAS/OpenMP code before the fork; the
+job pool is started on first use, inside the worker.
+"""
+import importlib
+import os
+
+
+def _int_env(name, default):
+    return int(os.environ.get(name, default))
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+# Not WEB_CONCURRENCY: hosts set that one from the core count, which would
+# split sessions across workers
+workers = _int_env('WEB_WORKERS', 1)
+worker_class = 'gthread'
+threads = _int_env('WEB_THREADS', 8)
+
+# Long uploads and preprocessing of large files run in the request; training does not
+timeout = _int_env('WEB_TIMEOUT', 300)
+graceful_timeout = _int_env('WEB_GRACEFUL_TIMEOUT', 60)
+keepalive = 5
+# Never recycle workers on a request count: that would drop every session they hold
+max_requests = 0
+
+preload_app = True
+accesslog = '-'
+errorlog = '-'
+
+# BLAS/OpenMP threads per web worker; request handlers share the worker's
+# cores between WEB_THREADS threads, so one each avoids oversubscription.
+# Job processes are spawned and keep their own defaults.
+WEB_BLAS_THREADS = _int_env('WEB_BLAS_THREADS', 1)
+
+# Imported lazily by the app; loading them in the master means the first
+# request of each worker does not pay for them
+PRELOAD_MODULES = [
+    'scipy.sparse', 'joblib',
+    'sklearn.preprocessing', 'sklearn.impute', 'sklearn.model_selection', 'sklearn.metrics',
+    'sklearn.linear_model', 'sklearn.tree', 'sklearn.ensemble', 'sklearn.svm',
+    'sklearn.neighbors', 'sklearn.naive_bayes',
+    'matplotlib.figure', 'matplotlib.backends.backend_agg', 'seaborn'
+]
+
+# Plots are drawn on Figure objects; never let pyplot pick a GUI backend
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+
+def on_starting(server):
+    if workers > 1:
+        server.log.warning(
+            'WEB_WORKERS=%s: sessions and jobs are per worker, so clients need a proxy '
+            'with session affinity in front of the workers', workers
+        )
+    for name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            server.log.warning('Could not preload %s: %s', name, e)
+
+
+def post_fork(server, worker):
+    from threadpoolctl import threadpool_limits
+
+    threadpool_limits(limits=WEB_BLAS_THREADS)
+
+
+def worker_exit(server, worker):
+    # Stop the worker's job pool and its manager process with it
+    import app
+
+    app.job_manager.shutdown()
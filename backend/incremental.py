@@ -0,0 +1,122 @@
+import numpy as np
+
+from jobs import JobCancelled
+from telemetry import Stopwatch, span
+from training import (
+    accepts_sparse, as_features, build_training_response, confusion_matrix_labels, metrics_from_confusion
+)
+
+
+def _accumulate(cm, y_true, y_pred):
+    n = cm.shape[0]
+    cm += np.bincount(y_true * n + y_pred, minlength=n * n).reshape(n, n)
+
+
+def train_incremental(reporter, model, model_type, model_display_name,
+                      dataset, pipeline, split, epochs=1, batch_rows=10000, seed=42):
+    """
+    Train a partial_fit estimator over a stored dataset, one batch at a time.
+
+    Batches are read from the memory-mapped dataset, transformed with the
+    fitted FeaturePipeline and routed to train or test by the HashSplit, so
+    memory stays bounded by batch_rows. A final pass accumulates train and
+    test confusion matrices for the metrics. Runs inside a job worker.
+    """
+    n_classes = pipeline.n_classes
+    classes = np.arange(n_classes)
+    n_batches = max(1, -(-len(dataset) // batch_rows))
+    total = epochs * n_batches
+    rng = np.random.default_rng(seed)
+    # Sparse batches are expanded one at a time for estimators that need dense input
+    densify = pipeline.sparse and not accepts_sparse(model)
+    # Batches interleave transforming and fitting; time each side separately
+    encoding, fitting, predicting = Stopwatch('encode'), Stopwatch('fit'), Stopwatch('predict')
+
+    reporter.update(stage='fit', batchesDone=0, batchesTotal=total, epoch=0, epochs=epochs)
+    print(f"Training {model_display_name} incrementally ({epochs} epochs x {n_batches} batches)...")
+
+    done = 0
+    try:
+        for epoch in range(1, epochs + 1):
+            start = 0
+            for batch in dataset.iter_batches(pipeline.columns, batch_rows=batch_rows):
+                reporter.check_cancelled()
+                with encoding:
+                    is_train = split.is_train(start, len(batch))[pipeline.kept_rows(batch)]
+                    X, y = pipeline.transform(batch, start=start)
+                    start += len(batch)
+                    X, y = X[is_train], y[is_train]
+                    if densify:
+                        X = as_features(X, dense=True)
+                if len(y):
+                    order = rng.permutation(len(y))
+                    with fitting:
+                        model.partial_fit(X[order], y[order], classes=classes)
+                done += 1
+                reporter.update(batchesDone=done, epoch=epoch)
+    except JobCancelled:
+        raise
+    except Exception as e:
+        print(f"ERROR training model: {e}")
+        raise ValueError(f'Training failed: {str(e)}')
+    fitting.record()
+
+    if not hasattr(model, 'classes_'):
+        raise ValueError('Training failed: no training rows were found.')
+
+    # Evaluation pass
+    reporter.update(stage='predict')
+    cm_train = np.zeros((n_classes, n_classes), dtype=np.int64)
+    cm_test = np.zeros((n_classes, n_classes), dtype=np.int64)
+    start = 0
+    for batch in dataset.iter_batches(pipeline.columns, batch_rows=batch_rows):
+        reporter.check_cancelled()
+        with encoding:
+            is_train = split.is_train(start, len(batch))[pipeline.kept_rows(batch)]
+            X, y = pipeline.transform(batch, start=start)
+            start += len(batch)
+            if densify and len(y):
+                X = as_features(X, dense=True)
+        if not len(y):
+            continue
+        with predicting:
+            y_pred = model.predict(X)
+        _accumulate(cm_train, y[is_train], y_pred[is_train])
+        _accumulate(cm_test, y[~is_train], y_pred[~is_train])
+    encoding.record()
+    predicting.record()
+
+    with span('metrics'):
+        n_train = int(cm_train.sum())
+        n_test = int(cm_test.sum())
+        train_accuracy = float(np.trace(cm_train) / n_train) if n_train else 0.0
+        test_accuracy, precision, recall, f1 = metrics_from_confusion(cm_test, n_classes)
+
+        print(f"Train accuracy: {train_accuracy:.4f}")
+        print(f"Test accuracy: {test_accuracy:.4f}")
+
+        # Restrict the matrix to classes seen in the test set or its predictions,
+        # as sklearn's confusion_matrix does
+        present = np.flatnonzero(cm_test.sum(axis=0) + cm_test.sum(axis=1))
+        cm = cm_test[np.ix_(present, present)]
+        cm_labels = confusion_matrix_labels(present, present, list(pipeline.classes_), cm.shape[0])
+
+        response_data = build_training_response(
+            model, model_type, model_display_name,
+            {
+                'trainAccuracy': train_accuracy,
+                'testAccuracy': test_accuracy,
+                'precision': precision,
+                'recall': recall,
+                'f1Score': f1,
+                'cvMean': None,
+                'cvStd': None
+            },
+            cm, cm_labels, pipeline.output_features, int((cm_train.sum(axis=1) > 0).sum()), n_train, n_test,
+            feature_sources=pipeline.feature_sources
+        )
+    response_data['epochs'] = int(epochs)
+    response_data['batchRows'] = int(batch_rows)
+
+    reporter.update(stage='done')
+    return {'response': response_data, 'model': model}
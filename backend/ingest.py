@@ -0,0 +1,149 @@
+import codecs
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from profiling import ProfileBuilder
+from telemetry import Stopwatch
+
+
+CHUNK_ROWS = int(os.environ.get('INGEST_CHUNK_ROWS', 100000))
+SNIFF_BYTES = 64 * 1024
+
+
+def sniff_encoding(stream):
+    """Pick a text encoding from the first few KB of an upload"""
+    position = stream.tell()
+    head = stream.read(SNIFF_BYTES)
+    stream.seek(position)
+
+    if head.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    try:
+        # Incremental so a multi-byte character cut at the boundary is not an error
+        codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        # latin-1 maps every byte, so it always parses
+        return 'latin-1'
+
+
+def _clean_header(columns):
+    """Strip names and drop duplicates; returns (positions to keep, cleaned names)"""
+    names = pd.Index(columns).astype(str).str.strip()
+    keep = ~names.duplicated()
+    return np.flatnonzero(keep), list(names[keep])
+
+
+def _read_chunks(stream, encoding, chunk_rows, **kwargs):
+    stream.seek(0)
+    return pd.read_csv(stream, encoding=encoding, chunksize=chunk_rows, low_memory=False, **kwargs)
+
+
+def _final_schema(writer, builder, names, mixed):
+    """Column types of the stored dataset; entirely empty columns are dropped"""
+    fields = []
+    for name in names:
+        non_null = builder.column_non_null(name)
+        if non_null == 0:
+            continue
+        type = pa.string() if name in mixed else writer.types[name]
+        if pa.types.is_integer(type) and non_null < builder.rows:
+            # A chunk with missing values was parsed as float; pandas would concat to float too
+            type = pa.float64()
+        fields.append(pa.field(name, type))
+    return pa.schema(fields)
+
+
+def _pandas_dtypes(schema, builder):
+    """dtypes the stored columns read back with; booleans with nulls come back as object"""
+    dtypes = schema.empty_table().to_pandas().dtypes
+    for name, dtype in dtypes.items():
+        if pd.api.types.is_bool_dtype(dtype) and builder.column_non_null(name) < builder.rows:
+            dtypes[name] = np.dtype(object)
+    return dtypes
+
+
+def _ingest(stream, encoding, chunk_rows, open_writer, profile_options):
+    positions = None
+    names = None
+    builder = None
+    writer = open_writer()
+    # Profiling is interleaved with parsing; its share is reported as the 'profile' stage
+    profiling = Stopwatch('profile')
+
+    try:
+        # Each chunk goes to the Arrow file as soon as it is parsed; only one is held at a time
+        for chunk in _read_chunks(stream, encoding, chunk_rows):
+            if positions is None:
+                positions, names = _clean_header(chunk.columns)
+                builder = ProfileBuilder(names, **profile_options)
+            chunk = chunk.iloc[:, positions]
+            chunk.columns = names
+            with profiling:
+                builder.update(chunk)
+            writer.write(chunk)
+            del chunk
+
+        if builder is None or builder.rows == 0:
+            writer.abort()
+            return None, None
+
+        # A column whose chunks were inferred differently (e.g. numbers in one
+        # chunk, text in another) would be parsed as text by a single full read.
+        # Re-read just those columns as strings so the result matches; columns
+        # a chunk could not be stored under the first chunk's type are re-read too.
+        mixed = {name for name in names if len(builder.column_kinds(name)) > 1}
+        schema = _final_schema(writer, builder, names, mixed)
+        if not schema.names:
+            writer.abort()
+            return None, None
+        reread = [name for name in schema.names if name in mixed or name in writer.conflicts]
+
+        if reread:
+            index = [names.index(name) for name in reread]
+            as_text = {int(positions[i]): str for i, name in zip(index, reread) if schema.field(name).type == pa.string()}
+            builder.reset(sorted(mixed))
+
+            def replacements():
+                for chunk in _read_chunks(stream, encoding, chunk_rows, usecols=list(positions[index]), dtype=as_text):
+                    chunk.columns = reread
+                    if mixed:
+                        with profiling:
+                            builder.update(chunk[[name for name in reread if name in mixed]], count_rows=False)
+                    yield chunk
+
+            writer.rewrite(schema, replacements())
+        elif not schema.equals(writer.schema, check_metadata=False):
+            writer.rewrite(schema, batch_rows=chunk_rows)
+
+        with profiling:
+            profile = builder.finish(_pandas_dtypes(writer.schema, builder))
+        profiling.record()
+        return writer, profile
+    except BaseException:
+        writer.abort()
+        raise
+
+
+def read_csv_streaming(stream, open_writer, chunk_rows=CHUNK_ROWS, **profile_options):
+    """
+    Parse a CSV upload in chunks, storing each one through a DatasetWriter
+    and collecting column statistics as it goes.
+
+    open_writer returns a fresh DatasetWriter. The encoding is sniffed from
+    the head of the stream; if a later chunk turns out not to be valid UTF-8
+    the read restarts as latin-1 with a new writer. Returns the writer (not
+    yet committed), its DatasetProfile and the encoding used; the writer and
+    profile are None when the file has no rows or only empty columns.
+    profile_options are passed to ProfileBuilder (e.g. approximate=True).
+    """
+    encoding = sniff_encoding(stream)
+    try:
+        writer, profile = _ingest(stream, encoding, chunk_rows, open_writer, profile_options)
+    except UnicodeDecodeError:
+        encoding = 'latin-1'
+        writer, profile = _ingest(stream, encoding, chunk_rows, open_writer, profile_options)
+    return writer, profile, encoding
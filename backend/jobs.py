@@ -0,0 +1,330 @@
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor, CancelledError
+from concurrent.futures.process import BrokenProcessPool
+
+from scheduler import CpuBudget, thread_limits
+from telemetry import (
+    MEMORY_BUCKETS, begin_trace, end_trace, peak_rss, record_trace, reset_peak_rss, telemetry
+)
+
+
+class JobCancelled(Exception):
+    """Raised inside a worker when the client cancelled the job"""
+
+
+class JobQueueFull(Exception):
+    """Raised when too many jobs are queued or running"""
+
+
+class WorkerLost(Exception):
+    """Set on a job whose worker process died, e.g. killed for running out of memory"""
+
+    def __init__(self):
+        super().__init__('The worker running this job stopped unexpectedly (it may have run out of memory). '
+                         'Please try again.')
+
+
+class ProgressReporter:
+    """Worker-side handle for publishing progress and checking for cancellation"""
+
+    def __init__(self, progress):
+        self._progress = progress
+
+    def update(self, **fields):
+        self._progress.update(fields)
+
+    def cancelled(self):
+        return bool(self._progress.get('cancelRequested', False))
+
+    def check_cancelled(self):
+        if self.cancelled():
+            raise JobCancelled('Job cancelled')
+
+
+def _run_job(fn, progress, args, kwargs, cores=1):
+    """Entry point executed in the worker process; BLAS/OpenMP stay within the job's cores"""
+    reporter = ProgressReporter(progress)
+    progress.update({'status': 'running', 'startedAt': time.time(), 'cores': cores})
+    # A worker runs one job at a time, so its stage spans and peak memory are the job's
+    begin_trace()
+    reset_peak_rss()
+    try:
+        reporter.check_cancelled()
+        with thread_limits(cores):
+            return fn(reporter, *args, **kwargs)
+    except JobCancelled:
+        progress['status'] = 'cancelled'
+        raise
+    except Exception as e:
+        # ValueErrors are user-facing validation failures; log anything else
+        if not isinstance(e, ValueError):
+            traceback.print_exc()
+        raise
+    finally:
+        progress.update({'timings': end_trace(), 'peakMemoryBytes': peak_rss()})
+
+
+class Job:
+    def __init__(self, job_id, session_id, kind, future, progress, meta=None, cores=1):
+        self.id = job_id
+        self.session_id = session_id
+        self.kind = kind
+        self.future = future
+        self.progress = progress
+        self.meta = meta or {}
+        self.cores = cores
+        # (fn, args, kwargs) until the job is handed to a worker
+        self.call = None
+        self.submitted_at = time.time()
+        self.collected = False
+
+    @property
+    def status(self):
+        if self.future.cancelled():
+            return 'cancelled'
+        if self.future.done():
+            exc = self.future.exception()
+            if exc is None:
+                return 'done'
+            return 'cancelled' if isinstance(exc, JobCancelled) else 'failed'
+        try:
+            return self.progress.get('status', 'queued')
+        except Exception:
+            return 'queued'
+
+    def error(self):
+        if not self.future.done() or self.future.cancelled():
+            return None
+        exc = self.future.exception()
+        return str(exc) if exc is not None else None
+
+    def progress_snapshot(self):
+        try:
+            snapshot = self.progress.copy()
+        except Exception:
+            snapshot = {}
+        snapshot.pop('status', None)
+        snapshot.pop('cancelRequested', None)
+        return snapshot
+
+    def to_dict(self):
+        return {
+            'jobId': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress_snapshot(),
+            'error': self.error(),
+            'submittedAt': self.submitted_at,
+            **self.meta
+        }
+
+
+class JobManager:
+    """
+    Bounded process pool for long-running work such as model training.
+
+    Each job gets a shared progress dict (served by a multiprocessing
+    manager) that the worker updates and the request handlers poll.
+    Cancellation of a running job is cooperative: the worker checks the
+    cancelRequested flag between estimators and CV folds.
+
+    Jobs ask for a number of cores and start in submission order once the
+    CPU budget has that many free; until then they wait here, as 'queued'.
+    """
+
+    def __init__(self, max_workers=None, max_pending=None, max_finished=200, budget=None):
+        cpu_count = os.cpu_count() or 1
+        self.max_workers = max_workers or int(os.environ.get('TRAIN_WORKERS', min(4, cpu_count)))
+        # Room for at least one full "train all" comparison on small machines
+        self.max_pending = max_pending or int(os.environ.get('TRAIN_MAX_PENDING', max(8, self.max_workers * 4)))
+        self.max_finished = max_finished
+        self.budget = budget or CpuBudget()
+        # Most cores one job is granted; by default the workers split the budget evenly
+        self.job_cores = self.budget.clamp(
+            os.environ.get('JOB_MAX_CORES', max(1, self.budget.total // self.max_workers))
+        )
+        self._executor = None
+        self._manager = None
+        self._jobs = OrderedDict()
+        self._queue = deque()
+        self._running = 0
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._executor is None:
+            ctx = multiprocessing.get_context('spawn')
+            self._manager = ctx.Manager()
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=ctx)
+
+    def _restart_pool(self, broken):
+        """
+        Replace the process pool once a worker has died; a ProcessPoolExecutor
+        refuses all work after that. Called with the lock held.
+        """
+        if broken is not self._executor:
+            # Already replaced, by another job that failed with the same pool
+            return
+        print("A job worker died; restarting the job pool")
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                             mp_context=multiprocessing.get_context('spawn'))
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, session_id, kind, fn, *args, meta=None, cores=1, **kwargs):
+        """Queue fn(reporter, *args, **kwargs) to run in a worker on `cores` cores of the budget"""
+        with self._lock:
+            self._prune()
+            active = sum(1 for job in self._jobs.values() if not job.future.done())
+            if active >= self.max_pending:
+                raise JobQueueFull(f'Too many jobs in progress ({active}). Please try again shortly.')
+            self._ensure_started()
+            job_id = uuid.uuid4().hex
+            progress = self._manager.dict({'status': 'queued', 'cancelRequested': False})
+            job = Job(job_id, session_id, kind, Future(), progress, meta, self.budget.clamp(cores))
+            job.call = (fn, args, kwargs)
+            self._jobs[job_id] = job
+            self._queue.append(job)
+        job.future.add_done_callback(lambda f: self._record(job))
+        self._dispatch()
+        return job
+
+    def _dispatch(self):
+        """Start queued jobs, oldest first, while a worker and the cores they ask for are free"""
+        with self._lock:
+            while self._queue and self._executor is not None and self._running < self.max_workers:
+                job = self._queue[0]
+                if job.future.cancelled():
+                    self._queue.popleft()
+                    continue
+                if not self.budget.try_acquire(job.cores):
+                    break
+                self._queue.popleft()
+                if not job.future.set_running_or_notify_cancel():
+                    self.budget.release(job.cores)
+                    continue
+                self._running += 1
+                fn, args, kwargs = job.call
+                job.call = None
+                pool = self._executor
+                try:
+                    inner = pool.submit(_run_job, fn, job.progress, args, kwargs, job.cores)
+                except BrokenProcessPool:
+                    self._running -= 1
+                    self.budget.release(job.cores)
+                    job.future.set_exception(WorkerLost())
+                    self._restart_pool(pool)
+                    continue
+                inner.add_done_callback(lambda f, job=job, pool=pool: self._finished(job, f, pool))
+
+    def _finished(self, job, inner, pool):
+        """Hand a worker's outcome to the job's future and give its cores back"""
+        lost = not inner.cancelled() and isinstance(inner.exception(), BrokenProcessPool)
+        with self._lock:
+            self._running -= 1
+            if lost:
+                self._restart_pool(pool)
+        self.budget.release(job.cores)
+        if inner.cancelled():
+            job.future.set_exception(JobCancelled('Job cancelled'))
+        elif lost:
+            job.future.set_exception(WorkerLost())
+        elif inner.exception() is not None:
+            job.future.set_exception(inner.exception())
+        else:
+            job.future.set_result(inner.result())
+        self._dispatch()
+
+    @staticmethod
+    def _record(job):
+        """Feed a finished job's worker-side timings and peak memory into the metrics"""
+        try:
+            progress = job.progress.copy()
+        except Exception:
+            # Cancelled before it started, or the manager is shutting down
+            progress = {}
+        record_trace(progress.get('timings'))
+        started = progress.get('startedAt')
+        if started:
+            telemetry.observe('job_queue_seconds', started - job.submitted_at, {'kind': job.kind},
+                              help_text='Time jobs waited for a worker.')
+            telemetry.observe('job_duration_seconds', time.time() - started,
+                              {'kind': job.kind, 'status': job.status},
+                              help_text='Job run time in the worker.')
+        if progress.get('peakMemoryBytes'):
+            telemetry.observe('job_peak_rss_bytes', progress['peakMemoryBytes'], {'kind': job.kind},
+                              MEMORY_BUCKETS, help_text='Worker RSS high-water mark per job.')
+
+    def completed(self, session_id, kind, result, meta=None):
+        """Register a job that is already finished, e.g. a result served from cache"""
+        future = Future()
+        future.set_result(result)
+        job = Job(uuid.uuid4().hex, session_id, kind, future,
+                  {'status': 'done', 'stage': 'done', 'cached': True, 'cancelRequested': False}, meta, cores=0)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id, session_id=None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or (session_id is not None and job.session_id != session_id):
+            return None
+        return job
+
+    def cancel(self, job):
+        with self._lock:
+            if job.future.cancel():
+                # A queued job never reaches an executor, which is what would
+                # otherwise wake its waiters (e.g. as_completed)
+                job.future.set_running_or_notify_cancel()
+                return True
+        if job.future.done():
+            return False
+        try:
+            job.progress['cancelRequested'] = True
+        except Exception:
+            return False
+        return True
+
+    def result(self, job):
+        """Return the job result, or raise the worker's exception"""
+        try:
+            return job.future.result(timeout=0)
+        except CancelledError:
+            raise JobCancelled('Job cancelled')
+
+    def stats(self):
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {
+            'workers': self.max_workers,
+            'maxPending': self.max_pending,
+            'jobCores': self.job_cores,
+            **self.budget.stats(),
+            'queued': statuses.count('queued'),
+            'running': statuses.count('running'),
+            'finished': len(statuses) - statuses.count('queued') - statuses.count('running')
+        }
+
+    def shutdown(self):
+        with self._lock:
+            queued, self._queue = list(self._queue), deque()
+        for job in queued:
+            if job.future.cancel():
+                job.future.set_running_or_notify_cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._manager.shutdown()
+            self._executor = None
+            self._manager = None
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.future.done()]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
@@ -0,0 +1,190 @@
+import io
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+
+from cache import LRUCache
+from telemetry import span
+
+
+PLOT_WORKERS = int(os.environ.get('PLOT_WORKERS', 2))
+PLOT_CACHE_BYTES = int(float(os.environ.get('PLOT_CACHE_MB', 64)) * 1024 * 1024)
+
+# Bar charts show at most this many features (the largest by magnitude), and stay this tall at most
+MAX_BARS = 50
+MAX_FIGURE_HEIGHT = 20
+
+# URL name -> key in the train response's 'plots' map
+PLOT_KINDS = {
+    'confusion_matrix': 'confusionMatrix',
+    'feature_importance': 'featureImportance',
+    'coefficients': 'coefficients'
+}
+
+
+def _new_figure(figsize):
+    # matplotlib is only imported once the first plot is drawn
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def _to_png(fig):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=120, bbox_inches='tight', facecolor='white')
+    return buffer.getvalue()
+
+
+def render_confusion_matrix(cm, labels, model_display_name):
+    import seaborn as sns
+
+    fig = _new_figure((8, 6))
+    ax = fig.subplots()
+    sns.heatmap(np.asarray(cm), annot=True, fmt='d', cmap='Blues', cbar=True,
+                xticklabels=labels, yticklabels=labels,
+                annot_kws={'size': 12}, ax=ax)
+    ax.set_title(f'Confusion Matrix - {model_display_name}', fontsize=14, fontweight='bold', pad=20)
+    ax.set_ylabel('Actual', fontsize=12)
+    ax.set_xlabel('Predicted', fontsize=12)
+    fig.tight_layout()
+    return _to_png(fig)
+
+
+def _bar_figure(n_bars):
+    return _new_figure((10, min(MAX_FIGURE_HEIGHT, max(6, n_bars * 0.35))))
+
+
+def _largest(values):
+    """Indices of the MAX_BARS values largest in magnitude, smallest first"""
+    return np.argsort(np.abs(values))[-MAX_BARS:]
+
+
+def render_feature_importance(importance, feature_names, model_display_name):
+    from matplotlib import colormaps
+
+    importance = np.asarray(importance, dtype=float)
+    top = _largest(importance)
+    sorted_idx = top[np.argsort(importance[top])]
+    fig = _bar_figure(len(sorted_idx))
+    ax = fig.subplots()
+
+    colors = colormaps['viridis'](np.linspace(0.3, 0.9, len(sorted_idx)))
+
+    y_pos = np.arange(len(sorted_idx))
+    ax.barh(y_pos, importance[sorted_idx], align='center', color=colors)
+    ax.set_yticks(y_pos, [feature_names[i] for i in sorted_idx])
+    ax.set_xlabel('Feature Importance', fontsize=12)
+    ax.set_title(f'Feature Importance - {model_display_name}', fontsize=14, fontweight='bold', pad=20)
+    fig.tight_layout()
+    return _to_png(fig)
+
+
+def render_coefficients(coef, feature_names, model_display_name):
+    coef = np.asarray(coef, dtype=float)
+    sorted_idx = _largest(coef)
+    fig = _bar_figure(len(sorted_idx))
+    ax = fig.subplots()
+
+    colors = ['#ef4444' if c < 0 else '#22c55e' for c in coef[sorted_idx]]
+
+    y_pos = np.arange(len(sorted_idx))
+    ax.barh(y_pos, coef[sorted_idx], align='center', color=colors)
+    ax.set_yticks(y_pos, [feature_names[i] for i in sorted_idx])
+    ax.set_xlabel('Coefficient Value', fontsize=12)
+    ax.set_title(f'Feature Coefficients - {model_display_name}', fontsize=14, fontweight='bold', pad=20)
+    ax.axvline(x=0, color='black', linestyle='-', linewidth=0.5)
+    fig.tight_layout()
+    return _to_png(fig)
+
+
+def evaluation_from_response(response):
+    """The numbers a training response's plots are drawn from"""
+    return {
+        'confusionMatrix': response['confusionMatrix'],
+        'classLabels': response['classLabels'],
+        'featureImportance': response.get('featureImportance'),
+        'coefficients': response.get('coefficients')
+    }
+
+
+def available_plots(evaluation):
+    """Plot kinds that can be drawn from a model's stored evaluation numbers"""
+    if not evaluation:
+        return []
+    kinds = ['confusion_matrix']
+    if evaluation.get('featureImportance'):
+        kinds.append('feature_importance')
+    if evaluation.get('coefficients'):
+        kinds.append('coefficients')
+    return kinds
+
+
+def _render(kind, evaluation, model_display_name):
+    with span('render'):
+        if kind == 'confusion_matrix':
+            return render_confusion_matrix(evaluation['confusionMatrix'], evaluation['classLabels'],
+                                           model_display_name)
+        values = evaluation['featureImportance' if kind == 'feature_importance' else 'coefficients']
+        names = list(values)
+        render = render_feature_importance if kind == 'feature_importance' else render_coefficients
+        return render([values[name] for name in names], names, model_display_name)
+
+
+class PlotRenderer:
+    """
+    Renders result plots off the request path and caches the PNGs by model id.
+
+    Each plot is drawn on its own Figure through the object-oriented API,
+    so no pyplot global state is shared between threads. Stored models are
+    immutable, so a rendered PNG stays valid for as long as its model id
+    exists; concurrent requests for the same plot wait on a single render.
+    """
+
+    def __init__(self, max_workers=PLOT_WORKERS, max_bytes=PLOT_CACHE_BYTES):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='plot')
+        self._cache = LRUCache(max_entries=1000, max_bytes=max_bytes, sizeof=len)
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def submit(self, model_id, kind, evaluation, model_display_name):
+        """Future for a plot's PNG bytes, rendering it in the pool if it is not cached"""
+        key = f'{model_id}:{kind}'
+        with self._lock:
+            future = self._pending.get(key)
+            if future is not None:
+                return future
+            png = self._cache.get(key)
+            if png is not None:
+                future = Future()
+                future.set_result(png)
+                return future
+            future = self._executor.submit(_render, kind, evaluation, model_display_name)
+            self._pending[key] = future
+        future.add_done_callback(lambda f: self._finish(key, f))
+        return future
+
+    def _finish(self, key, future):
+        if future.exception() is None:
+            self._cache.put(key, future.result())
+        else:
+            print(f"Plot error for {key}: {future.exception()}")
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def render(self, model_id, kind, evaluation, model_display_name, timeout=60):
+        return self.submit(model_id, kind, evaluation, model_display_name).result(timeout=timeout)
+
+    def prefetch(self, model_id, evaluation, model_display_name):
+        """Start rendering every plot a new model has, so the first image request is a cache hit"""
+        for kind in available_plots(evaluation):
+            self.submit(model_id, kind, evaluation, model_display_name)
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {**self._cache.stats(), 'pending': pending}
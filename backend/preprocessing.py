@@ -0,0 +1,600 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from encoders import (
+    ENCODINGS, HASH_BUCKETS, HASHED_SOURCE, ONEHOT_MAX_CATEGORIES, TARGET_FOLDS,
+    CategoryHasher, FrequencyEncoder, TargetEncoder, factorize_strings, one_hot, _lookup
+)
+from telemetry import record_span
+
+
+NUMERIC_FEATURE_TYPES = ['numeric', 'numeric_string']
+CATEGORICAL_FEATURE_TYPES = ['categorical', 'categorical_numeric']
+# High-cardinality string columns; only used when selected explicitly, hashed by default
+TEXT_FEATURE_TYPES = ['text']
+
+# RobustScaler needs quantiles, so it is fitted on a row sample of this size
+ROBUST_SAMPLE_ROWS = 100000
+
+# Values accepted for the preprocess handleMissing option
+MISSING_STRATEGIES = ['auto', 'mean', 'median', 'mode', 'zero', 'constant', 'drop', 'knn', 'iterative']
+# Median imputation and the model-based imputers are fitted on a uniform row sample
+IMPUTE_SAMPLE_ROWS = 100000
+# KNN imputation searches every fitted row per missing value, so it keeps fewer
+KNN_IMPUTE_ROWS = 2000
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+# Seeds the out-of-fold assignment for target encoding, independently of HashSplit
+_FOLD_SEED = np.uint64(0x5851F42D4C957F2D)
+
+
+def _mix64(x):
+    """splitmix64 finalizer over a uint64 array"""
+    with np.errstate(over='ignore'):
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
+
+
+class HashSplit:
+    """
+    Deterministic train/test assignment from a row's position in the dataset.
+
+    Each row is hashed independently, so batches can be split without
+    materializing an index over the whole dataset; the same (ratio, seed)
+    always yields the same split.
+    """
+
+    def __init__(self, ratio, seed=42):
+        self.ratio = float(ratio)
+        self.seed = int(seed)
+
+    def is_train(self, start, n_rows):
+        positions = np.arange(start, start + n_rows, dtype=np.uint64)
+        with np.errstate(over='ignore'):
+            hashed = _mix64(positions + np.uint64(self.seed & 0xFFFFFFFFFFFFFFFF) * _GOLDEN)
+        # Top 53 bits as a uniform float in [0, 1)
+        return (hashed >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53)) < self.ratio
+
+    def to_dict(self):
+        return {'ratio': self.ratio, 'seed': self.seed}
+
+
+class IndexSplit:
+    """
+    A train/test split kept as row indices into one shared feature matrix.
+
+    Only the indices are stored, so other ratios or seeds over the same
+    preprocessed data cost a few bytes per row; the rows themselves are
+    gathered when a model is fitted.
+    """
+
+    def __init__(self, train_index, test_index):
+        # The two sides partition the rows, so their total bounds every index
+        dtype = np.int32 if len(train_index) + len(test_index) < 2 ** 31 else np.int64
+        self.train_index = np.asarray(train_index, dtype=dtype)
+        self.test_index = np.asarray(test_index, dtype=dtype)
+
+    @property
+    def n_train(self):
+        return len(self.train_index)
+
+    @property
+    def n_test(self):
+        return len(self.test_index)
+
+    def train(self, values):
+        return values[self.train_index]
+
+    def test(self, values):
+        return values[self.test_index]
+
+
+def _to_numeric(column):
+    """A column coerced to float64 values, with NaN where it is missing or not a number"""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        values = pd.to_numeric(pd.Series(column.cat.categories), errors='coerce').to_numpy(dtype=np.float64)
+        codes = column.cat.codes.to_numpy()
+        return np.where(codes >= 0, values[codes], np.nan)
+    return pd.to_numeric(column, errors='coerce').to_numpy(dtype=np.float64)
+
+
+def _category_strings(column):
+    """The distinct values of a categorical feature column as strings, with 'Unknown' for missing"""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        codes = np.unique(column.cat.codes.to_numpy())
+        values = set(column.cat.categories.astype(str)[codes[codes >= 0]])
+        if len(codes) and codes[0] < 0:
+            values.add('Unknown')
+        return values
+    return column.fillna('Unknown').astype(str).unique()
+
+
+def _category_counts(column):
+    """Occurrences of each non-missing value of a categorical feature column, keyed by string"""
+    counts = column.value_counts(sort=False, dropna=True)
+    counts = counts[counts > 0]
+    counts.index = counts.index.astype(str)
+    # Distinct raw values can share a string form (1 and '1'); add them up
+    return counts.groupby(level=0).sum()
+
+
+def _sum_counts(total, counts):
+    return counts if total is None else total.add(counts, fill_value=0)
+
+
+def _most_frequent(counts):
+    """The most frequent value in a counts Series, the smallest one on ties"""
+    return counts[counts == counts.max()].index.min()
+
+
+def _bottom_k(sample, keys, rows, rng, k):
+    """Merge rows into a uniform sample of at most k rows, kept by the smallest random keys"""
+    new_keys = rng.random(len(rows))
+    if sample is not None:
+        rows = np.vstack([sample, rows])
+        new_keys = np.concatenate([keys, new_keys])
+    if len(new_keys) > k:
+        keep = np.argpartition(new_keys, k - 1)[:k]
+        rows, new_keys = rows[keep], new_keys[keep]
+    return rows, new_keys
+
+
+class FeaturePipeline:
+    """
+    Preprocessing fitted over a dataset in batches.
+
+    Mirrors the in-memory preprocess step: the target and categorical
+    features are label-encoded with sorted classes, numeric features are
+    coerced and imputed, and the selected scaler is applied. Fitting
+    takes two passes over the batches (statistics, then scaler), and memory
+    stays bounded by the batch size.
+
+    missing picks the imputation (one of MISSING_STRATEGIES):
+    - 'auto' and 'mean' fill numeric columns with their mean; missing
+      categoricals become their own 'Unknown' category
+    - 'median' uses medians from a row sample (exact up to IMPUTE_SAMPLE_ROWS rows)
+    - 'mode' fills every column with its most frequent value
+    - 'zero' and 'constant' fill numeric columns with fill_value
+    - 'drop' removes training rows with any missing feature
+    - 'knn' and 'iterative' impute numeric columns from the other numeric
+      columns with sklearn's KNNImputer or IterativeImputer, fitted on a row sample
+    Filling is vectorized over the whole batch matrix. Prediction inputs are
+    never dropped: under 'drop' their missing numeric values get the mean.
+
+    encoding picks how categorical features become numbers (one of
+    ENCODINGS, overridable per column through encodings): 'label' codes,
+    'onehot' indicators, 'frequency' shares, out-of-fold 'target' rates, or
+    'hashing' into hash_buckets columns shared by all hashed features.
+    'auto' hashes text columns and label-encodes the rest. Missing values of
+    frequency, target and hashed columns are always their own 'Unknown' value.
+    output_features names the resulting matrix columns.
+
+    With sparse=True transform returns a scipy CSR matrix: one-hot and hashed
+    blocks are never expanded, and the scalers are swapped for ones that keep
+    zeros at zero ('standard' skips centering, 'minmax' scales by the maximum
+    absolute value, 'robust' skips centering). 'auto' turns it on whenever a
+    feature is one-hot encoded or hashed.
+
+    With compact=True features are produced as float32 and targets as the
+    smallest signed integer type that holds every class code. Columns that
+    arrive as pandas categoricals are encoded per category, not per row.
+    """
+
+    compact = False
+    missing = 'auto'
+    fill_value = 0.0
+    imputer = None
+    missing_labels_ = {}
+    encodings_ = {}
+    hash_buckets = HASH_BUCKETS
+    frequency_ = {}
+    target_ = {}
+    sparse = False
+    # Whether unscaled features can be negative: a negative numeric value or fill, or signed hash buckets
+    negative_ = False
+
+    def __init__(self, target_column, features, column_types, scaling_method='standard', compact=False,
+                 missing='auto', fill_value=0.0, encoding='auto', encodings=None, hash_buckets=HASH_BUCKETS,
+                 sparse='auto'):
+        if missing not in MISSING_STRATEGIES:
+            raise ValueError(f'handleMissing must be one of: {", ".join(MISSING_STRATEGIES)}.')
+        encodings = dict(encodings or {})
+        for value in [encoding] + list(encodings.values()):
+            if value not in ENCODINGS:
+                raise ValueError(f'encoding must be one of: {", ".join(ENCODINGS)}.')
+        self.target_column = target_column
+        self.numeric_features = [f for f in features if column_types[f] in NUMERIC_FEATURE_TYPES]
+        self.categorical_features = [
+            f for f in features if column_types[f] in CATEGORICAL_FEATURE_TYPES + TEXT_FEATURE_TYPES
+        ]
+        self.features = [f for f in features if f in self.numeric_features or f in self.categorical_features]
+        self.encodings_ = {}
+        for col in self.categorical_features:
+            chosen = encodings.get(col, encoding)
+            if chosen == 'auto':
+                chosen = 'hashing' if column_types[col] in TEXT_FEATURE_TYPES else 'label'
+            self.encodings_[col] = chosen
+        self.hash_buckets = int(hash_buckets)
+        self.frequency_ = {col: FrequencyEncoder() for col, e in self.encodings_.items() if e == 'frequency'}
+        self.target_ = {col: TargetEncoder() for col, e in self.encodings_.items() if e == 'target'}
+        if sparse == 'auto':
+            sparse = any(e in ['onehot', 'hashing'] for e in self.encodings_.values())
+        self.sparse = bool(sparse)
+        self.scaling_method = scaling_method
+        self.compact = bool(compact)
+        self.missing = missing
+        self.fill_value = 0.0 if missing == 'zero' else float(fill_value)
+        self.classes_ = None
+        self.class_counts_ = None
+        self.fill_values_ = {}
+        self.categories_ = {}
+        # Label a missing categorical value is encoded as
+        self.missing_labels_ = {}
+        self.imputer = None
+        self.scaler = None
+        self.negative_ = False
+        self.n_rows_ = 0
+
+    @property
+    def columns(self):
+        """Dataset columns needed to transform a batch"""
+        return self.features + [self.target_column]
+
+    @property
+    def n_classes(self):
+        return len(self.classes_)
+
+    @property
+    def dtype(self):
+        """Feature matrix dtype"""
+        return np.float32 if self.compact else np.float64
+
+    @property
+    def label_dtype(self):
+        """Target code dtype"""
+        return np.min_scalar_type(-max(1, len(self.classes_))) if self.compact else np.int64
+
+    @property
+    def indexed_features(self):
+        """Categorical features encoded through a fitted category list (label and one-hot)"""
+        return [col for col in self.categorical_features if self.encodings_.get(col, 'label') in ['label', 'onehot']]
+
+    @property
+    def hashed_features(self):
+        return [col for col in self.categorical_features if self.encodings_.get(col) == 'hashing']
+
+    def _layout(self):
+        """
+        (feature, output names) pairs in output order, as (dense, sparse) lists.
+
+        Dense blocks (numeric, label, frequency and target columns) come
+        first, then the one-hot blocks, then one block (feature None) shared
+        by all hashed features.
+        """
+        dense, blocks = [], []
+        for col in self.features:
+            encoding = self.encodings_.get(col, 'label')
+            if col in self.fill_values_ or encoding == 'label':
+                dense.append((col, [col]))
+            elif encoding == 'frequency':
+                dense.append((col, self.frequency_[col].output_names(col)))
+            elif encoding == 'target':
+                dense.append((col, self.target_[col].output_names(col)))
+            elif encoding == 'onehot':
+                blocks.append((col, [f'{col}={value}' for value in self.categories_[col]]))
+        if self.hashed_features:
+            blocks.append((None, [f'hash_{i}' for i in range(self.hash_buckets)]))
+        return dense, blocks
+
+    @property
+    def output_features(self):
+        """Names of the columns transform produces"""
+        dense, blocks = self._layout()
+        return [name for _, names in dense + blocks for name in names]
+
+    @property
+    def feature_sources(self):
+        """Input feature behind each output column; hashed buckets are shared, so they report as HASHED_SOURCE"""
+        dense, blocks = self._layout()
+        return [HASHED_SOURCE if col is None else col for col, names in dense + blocks for _ in names]
+
+    def _folds(self, positions):
+        """Target-encoding fold of each row, from its position in the dataset"""
+        with np.errstate(over='ignore'):
+            hashed = _mix64(positions.astype(np.uint64) + _FOLD_SEED)
+        return (hashed % np.uint64(TARGET_FOLDS)).astype(np.intp)
+
+    @property
+    def needs_sample(self):
+        """Whether fitting the imputation keeps a row sample of the numeric columns"""
+        return self.missing in ['median', 'knn', 'iterative'] and bool(self.numeric_features)
+
+    def fit(self, batches, seed=0):
+        """Fit on a callable returning a fresh iterator of DataFrame batches; timed as 'encode' and 'scale'"""
+        started = time.perf_counter()
+        target_counts = {}
+        sums = np.zeros(len(self.numeric_features))
+        counts = np.zeros(len(self.numeric_features), dtype=np.int64)
+        indexed = self.indexed_features
+        value_counts = {col: None for col in self.numeric_features + indexed} if self.missing == 'mode' else {}
+        categories = {col: set() for col in indexed}
+        rng = np.random.default_rng(seed)
+        sample = sample_keys = None
+        start = 0
+
+        for batch in batches():
+            positions = np.arange(start, start + len(batch))
+            start += len(batch)
+            batch, positions = self._keep(batch, positions)
+            if len(batch) == 0:
+                continue
+            self.n_rows_ += len(batch)
+            targets = batch[self.target_column].astype(str)
+            for label, count in targets.value_counts(sort=False).items():
+                target_counts[label] = target_counts.get(label, 0) + int(count)
+            numeric = self._numeric_matrix(batch)
+            sums += np.nansum(numeric, axis=0)
+            counts += np.count_nonzero(~np.isnan(numeric), axis=0)
+            self.negative_ = self.negative_ or bool(np.nanmin(numeric, initial=0) < 0)
+            if self.needs_sample:
+                sample, sample_keys = _bottom_k(sample, sample_keys, numeric, rng, IMPUTE_SAMPLE_ROWS)
+            for j, col in enumerate(self.numeric_features if value_counts else []):
+                values = pd.Series(numeric[:, j]).value_counts(sort=False, dropna=True)
+                value_counts[col] = _sum_counts(value_counts[col], values)
+            for col in indexed:
+                if value_counts:
+                    value_counts[col] = _sum_counts(value_counts[col], _category_counts(batch[col]))
+                else:
+                    categories[col].update(_category_strings(batch[col]))
+            for col, encoder in self.frequency_.items():
+                encoder.update(*factorize_strings(batch[col]))
+            if self.target_:
+                folds = self._folds(positions)
+                for col, encoder in self.target_.items():
+                    encoder.update(*factorize_strings(batch[col]), targets.to_numpy(dtype=object), folds)
+
+        self.classes_ = np.array(sorted(target_counts), dtype=object)
+        self.class_counts_ = np.array([target_counts[c] for c in self.classes_], dtype=np.int64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            fill = np.where(counts > 0, sums / np.maximum(counts, 1), 0.0)
+        if self.missing in ['zero', 'constant']:
+            fill[:] = self.fill_value
+        elif self.missing == 'median' and sample is not None:
+            with np.errstate(all='ignore'):
+                medians = np.nanmedian(sample, axis=0) if len(sample) else fill
+            fill = np.where(np.isnan(medians), fill, medians)
+        elif self.missing == 'mode':
+            fill = np.array([
+                float(_most_frequent(value_counts[col])) if value_counts[col] is not None and len(value_counts[col])
+                else 0.0 for col in self.numeric_features
+            ])
+        self.fill_values_ = {col: float(value) for col, value in zip(self.numeric_features, fill)}
+        self.negative_ = self.negative_ or bool((fill < 0).any()) or 'hashing' in self.encodings_.values()
+
+        self.missing_labels_ = {}
+        if value_counts:
+            for col in indexed:
+                observed = value_counts[col]
+                categories[col] = set(observed.index) if observed is not None else set()
+                self.missing_labels_[col] = _most_frequent(observed) if categories[col] else 'Unknown'
+                categories[col].add(self.missing_labels_[col])
+        self.categories_ = {col: np.array(sorted(values), dtype=object) for col, values in categories.items()}
+        for col in indexed:
+            if self.encodings_[col] == 'onehot' and len(self.categories_[col]) > ONEHOT_MAX_CATEGORIES:
+                raise ValueError(
+                    f'Column "{col}" has {len(self.categories_[col])} categories; one-hot encoding supports '
+                    f'up to {ONEHOT_MAX_CATEGORIES}. Use hashing, frequency or target encoding for it.'
+                )
+        for encoder in self.frequency_.values():
+            encoder.finish(self.n_rows_)
+        for encoder in self.target_.values():
+            encoder.finish(self.classes_)
+
+        if self.missing in ['knn', 'iterative'] and sample is not None and len(sample):
+            self.imputer = self._fit_imputer(sample, seed)
+        record_span('encode', time.perf_counter() - started)
+
+        from sklearn.preprocessing import StandardScaler, MinMaxScaler, MaxAbsScaler, RobustScaler
+
+        started = time.perf_counter()
+
+        if self.scaling_method in ['standard', 'minmax']:
+            if self.sparse:
+                # Centering or shifting would turn every zero into a stored value
+                self.scaler = StandardScaler(with_mean=False) if self.scaling_method == 'standard' else MaxAbsScaler()
+            else:
+                self.scaler = StandardScaler() if self.scaling_method == 'standard' else MinMaxScaler()
+            start = 0
+            for batch in batches():
+                X, _ = self.transform(batch, scale=False, start=start)
+                start += len(batch)
+                if X.shape[0]:
+                    self.scaler.partial_fit(X)
+        elif self.scaling_method == 'robust':
+            rng = np.random.default_rng(seed)
+            keep = min(1.0, ROBUST_SAMPLE_ROWS / max(1, self.n_rows_))
+            sample = []
+            start = 0
+            for batch in batches():
+                X, _ = self.transform(batch, scale=False, start=start)
+                start += len(batch)
+                sample.append(X[rng.random(X.shape[0]) < keep])
+            if self.sparse:
+                from scipy import sparse
+                self.scaler = RobustScaler(with_centering=False).fit(sparse.vstack(sample, format='csc'))
+            else:
+                self.scaler = RobustScaler().fit(np.vstack(sample))
+        if self.scaler is not None:
+            # transform_features always hands the scaler a matrix it just built,
+            # so scaling can overwrite it instead of copying
+            self.scaler.copy = False
+        record_span('scale', time.perf_counter() - started)
+        return self
+
+    def _fit_imputer(self, sample, seed):
+        """KNNImputer or IterativeImputer over the numeric columns, fitted on the row sample"""
+        if self.missing == 'knn':
+            from sklearn.impute import KNNImputer
+            imputer = KNNImputer()
+            sample = sample[:KNN_IMPUTE_ROWS]
+        else:
+            from sklearn.experimental import enable_iterative_imputer  # noqa: F401
+            from sklearn.impute import IterativeImputer
+            imputer = IterativeImputer(random_state=seed)
+        # Infinite values would break the distance / regression fits
+        sample = np.where(np.isinf(sample), np.nan, sample)
+        # The imputers drop columns with no observed value, so give those their fallback fill
+        empty = np.isnan(sample).all(axis=0)
+        sample[:, empty] = [self.fill_values_[col] for col, e in zip(self.numeric_features, empty) if e]
+        return imputer.fit(sample)
+
+    def kept_rows(self, batch):
+        """Boolean mask of the rows a training batch keeps: a target, and under 'drop' no missing feature"""
+        keep = batch[self.target_column].notna().to_numpy()
+        if self.missing == 'drop':
+            if self.numeric_features:
+                keep &= ~np.isnan(self._numeric_matrix(batch)).any(axis=1)
+            if self.categorical_features:
+                keep &= batch[self.categorical_features].notna().all(axis=1).to_numpy()
+        return keep
+
+    def _keep(self, batch, positions=None):
+        """The batch (and row positions) restricted to kept_rows, without copying when every row is kept"""
+        keep = self.kept_rows(batch)
+        if keep.all():
+            return batch, positions
+        return batch[keep], None if positions is None else positions[keep]
+
+    def transform(self, batch, scale=True, start=0):
+        """
+        Encode a batch; rows with a missing target (or dropped by kept_rows) are removed. Returns (X, y)
+
+        start is the batch's first row position in the dataset; target
+        encoding uses it to encode each row out of fold.
+        """
+        batch, positions = self._keep(batch, np.arange(start, start + len(batch)))
+        folds = self._folds(positions) if self.target_ else None
+        X = self.transform_features(batch, scale=scale, folds=folds)
+        y = self._encode(batch[self.target_column].astype(str), self.classes_)
+        return X, y.astype(self.label_dtype)
+
+    def transform_features(self, batch, scale=True, folds=None):
+        """Encode the feature columns of a batch (no target needed); CSR when the pipeline is sparse"""
+        dense, blocks = self._layout()
+        layout = dense if self.sparse else dense + blocks
+        offsets = np.cumsum([0] + [len(names) for _, names in layout])
+        # Column-major: filled one column at a time, as a DataFrame's values would be
+        X = np.empty((len(batch), offsets[-1]), dtype=self.dtype, order='F')
+        fill = np.zeros(offsets[-1], dtype=self.dtype)
+        numeric = [int(offsets[i]) for i, (col, _) in enumerate(layout) if col in self.fill_values_]
+        self._write_numeric(batch, X, numeric)
+        fill[numeric] = [self.fill_values_[col] for col, _ in layout if col in self.fill_values_]
+        for (col, names), offset in zip(dense, offsets):
+            if col in self.fill_values_:
+                continue
+            encoding = self.encodings_.get(col, 'label')
+            if encoding == 'label':
+                X[:, offset] = self._encode_column(batch[col], self.categories_[col],
+                                                   self.missing_labels_.get(col, 'Unknown'))
+            elif encoding == 'frequency':
+                X[:, offset:offset + 1] = self.frequency_[col].transform(*factorize_strings(batch[col]))
+            elif encoding == 'target':
+                X[:, offset:offset + len(names)] = self.target_[col].transform(
+                    *factorize_strings(batch[col]), folds=folds)
+        matrices = []
+        for col, names in blocks:
+            if col is None:
+                block = CategoryHasher(self.hash_buckets).transform(
+                    [(name, *factorize_strings(batch[name])) for name in self.hashed_features], len(batch))
+            else:
+                block = one_hot(self._encode_column(batch[col], self.categories_[col],
+                                                    self.missing_labels_.get(col, 'Unknown')), len(names))
+            matrices.append(block)
+        if not self.sparse:
+            # Expanded into the dense matrix after the dense blocks
+            for block, offset in zip(matrices, offsets[len(dense):]):
+                X[:, offset:offset + block.shape[1]] = block.toarray()
+        bad = ~np.isfinite(X)
+        if bad.any():
+            if self.imputer is not None and numeric:
+                self._impute(X, numeric)
+            # Only numeric columns can hold NaN here; fill them all in one pass
+            np.copyto(X, fill, where=np.isnan(X))
+            X[bad] = np.nan_to_num(X[bad], nan=0.0, posinf=1e10, neginf=-1e10)
+        if self.sparse:
+            from scipy import sparse
+            X = sparse.hstack([sparse.csr_matrix(X)] + matrices, format='csr', dtype=self.dtype)
+        if scale and self.scaler is not None and X.shape[0]:
+            X = self.scaler.transform(X)
+        return X
+
+    def _impute(self, X, numeric):
+        """Model-based imputation of the numeric columns, for the rows that have a gap"""
+        block = X[:, numeric]
+        rows = np.flatnonzero(np.isnan(block).any(axis=1))
+        if len(rows) == 0:
+            return
+        block = block[rows].astype(np.float64, copy=False)
+        block[np.isinf(block)] = np.nan
+        filled = self.imputer.transform(block)
+        # Keep the original infinities; nan_to_num clips them afterwards
+        original = X[np.ix_(rows, numeric)]
+        X[np.ix_(rows, numeric)] = np.where(np.isinf(original), original, filled)
+
+    def _numeric_matrix(self, batch):
+        """The numeric feature columns of a batch as float64, NaN where missing or not a number"""
+        numeric = np.empty((len(batch), len(self.numeric_features)), order='F')
+        self._write_numeric(batch, numeric, range(len(self.numeric_features)))
+        return numeric
+
+    def _write_numeric(self, batch, out, positions):
+        """Write the numeric feature columns of a batch into the given columns of out"""
+        for position, col in zip(positions, self.numeric_features):
+            column = batch[col]
+            if isinstance(column.dtype, np.dtype) and column.dtype.kind in 'fiub':
+                # Already numbers: a straight copy into the column-major matrix
+                out[:, position] = column.to_numpy()
+            else:
+                out[:, position] = _to_numeric(column)
+
+    def missing_columns(self, columns):
+        """Feature columns the given input is missing"""
+        columns = set(columns)
+        return [f for f in self.features if f not in columns]
+
+    def label_encoder(self):
+        """The target encoding as a fitted LabelEncoder"""
+        from sklearn.preprocessing import LabelEncoder
+
+        le = LabelEncoder()
+        le.classes_ = self.classes_
+        return le
+
+    def feature_encoders(self):
+        """Fitted LabelEncoders for the label and one-hot encoded features"""
+        from sklearn.preprocessing import LabelEncoder
+
+        encoders = {}
+        for col, categories in self.categories_.items():
+            encoders[col] = LabelEncoder()
+            encoders[col].classes_ = categories
+        return encoders
+
+    @staticmethod
+    def _encode_column(column, classes, missing_label='Unknown'):
+        """Encode a categorical feature column, mapping missing values to missing_label"""
+        # One lookup per distinct value, then a gather over the row codes
+        codes, labels = factorize_strings(column, missing_label)
+        return _lookup(classes, labels)[codes]
+
+    @staticmethod
+    def _encode(values, classes):
+        """Position of each value in sorted classes; unseen values map to -1"""
+        values = values.to_numpy(dtype=object)
+        if len(classes) == 0:
+            return np.full(len(values), -1)
+        codes = np.minimum(np.searchsorted(classes, values), len(classes) - 1)
+        return np.where(classes[codes] == values, codes, -1)
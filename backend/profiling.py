@@ -0,0 +1,412 @@
+import numpy as np
+import pandas as pd
+
+
+SAMPLE_VALUE_COUNT = 3
+
+# Cells (sampled rows x columns) the approximate-mode row reservoir may hold, one byte each
+RESERVOIR_MAX_CELLS = 16 * 1024 * 1024
+
+NUMERIC_TYPES = ['numeric', 'numeric_string', 'categorical_numeric']
+UNUSABLE_TYPES = ['empty', 'text', 'datetime', 'unknown']
+
+
+def classify_column(dtype, non_null, unique_count, numeric_valid):
+    """Map column statistics to the semantic type used throughout the pipeline"""
+    if non_null == 0:
+        return 'empty'
+
+    if pd.api.types.is_numeric_dtype(dtype):
+        if unique_count <= 10 and unique_count < non_null * 0.05:
+            return 'categorical_numeric'
+        return 'numeric'
+
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return 'datetime'
+
+    if dtype == 'object' or str(dtype) == 'category':
+        if numeric_valid / non_null > 0.8:
+            return 'numeric_string'
+        if unique_count <= 50 or unique_count / non_null < 0.5:
+            return 'categorical'
+        return 'text'
+
+    return 'unknown'
+
+
+def _value_kind(dtype):
+    if pd.api.types.is_bool_dtype(dtype):
+        return 'bool'
+    if pd.api.types.is_numeric_dtype(dtype):
+        return 'numeric'
+    if dtype == 'object' or str(dtype) == 'category':
+        return 'object'
+    return 'other'
+
+
+def _is_number(values):
+    """Which of these distinct object values parse as numbers."""
+    return pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').notna().to_numpy()
+
+
+def _jsonable(value):
+    if value is None or isinstance(value, (bool, int, str)):
+        return value
+    if isinstance(value, float):
+        return None if np.isnan(value) or np.isinf(value) else value
+    if isinstance(value, np.generic):
+        return _jsonable(value.item())
+    return str(value)
+
+
+class ColumnProfile:
+    """Type and summary statistics of one column"""
+
+    __slots__ = ('name', 'type', 'dtype', 'null_count', 'non_null', 'unique_count',
+                 'numeric_valid', 'sample_values', 'estimate')
+
+    def __init__(self, name, type, dtype, null_count, non_null, unique_count,
+                 numeric_valid, sample_values, estimate=None):
+        self.name = name
+        self.type = type
+        self.dtype = dtype
+        self.null_count = null_count
+        self.non_null = non_null
+        self.unique_count = unique_count
+        self.numeric_valid = numeric_valid
+        self.sample_values = sample_values
+        # Error bounds when the stats come from sketches and samples
+        self.estimate = estimate
+
+    @property
+    def is_numeric(self):
+        return self.type in NUMERIC_TYPES
+
+    @property
+    def is_usable(self):
+        return self.type not in UNUSABLE_TYPES
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'type': self.type,
+            'dtype': self.dtype,
+            'nullCount': int(self.null_count),
+            'nonNull': int(self.non_null),
+            'uniqueCount': int(self.unique_count),
+            'numericValid': int(self.numeric_valid),
+            'sampleValues': [_jsonable(v) for v in self.sample_values],
+            'estimate': self.estimate
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data['name'], data['type'], data['dtype'], data['nullCount'], data['nonNull'],
+            data['uniqueCount'], data['numericValid'], data['sampleValues'],
+            data.get('estimate')
+        )
+
+
+class DatasetProfile:
+    """Column profiles for a whole dataset, in column order"""
+
+    def __init__(self, columns, rows, mode='exact'):
+        self.columns = list(columns)
+        self.rows = int(rows)
+        self.mode = mode
+        self._by_name = {c.name: c for c in self.columns}
+
+    def __getitem__(self, name):
+        return self._by_name[name]
+
+    def __contains__(self, name):
+        return name in self._by_name
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def __len__(self):
+        return len(self.columns)
+
+    def types(self):
+        return {c.name: c.type for c in self.columns}
+
+    @property
+    def total_nulls(self):
+        return int(sum(c.null_count for c in self.columns))
+
+    def to_dict(self):
+        return {'rows': self.rows, 'mode': self.mode, 'columns': [c.to_dict() for c in self.columns]}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls([ColumnProfile.from_dict(c) for c in data['columns']], data['rows'], data.get('mode', 'exact'))
+
+
+def _bit_length(values):
+    """Bit length of each uint64, computed exactly via two 32-bit halves"""
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(high > 0, np.frexp(high)[1] + 32, np.frexp(low)[1])
+
+
+class HyperLogLogSet:
+    """
+    HyperLogLog cardinality sketches for many columns, stored as one
+    register matrix so a whole block of columns is updated in one call.
+    Relative standard error is 1.04 / sqrt(2 ** precision).
+    """
+
+    def __init__(self, n_columns, precision=12):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = np.zeros((n_columns, self.m), dtype=np.uint8)
+
+    @property
+    def relative_error(self):
+        return 1.04 / np.sqrt(self.m)
+
+    def add(self, positions, hashes, present):
+        """Add hashes of shape (len(positions), rows), skipping cells that are not present"""
+        shift = np.uint64(64 - self.precision)
+        buckets = (hashes >> shift).astype(np.intp)
+        remainder = hashes & np.uint64((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - _bit_length(remainder) + 1
+        flat = (np.asarray(positions, dtype=np.intp)[:, None] * self.m + buckets)[present]
+        np.maximum.at(self.registers.reshape(-1), flat, rank[present].astype(np.uint8))
+
+    def reset(self, position):
+        self.registers[position] = 0
+
+    def count(self, position):
+        registers = self.registers[position]
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / np.sum(np.ldexp(1.0, -registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(registers == 0))
+        if estimate <= 2.5 * self.m and zeros > 0:
+            # Linear counting is more accurate for small cardinalities
+            estimate = self.m * np.log(self.m / zeros)
+        return int(round(estimate))
+
+
+class ProfileBuilder:
+    """
+    Accumulates column statistics over one or more chunks of a frame.
+
+    Each chunk is handled with block operations over all columns of a kind
+    at once: numeric columns are hashed as one float matrix, and text
+    columns get one factorize over every cell so that numeric coercion and
+    hashing run on the distinct values only. Null counts come from the NaN
+    mask or the factorize codes, so no separate isna() pass is needed. Distinct hashes are merged per column across
+    chunks, so unique counts stay exact.
+
+    In approximate mode unique counts come from HyperLogLog sketches (memory
+    is fixed per column rather than proportional to cardinality) and the
+    numeric-parse check runs only on a uniform reservoir sample of rows.
+    Null counts are exact in both modes.
+    """
+
+    def __init__(self, columns, approximate=False, sample_size=10000, seed=0):
+        self.names = [str(c) for c in columns]
+        self._index = {name: i for i, name in enumerate(self.names)}
+        n = len(self.names)
+        self.rows = 0
+        self.null_count = np.zeros(n, dtype=np.int64)
+        self.non_null = np.zeros(n, dtype=np.int64)
+        self.numeric_valid = np.zeros(n, dtype=np.int64)
+        self.kinds = [set() for _ in range(n)]
+        self.samples = [[] for _ in range(n)]
+        self._hashes = [None] * n
+
+        self.approximate = approximate
+        if approximate:
+            # Wide files get fewer sampled rows, so the reservoir stays within RESERVOIR_MAX_CELLS
+            self.sample_size = max(1, min(int(sample_size), RESERVOIR_MAX_CELLS // max(1, n)))
+            self._rng = np.random.default_rng(seed)
+            self._sketches = HyperLogLogSet(n)
+            # Per sampled row and column: 0 = null, 1 = parses as a number, 2 = other
+            self._reservoir = np.zeros((self.sample_size, n), dtype=np.int8)
+
+    def reset(self, names):
+        """Forget everything seen so far for the given columns"""
+        for name in names:
+            i = self._index[name]
+            self.null_count[i] = self.non_null[i] = self.numeric_valid[i] = 0
+            self.kinds[i] = set()
+            self.samples[i] = []
+            self._hashes[i] = None
+            if self.approximate:
+                self._sketches.reset(i)
+
+    def _sample_rows(self, n_rows):
+        """Reservoir sampling (Algorithm R) over this chunk; returns (chunk rows, slots)"""
+        seen = self.rows
+        fill = max(0, min(n_rows, self.sample_size - seen))
+        rows = np.arange(fill)
+        slots = seen + rows
+        if fill < n_rows:
+            candidates = np.arange(fill, n_rows)
+            draws = self._rng.integers(0, seen + candidates + 1)
+            accepted = draws < self.sample_size
+            rows = np.concatenate([rows, candidates[accepted]])
+            slots = np.concatenate([slots, draws[accepted]])
+        # A slot replaced twice in one chunk keeps the later row
+        _, last = np.unique(slots[::-1], return_index=True)
+        keep = len(slots) - 1 - last
+        return rows[keep], slots[keep]
+
+    def update(self, chunk, count_rows=True):
+        if chunk.shape[1] == 0 or len(chunk) == 0:
+            if count_rows:
+                self.rows += len(chunk)
+            return
+
+        positions = np.array([self._index[str(c)] for c in chunk.columns])
+
+        sample_rows = sample_slots = None
+        if self.approximate and count_rows:
+            sample_rows, sample_slots = self._sample_rows(len(chunk))
+
+        groups = {}
+        for j, dtype in enumerate(chunk.dtypes):
+            groups.setdefault(_value_kind(dtype), []).append(j)
+
+        for kind, cols in groups.items():
+            block = chunk.iloc[:, cols]
+            where = positions[cols]
+            if kind in ('numeric', 'bool'):
+                # Hash as float64 so int and float chunks of one column agree
+                values = block.to_numpy(dtype=np.float64, na_value=np.nan).T
+                present = ~np.isnan(values)
+                hashes = pd.util.hash_array(values.ravel()).reshape(values.shape)
+                self.numeric_valid[where] += present.sum(axis=1)
+                if sample_rows is not None:
+                    self._reservoir[sample_slots[:, None], where] = present[:, sample_rows].T
+            else:
+                # Factorize every cell of the block once, then hash (and in exact
+                # mode coerce) only the distinct values; missing cells get code -1
+                values = block.to_numpy(dtype=object).T
+                codes, uniques = pd.factorize(values.ravel())
+                codes = codes.reshape(values.shape)
+                present = codes >= 0
+                if len(uniques):
+                    hashes = pd.util.hash_array(np.asarray(uniques, dtype=object))[codes]
+                if sample_rows is not None:
+                    sampled = codes[:, sample_rows].T
+                    reservoir = np.where(sampled >= 0, 2, 0).astype(np.int8)
+                    if kind == 'object':
+                        # Only the values the sampled rows hold need the numeric check
+                        seen, inverse = np.unique(sampled, return_inverse=True)
+                        is_number = np.zeros(len(seen), dtype=bool)
+                        is_number[seen >= 0] = _is_number(uniques[seen[seen >= 0]])
+                        reservoir[is_number[inverse.reshape(sampled.shape)]] = 1
+                    self._reservoir[sample_slots[:, None], where] = reservoir
+                elif kind == 'object' and not self.approximate and len(uniques):
+                    is_number = _is_number(uniques)
+                    self.numeric_valid[where] += (is_number[codes] & present).sum(axis=1)
+
+            non_null = present.sum(axis=1)
+            self.null_count[where] += len(chunk) - non_null
+            self.non_null[where] += non_null
+            if not non_null.any():
+                continue
+
+            if self.approximate:
+                self._sketches.add(where, hashes, present)
+
+            for k, j in enumerate(cols):
+                if non_null[k] == 0:
+                    continue
+                i = where[k]
+                self.kinds[i].add(kind)
+                mask = present[k]
+                if not self.approximate:
+                    distinct = np.unique(hashes[k][mask])
+                    previous = self._hashes[i]
+                    self._hashes[i] = distinct if previous is None else np.union1d(previous, distinct)
+
+                need = SAMPLE_VALUE_COUNT - len(self.samples[i])
+                if need > 0:
+                    rows = np.flatnonzero(mask)[:need]
+                    column = chunk.iloc[:, j]
+                    if kind == 'other':
+                        self.samples[i].extend(column.iloc[rows].tolist())
+                    else:
+                        self.samples[i].extend(column.to_numpy()[rows].tolist())
+
+        if count_rows:
+            self.rows += len(chunk)
+
+    def unique_count(self, name):
+        i = self._index[name]
+        if self.approximate:
+            return 0 if self.non_null[i] == 0 else max(1, self._sketches.count(i))
+        hashes = self._hashes[i]
+        return 0 if hashes is None else len(hashes)
+
+    def column_non_null(self, name):
+        return int(self.non_null[self._index[name]])
+
+    def column_kinds(self, name):
+        return self.kinds[self._index[name]]
+
+    def _estimate(self, i, dtype, unique_count):
+        """Sample-based numeric count and error bounds for approximate mode"""
+        sample = self._reservoir[:min(self.rows, self.sample_size), i]
+        sampled_non_null = int(np.count_nonzero(sample))
+        unique_margin = 2 * self._sketches.relative_error * unique_count
+        estimate = {
+            'uniqueCountLow': int(max(0, np.floor(unique_count - unique_margin))),
+            'uniqueCountHigh': int(np.ceil(unique_count + unique_margin)),
+            'sampleRows': int(len(sample)),
+            'numericFraction': None,
+            'numericFractionMargin': None
+        }
+        numeric_valid = int(self.numeric_valid[i])
+        if (dtype == 'object' or str(dtype) == 'category') and sampled_non_null > 0:
+            fraction = float(np.count_nonzero(sample == 1)) / sampled_non_null
+            numeric_valid = int(round(fraction * int(self.non_null[i])))
+            estimate['numericFraction'] = round(fraction, 4)
+            # 95% normal-approximation interval for the sampled proportion
+            estimate['numericFractionMargin'] = round(1.96 * float(np.sqrt(fraction * (1 - fraction) / sampled_non_null)), 4)
+        return numeric_valid, estimate
+
+    def finish(self, dtypes):
+        """Build the profile for the final columns and their dtypes"""
+        columns = []
+        for name, dtype in dtypes.items():
+            i = self._index[str(name)]
+            unique_count = self.unique_count(str(name))
+            numeric_valid = int(self.numeric_valid[i])
+            estimate = None
+            if self.approximate:
+                numeric_valid, estimate = self._estimate(i, dtype, unique_count)
+            columns.append(ColumnProfile(
+                name=str(name),
+                type=classify_column(dtype, int(self.non_null[i]), unique_count, numeric_valid),
+                dtype=str(dtype),
+                null_count=int(self.null_count[i]),
+                non_null=int(self.non_null[i]),
+                unique_count=unique_count,
+                numeric_valid=numeric_valid,
+                sample_values=list(self.samples[i]),
+                estimate=estimate
+            ))
+        mode = 'approximate' if self.approximate else 'exact'
+        return DatasetProfile(columns, self.rows, mode)
+
+
+def profile_frame(df, approximate=False, sample_size=10000):
+    """Profile a frame that is already in memory in a single pass"""
+    builder = ProfileBuilder(df.columns, approximate=approximate, sample_size=sample_size)
+    builder.update(df)
+    return builder.finish(df.dtypes)
+
+
+def profile_batches(batches, columns, dtypes, **options):
+    """Profile a dataset delivered as a sequence of DataFrame batches"""
+    builder = ProfileBuilder(columns, **options)
+    for batch in batches:
+        builder.update(batch)
+    return builder.finish(dtypes)
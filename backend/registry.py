@@ -0,0 +1,191 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import joblib
+
+
+REGISTRY_DIR = os.environ.get(
+    'MODEL_REGISTRY_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'models')
+)
+REGISTRY_MAX_BYTES = int(float(os.environ.get('MODEL_REGISTRY_MAX_MB', 4096)) * 1024 * 1024)
+WARM_MODELS = int(os.environ.get('MODEL_WARM_COUNT', 8))
+
+
+class ModelNotFound(Exception):
+    """Raised when a model id is unknown or its files have been removed"""
+
+
+class ModelRegistry:
+    """
+    On-disk store of trained ModelArtifacts with a warm LRU of loaded ones.
+
+    Each model is an uncompressed joblib file plus a JSON sidecar with its
+    params and metrics, so listing never unpickles anything. Cold models
+    are loaded on demand with mmap_mode='r': large arrays (KNN training
+    data, SVM support vectors, coefficients) are paged in from the file
+    rather than copied onto the heap. At most warm_count artifacts stay
+    loaded; the least recently used one is dropped first.
+    """
+
+    def __init__(self, root=REGISTRY_DIR, max_bytes=REGISTRY_MAX_BYTES, warm_count=WARM_MODELS):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.warm_count = warm_count
+        self._warm = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        os.makedirs(self.root, exist_ok=True)
+
+    def _paths(self, model_id):
+        if not model_id or not all(c in '0123456789abcdef' for c in model_id):
+            raise ModelNotFound('Model not found.')
+        base = os.path.join(self.root, model_id)
+        return base + '.joblib', base + '.json'
+
+    def save(self, artifact, owner=None, params=None):
+        """Persist an artifact; returns its metadata"""
+        model_id = uuid.uuid4().hex
+        data_path, meta_path = self._paths(model_id)
+        tmp_data = f'{data_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        joblib.dump(artifact, tmp_data)
+        os.replace(tmp_data, data_path)
+
+        artifact.model_id = model_id
+        meta = {
+            **artifact.describe(),
+            'modelId': model_id,
+            'owner': owner,
+            'params': params or {},
+            'sizeBytes': os.path.getsize(data_path)
+        }
+        self._write_meta(model_id, meta)
+
+        with self._lock:
+            self._remember(model_id, artifact)
+        self._prune(keep=model_id)
+        return meta
+
+    def _write_meta(self, model_id, meta):
+        _, meta_path = self._paths(model_id)
+        tmp_meta = f'{meta_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_meta, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_meta, meta_path)
+
+    def update_metrics(self, model_id, metrics):
+        """Merge new metrics (e.g. deferred CV scores) into a stored model's metadata"""
+        meta = self.describe(model_id)
+        meta['metrics'] = {**meta.get('metrics', {}), **metrics}
+        self._write_meta(model_id, meta)
+        with self._lock:
+            artifact = self._warm.get(model_id)
+        if artifact is not None:
+            artifact.metrics = meta['metrics']
+        return meta
+
+    def describe(self, model_id, owner=None):
+        """A model's metadata; with an owner, models of other owners are not found"""
+        _, meta_path = self._paths(model_id)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            raise ModelNotFound('Model not found.')
+        if owner is not None and meta.get('owner') != owner:
+            raise ModelNotFound('Model not found.')
+        return meta
+
+    def list(self, owner=None):
+        """Metadata of stored models, newest first"""
+        models = []
+        for name in os.listdir(self.root):
+            if not name.endswith('.json'):
+                continue
+            try:
+                meta = self.describe(name[:-len('.json')])
+            except ModelNotFound:
+                continue
+            if owner is None or meta.get('owner') == owner:
+                models.append(meta)
+        return sorted(models, key=lambda m: m.get('createdAt', 0), reverse=True)
+
+    def load(self, model_id, owner=None):
+        """The artifact for a model id, from the warm cache or lazily from disk"""
+        data_path, _ = self._paths(model_id)
+        if owner is not None:
+            self.describe(model_id, owner)
+        with self._lock:
+            artifact = self._warm.get(model_id)
+            if artifact is not None:
+                self._warm.move_to_end(model_id)
+                self._hits += 1
+                return artifact
+            self._misses += 1
+
+        try:
+            artifact = joblib.load(data_path, mmap_mode='r')
+        except FileNotFoundError:
+            raise ModelNotFound('Model not found.')
+        artifact.model_id = model_id
+        now = time.time()
+        os.utime(data_path, (now, now))
+
+        with self._lock:
+            self._remember(model_id, artifact)
+        return artifact
+
+    def delete(self, model_id, owner=None):
+        paths = self._paths(model_id)
+        if owner is not None:
+            self.describe(model_id, owner)
+        with self._lock:
+            self._warm.pop(model_id, None)
+        if not os.path.exists(paths[0]):
+            raise ModelNotFound('Model not found.')
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                'warmModels': len(self._warm),
+                'warmCapacity': self.warm_count,
+                'hits': self._hits,
+                'misses': self._misses
+            }
+
+    def _remember(self, model_id, artifact):
+        self._warm[model_id] = artifact
+        self._warm.move_to_end(model_id)
+        while len(self._warm) > self.warm_count:
+            self._warm.popitem(last=False)
+
+    def _prune(self, keep):
+        """Delete least recently used models beyond the size budget"""
+        entries = []
+        for name in os.listdir(self.root):
+            if not name.endswith('.joblib'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.root, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name[:-len('.joblib')]))
+        total = sum(size for _, size, _ in entries)
+        for _, size, model_id in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if model_id == keep:
+                continue
+            self.delete(model_id)
+            total -= size
+            print(f"Evicted stored model {model_id[:12]} ({size} bytes)")
@@ -0,0 +1,62 @@
+"""
+CPU budget shared by the job workers.
+
+Each job is granted a number of cores when it starts, and waits in the
+JobManager's queue until that many are free. Inside the worker the grant
+caps everything that can run in parallel: the estimator's n_jobs, the CV
+and search thread pools, and the BLAS/OpenMP thread pools (through
+threadpoolctl). Concurrent jobs therefore add up to the budget instead of
+each one sizing itself to the whole machine.
+"""
+import os
+import threading
+from contextlib import contextmanager
+
+
+def available_cpus():
+    """Cores this process may run on (the affinity mask, e.g. a container's cpuset)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+# Cores all running jobs may use together
+CPU_BUDGET = max(1, int(os.environ.get('CPU_BUDGET', available_cpus())))
+
+
+class CpuBudget:
+    """Thread-safe count of the cores granted to running jobs"""
+
+    def __init__(self, total=CPU_BUDGET):
+        self.total = max(1, int(total))
+        self.in_use = 0
+        self._lock = threading.Lock()
+
+    def clamp(self, cores):
+        return max(1, min(int(cores), self.total))
+
+    def try_acquire(self, cores):
+        """Grant cores if that many are free; False otherwise"""
+        with self._lock:
+            if self.in_use + cores > self.total:
+                return False
+            self.in_use += cores
+            return True
+
+    def release(self, cores):
+        with self._lock:
+            self.in_use = max(0, self.in_use - cores)
+
+    def stats(self):
+        with self._lock:
+            return {'cpuBudget': self.total, 'coresInUse': self.in_use}
+
+
+@contextmanager
+def thread_limits(threads):
+    """Cap this process's BLAS and OpenMP thread pools inside the block"""
+    from threadpoolctl import threadpool_limits
+
+    with threadpool_limits(limits=max(1, int(threads))):
+        yield
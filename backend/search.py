@@ -0,0 +1,227 @@
+import itertools
+import math
+import os
+
+import numpy as np
+from joblib import Parallel, delayed
+
+from scheduler import thread_limits
+from telemetry import span
+from training import accepts_sparse, as_features, build_model, limit_threads, train_and_evaluate
+
+
+SEARCH_METHODS = ['grid', 'random', 'halving']
+SEARCH_WORKERS = int(os.environ.get('SEARCH_WORKERS', os.cpu_count() or 1))
+
+
+def _log_uniform(low, high):
+    return lambda rng: float(np.exp(rng.uniform(np.log(low), np.log(high))))
+
+
+def _int_uniform(low, high):
+    return lambda rng: int(rng.integers(low, high + 1))
+
+
+def _choice(values):
+    return lambda rng: values[int(rng.integers(len(values)))]
+
+
+# Search spaces use the request parameter names, so every candidate goes
+# through build_model and its clamps like a hand-picked one would.
+# Each parameter has a grid and a sampler for random/halving search.
+SEARCH_SPACES = {
+    'logistic_regression': {
+        'C': ([0.001, 0.01, 0.1, 1.0, 10.0, 100.0], _log_uniform(0.001, 100))
+    },
+    'decision_tree': {
+        'maxDepth': ([None, 3, 5, 10, 20, 30], _choice([None] + list(range(1, 31)))),
+        'minSamplesSplit': ([2, 5, 10, 20], _int_uniform(2, 50))
+    },
+    'random_forest': {
+        'nEstimators': ([50, 100, 200, 500], _int_uniform(10, 500)),
+        'maxDepth': ([None, 5, 10, 20, 30], _choice([None] + list(range(1, 31))))
+    },
+    'gradient_boosting': {
+        'nEstimators': ([50, 100, 200], _int_uniform(10, 500)),
+        'learningRate': ([0.01, 0.05, 0.1, 0.3, 1.0], _log_uniform(0.01, 1.0))
+    },
+    'svm': {
+        'C': ([0.01, 0.1, 1.0, 10.0, 100.0], _log_uniform(0.001, 100)),
+        'kernel': (['linear', 'rbf', 'poly'], _choice(['linear', 'rbf', 'poly']))
+    },
+    'knn': {
+        'nNeighbors': ([1, 3, 5, 7, 11, 15, 21, 31, 50], _int_uniform(1, 50))
+    },
+    'sgd': {
+        'alpha': ([1e-5, 1e-4, 1e-3, 1e-2, 1e-1], _log_uniform(1e-6, 1.0)),
+        'loss': (['log_loss', 'hinge', 'modified_huber'], _choice(['log_loss', 'hinge', 'modified_huber']))
+    },
+    'gaussian_nb': {},
+    'multinomial_nb': {
+        'alpha': ([0.0, 0.1, 0.5, 1.0, 2.0, 5.0, 10.0], _log_uniform(0.01, 10.0))
+    }
+}
+
+
+def generate_candidates(model_type, method, n_candidates, seed=42):
+    """Parameter dicts to try: the full grid, or n_candidates random samples"""
+    space = SEARCH_SPACES[model_type]
+    if not space:
+        return [{}]
+    names = list(space)
+    if method == 'grid':
+        return [dict(zip(names, values)) for values in itertools.product(*(space[n][0] for n in names))]
+    rng = np.random.default_rng(seed)
+    candidates = []
+    seen = set()
+    for _ in range(n_candidates * 10):
+        params = {name: space[name][1](rng) for name in names}
+        key = tuple(sorted(params.items(), key=lambda kv: kv[0]))
+        if key not in seen:
+            seen.add(key)
+            candidates.append(params)
+        if len(candidates) == n_candidates:
+            break
+    return candidates
+
+
+def _make_folds(y, cv_folds, seed):
+    from sklearn.model_selection import StratifiedKFold, KFold
+
+    _, counts = np.unique(y, return_counts=True)
+    if counts.min() >= cv_folds:
+        return StratifiedKFold(n_splits=cv_folds, shuffle=True, random_state=seed)
+    return KFold(n_splits=cv_folds, shuffle=True, random_state=seed)
+
+
+def _fit_and_score(model, X, y, train_idx, test_idx):
+    """Accuracy of one fold; a candidate that fails to fit scores -inf instead of ending the search"""
+    from sklearn.base import clone
+    from sklearn.metrics import accuracy_score
+
+    try:
+        # Folds share the candidate estimator across threads, so fit a copy
+        model = clone(model).fit(X[train_idx], y[train_idx])
+        return accuracy_score(y[test_idx], model.predict(X[test_idx]))
+    except Exception as e:
+        print(f"Candidate {model} failed on a fold: {e}")
+        return -np.inf
+
+
+def _subsample(y, n_rows, seed):
+    """Row indices for a stratified subsample of n_rows (all rows if n_rows >= len(y))"""
+    from sklearn.model_selection import train_test_split
+
+    indices = np.arange(len(y))
+    if n_rows >= len(y):
+        return indices
+    try:
+        subset, _ = train_test_split(indices, train_size=n_rows, random_state=seed, stratify=y)
+    except ValueError:
+        subset, _ = train_test_split(indices, train_size=n_rows, random_state=seed)
+    return np.sort(subset)
+
+
+def _schedule(n_candidates, n_rows, min_rows, factor):
+    """(rows, candidates kept) per successive-halving rung; the last rung uses every row"""
+    n_rungs = 1
+    if n_candidates > 1 and n_rows > min_rows:
+        by_candidates = math.ceil(math.log(n_candidates, factor)) + 1
+        by_rows = int(math.log(n_rows / min_rows, factor)) + 1
+        n_rungs = max(1, min(by_candidates, by_rows))
+    return [
+        (max(min_rows, n_rows // factor ** (n_rungs - 1 - i)), math.ceil(n_candidates / factor ** i))
+        for i in range(n_rungs)
+    ]
+
+
+def search_and_train(reporter, model_type, method, X, y, split,
+                     feature_names, class_names, n_candidates=20, cv_folds=3, factor=3,
+                     n_jobs=None, seed=42, feature_sources=None):
+    """
+    Hyperparameter search, then a full train of the best candidate. Runs inside a job worker.
+
+    Candidates are scored by cross-validated accuracy on the training split,
+    with their (candidate, fold) fits spread over n_jobs threads inside the
+    job worker. Halving search scores every candidate on a small stratified
+    subsample first and promotes only the best 1/factor to each larger rung,
+    so poor settings are dropped before they cost a full fit. Returns the usual training
+    result plus a 'search' summary and the winning 'params'.
+    """
+    n_jobs = n_jobs or SEARCH_WORKERS
+    y_train = split.train(y).astype(int, copy=False)
+    n_rows = len(y_train)
+    X_train = as_features(split.train(X), not accepts_sparse(build_model(model_type, {}, n_rows)[0]))
+
+    candidates = generate_candidates(model_type, method, n_candidates, seed)
+    n_classes = len(np.unique(y_train))
+    if method == 'halving':
+        schedule = _schedule(len(candidates), n_rows, max(n_classes * cv_folds * 2, 30), factor)
+    else:
+        schedule = [(n_rows, len(candidates))]
+
+    results = []
+    fits = 0
+    alive = candidates
+    reporter.update(stage='search', rung=0, rungs=len(schedule), candidates=len(candidates), fits=0)
+    print(f"Searching {len(candidates)} {model_type} candidates ({method}, {len(schedule)} rungs)...")
+
+    # Every fit is single-threaded, BLAS included, so n_jobs fits fill the job's cores
+    with span('search'), thread_limits(1), Parallel(n_jobs=n_jobs, prefer='threads') as parallel:
+        for rung, (rows, keep) in enumerate(schedule, start=1):
+            reporter.check_cancelled()
+            alive = alive[:keep]
+            subset = _subsample(y_train, rows, seed + rung)
+            X_rung, y_rung = X_train[subset], y_train[subset]
+            folds = list(_make_folds(y_rung, cv_folds, seed).split(X_rung, y_rung))
+            # Clamps such as KNN's n_neighbors must hold for the smallest fold a candidate trains on
+            fold_rows = min(len(train_idx) for train_idx, _ in folds)
+
+            tasks = []
+            for params in alive:
+                model, _ = build_model(model_type, params, fold_rows)
+                limit_threads(model, 1)
+                if model_type == 'svm':
+                    # Accuracy only needs predict, so skip SVC's internal Platt-scaling CV
+                    model.set_params(probability=False)
+                for train_idx, test_idx in folds:
+                    tasks.append(delayed(_fit_and_score)(model, X_rung, y_rung, train_idx, test_idx))
+
+            scores = np.asarray(parallel(tasks), dtype=float).reshape(len(alive), len(folds))
+            fits += scores.size
+
+            rung_results = [
+                {'params': params, 'meanScore': float(row.mean()), 'stdScore': float(row.std()),
+                 'rung': rung, 'rows': int(len(subset))}
+                for params, row in zip(alive, scores)
+            ]
+            results.extend(rung_results)
+            order = np.argsort([-r['meanScore'] for r in rung_results], kind='stable')
+            alive = [alive[i] for i in order]
+            reporter.update(rung=rung, candidatesLeft=len(alive), fits=fits,
+                            bestScore=rung_results[order[0]]['meanScore'])
+
+    best_params = alive[0]
+    best = [r for r in results if r['params'] is best_params][-1]
+    print(f"Best {model_type} params: {best_params} (CV accuracy {best['meanScore']:.4f})")
+
+    # The final fit gathers its own rows from X
+    del X_train, y_train, X_rung, y_rung
+    model, model_display_name = build_model(model_type, best_params, n_rows)
+    limit_threads(model, n_jobs)
+    result = train_and_evaluate(reporter, model, model_type, model_display_name,
+                                X, y, split, feature_names, class_names,
+                                feature_sources=feature_sources)
+    final_rung = [r for r in results if r['rung'] == len(schedule)]
+    result['response']['search'] = {
+        'method': method,
+        'candidates': len(candidates),
+        'fits': fits,
+        'cvFolds': cv_folds,
+        'rungs': [{'rows': int(rows), 'candidates': min(keep, len(candidates))} for rows, keep in schedule],
+        'bestParams': best_params,
+        'bestScore': round(best['meanScore'], 4),
+        'results': sorted(final_rung, key=lambda r: -r['meanScore'])[:20]
+    }
+    result['params'] = best_params
+    return result
@@ -0,0 +1,146 @@
+import io
+import json
+import math
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPES = ['application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack']
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+
+# Array kinds whose tolist() already yields JSON-native values
+_NATIVE_KINDS = 'iub'
+
+
+def _array_to_jsonable(arr):
+    """An ndarray as nested lists, with NaN/inf -> None applied to the whole array at once"""
+    if arr.dtype.kind in _NATIVE_KINDS:
+        return arr.tolist()
+    if arr.dtype.kind == 'f':
+        finite = np.isfinite(arr)
+        if finite.all():
+            return arr.tolist()
+        out = arr.astype(object)
+        out[~finite] = None
+        return out.tolist()
+    return to_jsonable(arr.tolist())
+
+
+def to_jsonable(obj):
+    """
+    Convert a response to JSON-native types.
+
+    numpy scalars become Python numbers, NaN/inf become None, timestamps
+    become strings and anything unknown falls back to str(). Arrays are
+    converted in bulk rather than element by element.
+    """
+    kind = type(obj)
+    if kind is str or kind is int or kind is bool or obj is None:
+        return obj
+    if kind is float:
+        return obj if math.isfinite(obj) else None
+    if kind is dict:
+        return {str(key): to_jsonable(value) for key, value in obj.items()}
+    if kind is list or kind is tuple:
+        return [to_jsonable(item) for item in obj]
+    if isinstance(obj, np.ndarray):
+        return _array_to_jsonable(obj)
+    if isinstance(obj, (np.bool_, bool)):
+        return bool(obj)
+    if isinstance(obj, (np.integer, int)):
+        return int(obj)
+    if isinstance(obj, (np.floating, float)):
+        return float(obj) if math.isfinite(obj) else None
+    if isinstance(obj, str):
+        return str(obj)
+    if isinstance(obj, dict):
+        return {str(key): to_jsonable(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_jsonable(item) for item in obj]
+    if isinstance(obj, (pd.Timestamp, pd.Timedelta)):
+        return str(obj)
+    try:
+        if pd.isna(obj):
+            return None
+    except (TypeError, ValueError):
+        pass
+    try:
+        return str(obj)
+    except Exception:
+        return None
+
+
+def column_to_jsonable(values):
+    """A column (Series or 1-d array) as a list of JSON-native values"""
+    arr = np.asarray(values)
+    if arr.dtype.kind in _NATIVE_KINDS + 'f':
+        return _array_to_jsonable(arr)
+    # Datetimes, strings and mixed columns: convert the (few) values one by one
+    return [to_jsonable(value) for value in np.asarray(values, dtype=object).tolist()]
+
+
+def records(df, n_rows=10):
+    """The first n_rows of a DataFrame as a list of {column: value} dicts, converted column-wise"""
+    head = df.head(n_rows)
+    columns = [str(col) for col in head.columns]
+    values = [column_to_jsonable(head.iloc[:, i]) for i in range(head.shape[1])]
+    return [dict(zip(columns, row)) for row in zip(*values)] if columns else [{} for _ in range(len(head))]
+
+
+def dumps_json(data):
+    """JSON bytes for a response, with sorted keys like Flask's jsonify"""
+    data = to_jsonable(data)
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(data, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def dumps_msgpack(data):
+    return msgpack.packb(to_jsonable(data), use_bin_type=True)
+
+
+def wants_msgpack(accept_mimetypes):
+    """Whether the client asked for MessagePack over JSON (and it is available)"""
+    if msgpack is None:
+        return False
+    # JSON first, so */* and ties keep the default
+    best = accept_mimetypes.best_match([JSON_MIMETYPE] + MSGPACK_MIMETYPES, default=JSON_MIMETYPE)
+    return best in MSGPACK_MIMETYPES
+
+
+def arrow_stream(batches):
+    """Encode DataFrame batches as one Arrow IPC stream, yielding bytes as each batch is written"""
+    buffer = io.BytesIO()
+    writer = None
+    for df in batches:
+        table = pa.Table.from_pandas(df, preserve_index=True)
+        if writer is None:
+            schema = table.schema
+            writer = pa.ipc.new_stream(buffer, schema)
+        elif table.schema != schema:
+            table = table.cast(schema)
+        writer.write_table(table)
+        yield _drain(buffer)
+    if writer is not None:
+        writer.close()
+        yield _drain(buffer)
+
+
+def _drain(buffer):
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return data
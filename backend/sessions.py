@@ -0,0 +1,227 @@
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+SESSION_COOKIE = 'ml_session'
+SESSION_HEADER = 'X-Session-ID'
+
+_SESSION_ID_RE = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+
+class SessionData(dict):
+    """Session state dict that remembers whether a request wrote to it"""
+
+    dirty = False
+
+    def __setitem__(self, key, value):
+        self.dirty = True
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self.dirty = True
+        super().__delitem__(key)
+
+    def update(self, *args, **kwargs):
+        self.dirty = True
+        super().update(*args, **kwargs)
+
+    def pop(self, *args):
+        self.dirty = True
+        return super().pop(*args)
+
+    def setdefault(self, key, default=None):
+        self.dirty = True
+        return super().setdefault(key, default)
+
+    def clear(self):
+        self.dirty = True
+        super().clear()
+
+
+def default_session_state():
+    """Fresh per-client pipeline state"""
+    return SessionData({
+        'dataset': None,
+        'X': None,
+        'y': None,
+        'split': None,
+        'preprocess_key': None,
+        'split_id': None,
+        'target_column': None,
+        'feature_columns': None,
+        'scaler': None,
+        'model': None,
+        'label_encoder': None,
+        'feature_encoders': {},
+        'feature_pipeline': None,
+        'streaming': False,
+        'stream_split': None,
+        'model_artifact': None
+    })
+
+
+def estimate_nbytes(value, _depth=0):
+    """Cheap estimate of the memory held by a session value"""
+    if value is None or _depth > 3:
+        return 0
+    if isinstance(value, pd.DataFrame):
+        # Shallow on purpose: deep=True walks every Python string
+        return int(value.memory_usage(index=True, deep=False).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=False))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, dict):
+        return sum(estimate_nbytes(v, _depth + 1) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_nbytes(v, _depth + 1) for v in value)
+    if hasattr(value, '__dict__'):
+        # Fitted estimators keep their state in ndarray attributes
+        return sum(
+            estimate_nbytes(v, _depth + 1) for v in vars(value).values()
+            if isinstance(v, (np.ndarray, list, tuple))
+        )
+    return 0
+
+
+class Session:
+    """State and lock for a single client pipeline"""
+
+    def __init__(self, session_id):
+        self.id = session_id
+        self.data = default_session_state()
+        self.lock = threading.RLock()
+        self.last_access = time.monotonic()
+        self.nbytes = 0
+        self.active = 0
+        # False until the first request that writes to it; only stored sessions
+        # count toward the session cap and memory budget
+        self.stored = False
+
+    def reset(self):
+        self.data = default_session_state()
+        self.nbytes = 0
+
+
+class SessionStore:
+    """
+    Thread-safe store of client sessions with LRU/TTL eviction.
+
+    Sessions are kept in least-recently-used order. Expired sessions are
+    dropped on access, and idle sessions are evicted oldest-first whenever
+    the total estimated size exceeds the memory budget or the session count
+    exceeds max_sessions. A session that is serving a request is never evicted.
+
+    A new session is only stored once a request writes to it, so requests
+    that just read (probes, preflights, status polls) never push real
+    sessions out.
+    """
+
+    def __init__(self, ttl_seconds=3600, max_sessions=100, memory_budget_bytes=1024 * 1024 * 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.memory_budget_bytes = memory_budget_bytes
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            ttl_seconds=int(os.environ.get('SESSION_TTL_SECONDS', 3600)),
+            max_sessions=int(os.environ.get('SESSION_MAX_COUNT', 100)),
+            memory_budget_bytes=int(float(os.environ.get('SESSION_MEMORY_BUDGET_MB', 1024)) * 1024 * 1024)
+        )
+
+    @staticmethod
+    def new_id():
+        return uuid.uuid4().hex
+
+    def acquire(self, session_id=None):
+        """Get a stored session, or a new unstored one, and lock it for the current request"""
+        with self._lock:
+            self._purge_expired()
+            if not session_id or not _SESSION_ID_RE.match(session_id):
+                session_id = self.new_id()
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = Session(session_id)
+            else:
+                self._sessions.move_to_end(session_id)
+            session.active += 1
+            session.last_access = time.monotonic()
+        session.lock.acquire()
+        return session
+
+    def reacquire(self, session):
+        """Lock a session again after it was released mid-request, e.g. by a streaming response"""
+        with self._lock:
+            session.active += 1
+            session.last_access = time.monotonic()
+        session.lock.acquire()
+        return session
+
+    def release(self, session):
+        """Unlock a session after a request, store it if it was written to and enforce the memory budget"""
+        try:
+            session.nbytes = estimate_nbytes(session.data)
+        finally:
+            session.lock.release()
+        with self._lock:
+            session.active -= 1
+            session.last_access = time.monotonic()
+            if not session.stored and session.data.dirty:
+                session.stored = True
+                self._sessions.setdefault(session.id, session)
+                self._sessions.move_to_end(session.id)
+            self._evict_over_budget()
+
+    def get(self, session_id):
+        """Look up an existing session without creating or locking it"""
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def discard(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def total_nbytes(self):
+        with self._lock:
+            return sum(s.nbytes for s in self._sessions.values())
+
+    def stats(self):
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'totalBytes': sum(s.nbytes for s in self._sessions.values()),
+                'memoryBudgetBytes': self.memory_budget_bytes,
+                'maxSessions': self.max_sessions,
+                'ttlSeconds': self.ttl_seconds
+            }
+
+    def _purge_expired(self):
+        cutoff = time.monotonic() - self.ttl_seconds
+        for session_id, session in list(self._sessions.items()):
+            if session.last_access >= cutoff:
+                # Ordered by last access, so the rest are newer
+                break
+            if session.active == 0:
+                del self._sessions[session_id]
+                print(f"Session {session_id[:8]} expired")
+
+    def _evict_over_budget(self):
+        total = sum(s.nbytes for s in self._sessions.values())
+        for session_id, session in list(self._sessions.items()):
+            if total <= self.memory_budget_bytes and len(self._sessions) <= self.max_sessions:
+                break
+            if session.active > 0:
+                continue
+            del self._sessions[session_id]
+            total -= session.nbytes
+            print(f"Session {session_id[:8]} evicted ({session.nbytes} bytes)")
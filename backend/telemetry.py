@@ -0,0 +1,212 @@
+"""
+Stage timing, latency histograms, peak memory and a Prometheus exposition.
+
+Work is timed with span('fit'), or with a Stopwatch for a stage made of
+many short sections. Every span feeds the stage_duration_seconds
+histogram; while a trace is open on the thread (one per request, one per
+job) it is also collected, so the request can report its own breakdown as
+a Server-Timing header. Spans may nest: an outer stage includes the time
+of the stages inside it.
+
+Job workers are separate processes, so their traces travel back with the
+job (see jobs.py) and are recorded here by the parent.
+"""
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Seconds; from quick lookups to long training jobs
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+# Bytes; 16MB to 16GB in steps of 4x
+MEMORY_BUCKETS = tuple(2 ** 24 * 4 ** i for i in range(6))
+
+METRIC_PREFIX = 'mlpipeline_'
+
+_trace = threading.local()
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+
+class Telemetry:
+    """Thread-safe store of labelled histograms, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._histograms = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, labels=None, buckets=LATENCY_BUCKETS, help_text=''):
+        key = tuple(sorted((labels or {}).items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(buckets)
+                self._help.setdefault(name, help_text)
+            histogram.observe(float(value))
+
+    def summary(self, name):
+        """{labels: (count, sum)} for one histogram"""
+        with self._lock:
+            return {key: (h.count, h.sum) for key, h in self._histograms.get(name, {}).items()}
+
+    def render(self, samples=()):
+        """
+        Prometheus text exposition of every histogram, plus point-in-time
+        samples given as (name, 'gauge' or 'counter', help, [(labels, value), ...]).
+        """
+        lines = []
+        with self._lock:
+            for name in sorted(self._histograms):
+                full = METRIC_PREFIX + name
+                lines.append(f'# HELP {full} {self._help[name]}')
+                lines.append(f'# TYPE {full} histogram')
+                for key, histogram in sorted(self._histograms[name].items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                        cumulative += count
+                        lines.append(f'{full}_bucket{_labels(key + (("le", _number(bound)),))} {cumulative}')
+                    lines.append(f'{full}_sum{_labels(key)} {_number(histogram.sum)}')
+                    lines.append(f'{full}_count{_labels(key)} {cumulative}')
+        for name, kind, help_text, values in samples:
+            full = METRIC_PREFIX + name
+            lines.append(f'# HELP {full} {help_text}')
+            lines.append(f'# TYPE {full} {kind}')
+            for labels, value in values:
+                lines.append(f'{full}{_labels(tuple(sorted(labels.items())))} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _number(value):
+    if isinstance(value, str):
+        return value
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+telemetry = Telemetry()
+
+
+def begin_trace():
+    """Start collecting this thread's spans"""
+    _trace.spans = []
+
+
+def end_trace():
+    """Stop collecting; returns the [(stage, seconds), ...] recorded since begin_trace"""
+    spans = getattr(_trace, 'spans', None)
+    _trace.spans = None
+    return spans or []
+
+
+def record_span(stage, seconds):
+    telemetry.observe('stage_duration_seconds', seconds, {'stage': stage},
+                      help_text='Time spent in each pipeline stage.')
+    spans = getattr(_trace, 'spans', None)
+    if spans is not None:
+        spans.append((stage, seconds))
+
+
+def record_trace(spans):
+    """Record spans collected elsewhere (a job worker) into the stage histogram"""
+    for stage, seconds in spans or []:
+        telemetry.observe('stage_duration_seconds', seconds, {'stage': stage},
+                          help_text='Time spent in each pipeline stage.')
+
+
+@contextmanager
+def span(stage):
+    """Time the enclosed block as one stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(stage, time.perf_counter() - start)
+
+
+class Stopwatch:
+    """Accumulates many short sections of one stage and records them as a single span"""
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.seconds = 0.0
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds += time.perf_counter() - self._start
+
+    def record(self):
+        record_span(self.stage, self.seconds)
+
+
+def server_timing(spans):
+    """Server-Timing header value for a trace, durations in milliseconds"""
+    return ', '.join(f'{stage};dur={seconds * 1000:.1f}' for stage, seconds in spans)
+
+
+def current_rss():
+    """Resident set size of this process in bytes"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return peak_rss()
+
+
+def peak_rss():
+    """Resident set high-water mark of this process in bytes (since the last reset_peak_rss)"""
+    try:
+        with open('/proc/self/status') as f:
+            match = re.search(r'VmHWM:\s+(\d+) kB', f.read())
+        if match:
+            return int(match.group(1)) * 1024
+    except OSError:
+        pass
+    import resource
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS, and cannot be reset
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if os.uname().sysname == 'Darwin' else maxrss * 1024
+
+
+def reset_peak_rss():
+    """Restart the high-water mark at the current RSS; False where the platform cannot (non-Linux)"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
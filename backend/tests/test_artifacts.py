@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+from sklearn.svm import SVC
+
+from artifacts import ModelArtifact
+from preprocessing import FeaturePipeline
+
+
+def test_predictions_follow_predict_not_probability_argmax():
+    rng = np.random.default_rng(0)
+    y = rng.integers(0, 3, 300)
+    df = pd.DataFrame({'x': rng.normal(size=300) + 0.3 * y, 'z': rng.normal(size=300),
+                       'label': np.array(['a', 'b', 'c'])[y]})
+    pipeline = FeaturePipeline('label', ['x', 'z'], {'x': 'numeric', 'z': 'numeric', 'label': 'categorical'})
+    pipeline.fit(lambda: iter([df]))
+    X, codes = pipeline.transform(df)[:2]
+    model = SVC(probability=True, random_state=0).fit(X, codes)
+    predicted = model.predict(X)
+    proba = model.predict_proba(X)
+    assert (model.classes_[proba.argmax(axis=1)] != predicted).any()
+
+    out = ModelArtifact(pipeline, model, 'svm', 'Support Vector Machine').predict_frame(df.drop(columns='label'))
+    assert list(out['prediction']) == list(pipeline.classes_[predicted])
+    assert np.allclose(out['confidence'], proba[np.arange(len(df)), predicted])
@@ -0,0 +1,44 @@
+import os
+import signal
+import time
+
+from jobs import JobManager, WorkerLost
+from scheduler import CpuBudget
+
+
+def _kill_worker(reporter):
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+def _add(reporter, a, b):
+    return a + b
+
+
+def _wait(job, timeout=60):
+    deadline = time.time() + timeout
+    while not job.future.done():
+        assert time.time() < deadline, f'job still {job.status}'
+        time.sleep(0.05)
+
+
+def test_pool_recovers_after_a_worker_dies():
+    manager = JobManager(max_workers=1, budget=CpuBudget(2))
+    try:
+        killed = manager.submit('s', 'train', _kill_worker, cores=2)
+        queued = manager.submit('s', 'train', _add, 1, 2, cores=2)
+        _wait(killed)
+        assert killed.status == 'failed'
+        assert isinstance(killed.future.exception(), WorkerLost)
+
+        # The job queued behind it runs on the rebuilt pool, and so do new ones
+        _wait(queued)
+        assert manager.result(queued) == 3
+        later = manager.submit('s', 'train', _add, 2, 3)
+        _wait(later)
+        assert manager.result(later) == 5
+
+        stats = manager.stats()
+        assert stats['coresInUse'] == 0
+        assert stats['running'] == 0 and stats['queued'] == 0
+    finally:
+        manager.shutdown()
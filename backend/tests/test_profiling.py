@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+from profiling import RESERVOIR_MAX_CELLS, ProfileBuilder
+
+
+def _frame(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'n': np.where(rng.random(n_rows) < 0.1, np.nan, rng.normal(size=n_rows)),
+        's': pd.Series([f'v{k}' for k in rng.integers(0, 200, n_rows)], dtype=object).where(rng.random(n_rows) > 0.2),
+        'ns': pd.Series([str(k) if k % 9 else 'n/a' for k in rng.integers(0, 500, n_rows)], dtype=object),
+    })
+
+
+def _profile(df, **options):
+    builder = ProfileBuilder(df.columns, **options)
+    for start in range(0, len(df), 4000):
+        builder.update(df.iloc[start:start + 4000])
+    return {c['name']: c for c in builder.finish(df.dtypes).to_dict()['columns']}
+
+
+def test_approximate_profile_tracks_exact():
+    df = _frame(20000)
+    exact = _profile(df)
+    approx = _profile(df, approximate=True, sample_size=5000)
+    for name, column in exact.items():
+        assert approx[name]['nullCount'] == column['nullCount']
+        assert approx[name]['type'] == column['type']
+        estimate = approx[name]['estimate']
+        assert estimate['uniqueCountLow'] <= column['uniqueCount'] <= estimate['uniqueCountHigh']
+
+
+def test_reservoir_is_capped_by_cells():
+    builder = ProfileBuilder([f'c{i}' for i in range(5000)], approximate=True, sample_size=1000000)
+    assert builder._reservoir.size <= RESERVOIR_MAX_CELLS
+    assert ProfileBuilder(['a', 'b'], approximate=True, sample_size=10000).sample_size == 10000
@@ -0,0 +1,33 @@
+import numpy as np
+
+from jobs import ProgressReporter
+from preprocessing import IndexSplit
+from search import _fit_and_score, search_and_train
+
+
+def _dataset(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    y = rng.integers(0, 3, n_rows)
+    X = rng.normal(size=(n_rows, 4)) + y[:, None]
+    order = rng.permutation(n_rows)
+    cut = int(n_rows * 0.8)
+    return X, y, IndexSplit(order[:cut], order[cut:])
+
+
+def test_knn_halving_search_on_small_datasets():
+    for n_rows in [150, 500]:
+        X, y, split = _dataset(n_rows)
+        result = search_and_train(ProgressReporter({}), 'knn', 'halving', X, y, split,
+                                  ['a', 'b', 'c', 'd'], ['0', '1', '2'], n_candidates=20, n_jobs=1)
+        search = result['response']['search']
+        assert search['bestParams'] == result['params']
+        assert np.isfinite(search['bestScore'])
+        assert result['response']['metrics']['testAccuracy'] is not None
+
+
+def test_failing_candidate_scores_negative_infinity():
+    from sklearn.neighbors import KNeighborsClassifier
+
+    X, y, _ = _dataset(40)
+    train_idx, test_idx = np.arange(10), np.arange(10, 40)
+    assert _fit_and_score(KNeighborsClassifier(n_neighbors=30), X, y, train_idx, test_idx) == -np.inf
@@ -0,0 +1,494 @@
+import numpy as np
+from joblib import Parallel, delayed
+from contextlib import nullcontext
+import warnings
+
+from jobs import JobCancelled
+from scheduler import thread_limits
+from telemetry import span
+
+warnings.filterwarnings('ignore')
+
+
+MODEL_TYPES = [
+    'logistic_regression', 'decision_tree', 'random_forest',
+    'gradient_boosting', 'svm', 'knn',
+    'sgd', 'gaussian_nb', 'multinomial_nb'
+]
+
+# Models that support partial_fit and can be trained batch by batch
+INCREMENTAL_MODEL_TYPES = ['sgd', 'gaussian_nb', 'multinomial_nb']
+
+# Models that fail to fit on negative feature values
+NON_NEGATIVE_MODEL_TYPES = ['multinomial_nb']
+
+# Input features kept in the importance and coefficient reports (and plots)
+MAX_REPORTED_FEATURES = 50
+
+
+def _parse_max_depth(max_depth):
+    if max_depth is not None and str(max_depth).strip() not in ['', 'null', 'None']:
+        return max(1, min(int(max_depth), 30))
+    return None
+
+
+def accepts_sparse(model):
+    """Whether an estimator can fit and predict on a scipy sparse matrix"""
+    from sklearn.naive_bayes import GaussianNB
+
+    return not isinstance(model, GaussianNB)
+
+
+def as_features(X, dense=False):
+    """
+    X as a finite float matrix (float32 stays float32), copied only when a conversion is needed.
+
+    Sparse input stays CSR, with only its stored values checked, unless
+    dense is set.
+    """
+    from scipy import sparse
+
+    if sparse.issparse(X):
+        if dense:
+            X = X.toarray()
+        else:
+            X = X.tocsr()
+            if X.dtype.kind != 'f':
+                X = X.astype(float)
+            if not np.isfinite(X.data).all():
+                X = X.copy()
+                X.data = np.nan_to_num(X.data, nan=0.0, posinf=1e10, neginf=-1e10)
+            return X
+    X = np.asarray(X)
+    if X.dtype.kind != 'f':
+        X = X.astype(float)
+    if not np.isfinite(X).all():
+        X = np.nan_to_num(X, nan=0.0, posinf=1e10, neginf=-1e10)
+    return X
+
+
+def build_model(model_type, model_params, n_train):
+    """Create an unfitted estimator from request parameters, clamped to safe ranges"""
+    if model_type == 'logistic_regression':
+        max_iter = int(model_params.get('maxIter', 1000))
+        C = float(model_params.get('C', 1.0))
+        max_iter = max(100, min(max_iter, 5000))
+        C = max(0.001, min(C, 100))
+
+        from sklearn.linear_model import LogisticRegression
+        model = LogisticRegression(
+            max_iter=max_iter, C=C, random_state=42,
+            solver='lbfgs', multi_class='auto'
+        )
+        return model, "Logistic Regression"
+
+    if model_type == 'decision_tree':
+        max_depth = _parse_max_depth(model_params.get('maxDepth'))
+        min_samples_split = int(model_params.get('minSamplesSplit', 2))
+        min_samples_split = max(2, min(min_samples_split, max(2, n_train // 4)))
+
+        from sklearn.tree import DecisionTreeClassifier
+        model = DecisionTreeClassifier(
+            max_depth=max_depth, min_samples_split=min_samples_split, random_state=42
+        )
+        return model, "Decision Tree"
+
+    if model_type == 'random_forest':
+        n_estimators = int(model_params.get('nEstimators', 100))
+        n_estimators = max(10, min(n_estimators, 500))
+        max_depth = _parse_max_depth(model_params.get('maxDepth'))
+
+        from sklearn.ensemble import RandomForestClassifier
+        model = RandomForestClassifier(
+            n_estimators=n_estimators, max_depth=max_depth, random_state=42
+        )
+        return model, "Random Forest"
+
+    if model_type == 'gradient_boosting':
+        n_estimators = int(model_params.get('nEstimators', 100))
+        learning_rate = float(model_params.get('learningRate', 0.1))
+        n_estimators = max(10, min(n_estimators, 500))
+        learning_rate = max(0.01, min(learning_rate, 1.0))
+
+        from sklearn.ensemble import GradientBoostingClassifier
+        model = GradientBoostingClassifier(
+            n_estimators=n_estimators, learning_rate=learning_rate, random_state=42
+        )
+        return model, "Gradient Boosting"
+
+    if model_type == 'svm':
+        C = float(model_params.get('C', 1.0))
+        kernel = str(model_params.get('kernel', 'rbf'))
+        C = max(0.001, min(C, 100))
+        if kernel not in ['linear', 'rbf', 'poly']:
+            kernel = 'rbf'
+
+        from sklearn.svm import SVC
+        model = SVC(C=C, kernel=kernel, random_state=42, probability=True)
+        return model, "Support Vector Machine"
+
+    if model_type == 'knn':
+        n_neighbors = int(model_params.get('nNeighbors', 5))
+        n_neighbors = max(1, min(n_neighbors, min(50, n_train - 1)))
+
+        from sklearn.neighbors import KNeighborsClassifier
+        model = KNeighborsClassifier(n_neighbors=n_neighbors)
+        return model, "K-Nearest Neighbors"
+
+    if model_type == 'sgd':
+        alpha = float(model_params.get('alpha', 0.0001))
+        loss = str(model_params.get('loss', 'log_loss'))
+        alpha = max(1e-6, min(alpha, 1.0))
+        if loss not in ['log_loss', 'hinge', 'modified_huber']:
+            loss = 'log_loss'
+
+        from sklearn.linear_model import SGDClassifier
+        model = SGDClassifier(loss=loss, alpha=alpha, random_state=42)
+        return model, "SGD Classifier"
+
+    if model_type == 'gaussian_nb':
+        from sklearn.naive_bayes import GaussianNB
+        return GaussianNB(), "Gaussian Naive Bayes"
+
+    if model_type == 'multinomial_nb':
+        alpha = float(model_params.get('alpha', 1.0))
+        alpha = max(0.0, min(alpha, 10.0))
+        from sklearn.naive_bayes import MultinomialNB
+        return MultinomialNB(alpha=alpha), "Multinomial Naive Bayes"
+
+    raise ValueError(f'Unknown model type: {model_type}')
+
+
+def limit_threads(model, n_jobs):
+    """Cap an estimator's own parallelism so concurrent jobs share the cores"""
+    if 'n_jobs' in model.get_params():
+        model.set_params(n_jobs=n_jobs)
+    return model
+
+
+def job_cores(model, max_cores, cv=False):
+    """Cores worth granting a training job: max_cores if the estimator or its CV folds run in parallel, else one"""
+    if cv or 'n_jobs' in model.get_params():
+        return max_cores
+    return 1
+
+
+def fit_with_progress(model, X, y, reporter):
+    """
+    Fit a model while publishing estimator progress.
+
+    Random forests are grown in warm-started chunks and gradient boosting
+    reports through its per-stage monitor; both stop at the next checkpoint
+    when the job is cancelled. Other estimators are fitted in one call.
+    """
+    from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
+
+    if isinstance(model, RandomForestClassifier):
+        total = model.n_estimators
+        step = max(1, total // 10)
+        model.set_params(warm_start=True)
+        for n_done in range(min(step, total), total + step, step):
+            n_done = min(n_done, total)
+            reporter.check_cancelled()
+            model.set_params(n_estimators=n_done)
+            model.fit(X, y)
+            reporter.update(estimatorsDone=n_done, estimatorsTotal=total)
+            if n_done == total:
+                break
+        model.set_params(warm_start=False)
+        return model
+
+    if isinstance(model, GradientBoostingClassifier):
+        total = model.n_estimators
+        step = max(1, total // 20)
+
+        def monitor(i, estimator, local_vars):
+            if (i + 1) % step == 0 or i + 1 == total:
+                reporter.update(estimatorsDone=i + 1, estimatorsTotal=total)
+            return reporter.cancelled()
+
+        model.fit(X, y, monitor=monitor)
+        reporter.check_cancelled()
+        return model
+
+    model.fit(X, y)
+    return model
+
+
+def _fold_score(model, X, y, train_idx, test_idx):
+    from sklearn.base import clone
+    from sklearn.metrics import accuracy_score
+
+    fold_model = clone(model).fit(X[train_idx], y[train_idx])
+    return accuracy_score(y[test_idx], fold_model.predict(X[test_idx]))
+
+
+def cross_validate_with_progress(model, X, y, n_splits, reporter, n_jobs=1):
+    """
+    Accuracy CV over the same folds cross_val_score would use.
+
+    With n_jobs > 1 the folds are fitted on a thread pool (each estimator
+    limited to one thread; the sklearn fitting loops release the GIL), which
+    avoids nesting a second process pool inside the job worker. Progress is
+    reported as folds finish.
+    """
+    from sklearn.base import clone
+    from sklearn.model_selection import check_cv
+
+    cv = check_cv(n_splits, y, classifier=True)
+    folds = list(cv.split(X, y))
+    # Ship an unfitted copy to the fold workers rather than the fitted model
+    model = clone(model)
+    if n_jobs > 1:
+        limit_threads(model, 1)
+    reporter.update(stage='cross_validation', cvFold=0, cvFolds=n_splits)
+    scores = []
+    threads = min(n_jobs, len(folds))
+    # The job's BLAS threads are shared out between the fold threads
+    limits = thread_limits(n_jobs // threads) if threads > 1 else nullcontext()
+    with limits, Parallel(n_jobs=threads, prefer='threads', return_as='generator') as parallel:
+        for score in parallel(delayed(_fold_score)(model, X, y, train_idx, test_idx)
+                              for train_idx, test_idx in folds):
+            reporter.check_cancelled()
+            scores.append(score)
+            reporter.update(cvFold=len(scores))
+    return np.array(scores)
+
+
+def confusion_matrix_labels(y_test, y_pred_test, class_names, n_rows):
+    if class_names is None:
+        return [str(i) for i in range(n_rows)]
+    try:
+        present_classes = sorted(set(y_test.tolist() + y_pred_test.tolist()))
+        return [
+            str(class_names[i]) if i < len(class_names) else str(i)
+            for i in present_classes
+        ]
+    except Exception as e:
+        print(f"Label error: {e}")
+        return [str(i) for i in range(n_rows)]
+
+
+def metrics_from_confusion(cm, n_classes):
+    """
+    Accuracy, precision, recall and F1 from an accumulated confusion matrix.
+
+    Matches the sklearn scores used by train_and_evaluate: the positive
+    label for binary problems is the larger class present in the test set,
+    otherwise scores are support-weighted with zero_division=0.
+    """
+    cm = np.asarray(cm, dtype=np.float64)
+    total = cm.sum()
+    accuracy = float(np.trace(cm) / total) if total else 0.0
+    tp = np.diag(cm)
+    support = cm.sum(axis=1)
+    predicted = cm.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(predicted > 0, tp / predicted, 0.0)
+        recall = np.where(support > 0, tp / support, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+
+    if n_classes == 2:
+        present = np.flatnonzero(support)
+        if len(present) == 0:
+            return accuracy, 0.0, 0.0, 0.0
+        pos = present[1] if len(present) > 1 else present[0]
+        return accuracy, float(precision[pos]), float(recall[pos]), float(f1[pos])
+
+    if not support.sum():
+        return accuracy, 0.0, 0.0, 0.0
+    weights = support / support.sum()
+    return accuracy, float(precision @ weights), float(recall @ weights), float(f1 @ weights)
+
+
+def _by_source(values, feature_names, feature_sources, combine):
+    """
+    Fold per-column values into one value per input feature, keeping the
+    MAX_REPORTED_FEATURES largest by magnitude. Encoded and hashed columns
+    would otherwise each get an entry, up to tens of thousands of them.
+    """
+    sources = feature_sources if feature_sources is not None else feature_names
+    folded = {}
+    for source, value in zip(sources, values):
+        source = str(source)
+        value = float(value)
+        folded[source] = combine(folded[source], value) if source in folded else value
+    top = sorted(folded.items(), key=lambda item: abs(item[1]), reverse=True)[:MAX_REPORTED_FEATURES]
+    return dict(top)
+
+
+def build_training_response(model, model_type, model_display_name, metrics, cm, cm_labels,
+                            feature_names, n_classes, n_train, n_test, feature_sources=None):
+    """
+    Assemble the JSON-ready training response; plots are rendered later
+    from these numbers. feature_sources names the input feature behind
+    each column of feature_names; importances and coefficients are
+    reported per input feature.
+    """
+    # Feature importance, summed over the columns of each input feature
+    feature_importance = None
+
+    if hasattr(model, 'feature_importances_'):
+        try:
+            feature_importance = _by_source(model.feature_importances_, feature_names, feature_sources,
+                                            lambda a, b: a + b)
+        except Exception as e:
+            print(f"Error generating feature importance: {e}")
+
+    # Coefficients; each input feature keeps its strongest column's
+    coefficients = None
+
+    if hasattr(model, 'coef_'):
+        try:
+            if model.coef_.ndim == 1:
+                coef = model.coef_
+            elif model.coef_.shape[0] == 1:
+                coef = model.coef_[0]
+            else:
+                coef = np.mean(model.coef_, axis=0)
+
+            coefficients = _by_source(coef, feature_names, feature_sources,
+                                      lambda a, b: a if abs(a) >= abs(b) else b)
+        except Exception as e:
+            print(f"Error generating coefficients: {e}")
+
+    return {
+        'success': True,
+        'modelType': str(model_type),
+        'modelDisplayName': str(model_display_name),
+        'metrics': {
+            key: round(float(value), 4) if value is not None else None
+            for key, value in metrics.items()
+        },
+        'confusionMatrix': [[int(cell) for cell in row] for row in cm.tolist()],
+        'classLabels': cm_labels,
+        'featureImportance': feature_importance,
+        'coefficients': coefficients,
+        'numClasses': int(n_classes),
+        'trainSamples': int(n_train),
+        'testSamples': int(n_test),
+        'numFeatures': int(len(feature_names))
+    }
+
+
+def train_and_evaluate(reporter, model, model_type, model_display_name,
+                       X, y, split, feature_names, class_names,
+                       cv=True, cv_scores=None, cv_jobs=1, feature_sources=None):
+    """
+    Fit, score and cross-validate a model. Runs inside a job worker.
+
+    The train and test rows are gathered from X and y here, by the split's
+    indices, so the caller never materializes them. Cross-validation is
+    skipped when cv is False, and reused when the caller already has
+    cv_scores for this configuration. Returns a dict with the JSON-ready
+    'response', the fitted 'model' and the 'cv_scores' (or None).
+    """
+    from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, confusion_matrix
+
+    dense = not accepts_sparse(model)
+    X_train = as_features(split.train(X), dense)
+    X_test = as_features(split.test(X), dense)
+    y_train = split.train(y).astype(int, copy=False)
+    y_test = split.test(y).astype(int, copy=False)
+
+    n_classes = len(np.unique(y_train))
+
+    # Train model
+    reporter.update(stage='fit')
+    print(f"Training {model_display_name}...")
+    try:
+        with span('fit'):
+            fit_with_progress(model, X_train, y_train, reporter)
+    except JobCancelled:
+        raise
+    except Exception as e:
+        print(f"ERROR training model: {e}")
+        raise ValueError(f'Training failed: {str(e)}')
+
+    # Predictions
+    reporter.update(stage='predict')
+    with span('predict'):
+        y_pred_train = model.predict(X_train)
+        y_pred_test = model.predict(X_test)
+
+    # Cross-validation
+    cv_mean = None
+    cv_std = None
+    cv_status = 'cached' if cv_scores is not None else 'skipped'
+    if cv_scores is None and cv and X_train.shape[0] >= 10:
+        try:
+            n_splits = min(5, X_train.shape[0] // 2)
+            if n_splits >= 2:
+                with span('cv'):
+                    cv_scores = cross_validate_with_progress(model, X_train, y_train, n_splits, reporter, cv_jobs)
+                cv_status = 'done'
+        except JobCancelled:
+            raise
+        except Exception as e:
+            print(f"CV warning: {e}")
+    if cv_scores is not None:
+        cv_mean = float(np.mean(cv_scores))
+        cv_std = float(np.std(cv_scores))
+
+    with span('metrics'):
+        train_accuracy = float(accuracy_score(y_train, y_pred_train))
+        test_accuracy = float(accuracy_score(y_test, y_pred_test))
+
+        print(f"Train accuracy: {train_accuracy:.4f}")
+        print(f"Test accuracy: {test_accuracy:.4f}")
+
+        # Precision, recall, F1
+        try:
+            if n_classes == 2:
+                unique_labels = np.unique(y_test)
+                pos_label = int(unique_labels[1]) if len(unique_labels) > 1 else int(unique_labels[0])
+                precision = float(precision_score(y_test, y_pred_test, pos_label=pos_label, zero_division=0))
+                recall = float(recall_score(y_test, y_pred_test, pos_label=pos_label, zero_division=0))
+                f1 = float(f1_score(y_test, y_pred_test, pos_label=pos_label, zero_division=0))
+            else:
+                precision = float(precision_score(y_test, y_pred_test, average='weighted', zero_division=0))
+                recall = float(recall_score(y_test, y_pred_test, average='weighted', zero_division=0))
+                f1 = float(f1_score(y_test, y_pred_test, average='weighted', zero_division=0))
+        except Exception as e:
+            print(f"Metrics error: {e}")
+            precision = recall = f1 = 0.0
+
+        # Confusion matrix
+        cm = confusion_matrix(y_test, y_pred_test)
+        cm_labels = confusion_matrix_labels(y_test, y_pred_test, class_names, cm.shape[0])
+
+        response_data = build_training_response(
+            model, model_type, model_display_name,
+            {
+                'trainAccuracy': train_accuracy,
+                'testAccuracy': test_accuracy,
+                'precision': precision,
+                'recall': recall,
+                'f1Score': f1,
+                'cvMean': cv_mean,
+                'cvStd': cv_std
+            },
+            cm, cm_labels, feature_names, n_classes, X_train.shape[0], X_test.shape[0],
+            feature_sources=feature_sources
+        )
+    response_data['cvStatus'] = cv_status
+
+    reporter.update(stage='done')
+    return {
+        'response': response_data,
+        'model': model,
+        'cv_scores': None if cv_scores is None else [float(s) for s in cv_scores]
+    }
+
+
+def cross_validate_job(reporter, model, X, y, split, cv_jobs=1):
+    """Deferred cross-validation of an unfitted model on a training split. Runs inside a job worker."""
+    X_train = as_features(split.train(X), not accepts_sparse(model))
+    y_train = split.train(y).astype(int, copy=False)
+    n_splits = min(5, X_train.shape[0] // 2)
+    if X_train.shape[0] < 10 or n_splits < 2:
+        raise ValueError('Not enough training samples for cross-validation.')
+    with span('cv'):
+        scores = cross_validate_with_progress(model, X_train, y_train, n_splits, reporter, cv_jobs)
+    reporter.update(stage='done')
+    return {'cv_scores': [float(s) for s in scores]}
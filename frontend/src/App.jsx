@@ -10,6 +10,9 @@ import ModelSelection from './components/ModelSelection';
 import Results from './components/Results';
 import './App.css';
 
+// Send the session cookie so each browser gets its own pipeline
+axios.defaults.withCredentials = true;
+
 function App() {
   // State for each step
   const [uploadedData, setUploadedData] = useState(null);
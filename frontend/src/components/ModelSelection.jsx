@@ -8,6 +8,7 @@ const ModelSelection = ({ splitData, onTrainSuccess, trainingResults }) => {
   const [selectedModel, setSelectedModel] = useState('logistic_regression');
   const [isTraining, setIsTraining] = useState(false);
   const [error, setError] = useState(null);
+  const [progress, setProgress] = useState(null);
   
   // Model parameters
   const [params, setParams] = useState({
@@ -128,14 +129,45 @@ const ModelSelection = ({ splitData, onTrainSuccess, trainingResults }) => {
         params: modelParams,
       });
 
-      if (response.data.success) {
-        onTrainSuccess(response.data);
+      // Training runs as a background job; poll until it finishes.
+      // A configuration trained before comes back already done.
+      const jobId = response.data.jobId;
+      let result = null;
+      let delay = response.data.status === 'done' ? 0 : 1000;
+      while (!result) {
+        await new Promise((resolve) => setTimeout(resolve, delay));
+        delay = 1000;
+        const status = await axios.get(`/api/jobs/${jobId}`);
+        setProgress(status.data.progress);
+        if (['done', 'failed', 'cancelled'].includes(status.data.status)) {
+          result = await axios.get(`/api/jobs/${jobId}/result`);
+        }
+      }
+
+      if (result.data.success) {
+        onTrainSuccess(result.data);
       }
     } catch (err) {
       setError(err.response?.data?.error || 'Training failed. Please try again.');
     } finally {
       setIsTraining(false);
+      setProgress(null);
+    }
+  };
+
+  const describeProgress = () => {
+    const name = selectedModelInfo?.name;
+    if (!progress) return `Training ${name}...`;
+    if (progress.stage === 'cross_validation' && progress.cvFolds) {
+      return `Cross-validating (fold ${progress.cvFold} of ${progress.cvFolds})...`;
+    }
+    if (progress.estimatorsTotal) {
+      return `Training ${name} (${progress.estimatorsDone} of ${progress.estimatorsTotal} estimators)...`;
+    }
+    if (progress.batchesTotal && progress.stage === 'fit') {
+      return `Training ${name} (batch ${progress.batchesDone} of ${progress.batchesTotal})...`;
     }
+    return `Training ${name}...`;
   };
 
   const renderModelParams = () => {
@@ -487,7 +519,7 @@ const ModelSelection = ({ splitData, onTrainSuccess, trainingResults }) => {
           {isTraining ? (
             <>
               <span className="spinner"></span>
-              Training {selectedModelInfo?.name}...
+              {describeProgress()}
             </>
           ) : (
             <>
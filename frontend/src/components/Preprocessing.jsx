@@ -7,6 +7,7 @@ import axios from 'axios';
 const Preprocessing = ({ uploadedData, onPreprocessSuccess, preprocessedData }) => {
   const [scalingMethod, setScalingMethod] = useState('standard');
   const [handleMissing, setHandleMissing] = useState('auto');
+  const [encoding, setEncoding] = useState('auto');
   const [selectedFeatures, setSelectedFeatures] = useState([]);
   const [targetColumn, setTargetColumn] = useState('');
   const [isProcessing, setIsProcessing] = useState(false);
@@ -76,6 +77,7 @@ const Preprocessing = ({ uploadedData, onPreprocessSuccess, preprocessedData })
       const response = await axios.post('/api/preprocess', {
         scalingMethod,
         handleMissing,
+        encoding,
         selectedFeatures: autoSelect ? [] : selectedFeatures,
         targetColumn,
         autoSelect
@@ -436,7 +438,7 @@ const Preprocessing = ({ uploadedData, onPreprocessSuccess, preprocessedData })
                   </select>
                 </div>
 
-                <div className="form-group" style={{ marginBottom: 0 }}>
+                <div className="form-group" style={{ marginBottom: '12px' }}>
                   <label>Handle Missing Values</label>
                   <select value={handleMissing} onChange={(e) => setHandleMissing(e.target.value)}>
                     <option value="auto">Auto (Smart handling)</option>
@@ -445,6 +447,20 @@ const Preprocessing = ({ uploadedData, onPreprocessSuccess, preprocessedData })
                     <option value="mode">Fill with Mode</option>
                     <option value="zero">Fill with Zero</option>
                     <option value="drop">Drop rows with missing values</option>
+                    <option value="knn">KNN Imputation (slower)</option>
+                    <option value="iterative">Iterative Imputation (slower)</option>
+                  </select>
+                </div>
+
+                <div className="form-group" style={{ marginBottom: 0 }}>
+                  <label>Categorical Encoding</label>
+                  <select value={encoding} onChange={(e) => setEncoding(e.target.value)}>
+                    <option value="auto">Auto (Label, hashing for text columns)</option>
+                    <option value="label">Label Encoding</option>
+                    <option value="onehot">One-Hot Encoding (low cardinality)</option>
+                    <option value="frequency">Frequency Encoding</option>
+                    <option value="target">Target Encoding (out-of-fold)</option>
+                    <option value="hashing">Feature Hashing (high cardinality)</option>
                   </select>
                 </div>
               </div>
@@ -34,9 +34,7 @@ const Results = ({ trainingResults }) => {
 
   const { 
     metrics, 
-    confusionMatrixImage, 
-    featureImportanceImage, 
-    coefficientsImage, 
+    plots = {},
     modelType,
     modelDisplayName,
     numClasses,
@@ -48,6 +46,11 @@ const Results = ({ trainingResults }) => {
     coefficients
   } = trainingResults;
 
+  // Plots are PNGs served by the backend per stored model
+  const confusionMatrixImage = plots.confusionMatrix;
+  const featureImportanceImage = plots.featureImportance;
+  const coefficientsImage = plots.coefficients;
+
   const getAccuracyStatus = (accuracy) => {
     if (accuracy >= 0.9) return { label: 'Excellent', color: '#059669', bg: '#ecfdf5', icon: '🏆' };
     if (accuracy >= 0.8) return { label: 'Good', color: '#2563eb', bg: '#eff6ff', icon: '👍' };
@@ -963,7 +966,7 @@ const Results = ({ trainingResults }) => {
                     alignItems: 'center'
                   }}>
                     <img 
-                      src={`data:image/png;base64,${confusionMatrixImage}`}
+                      src={confusionMatrixImage}
                       alt="Confusion Matrix"
                       style={{ maxWidth: '100%', height: 'auto', borderRadius: '8px' }}
                     />
@@ -1032,7 +1035,7 @@ const Results = ({ trainingResults }) => {
                   justifyContent: 'center'
                 }}>
                   <img 
-                    src={`data:image/png;base64,${featureImportanceImage}`}
+                    src={featureImportanceImage}
                     alt="Feature Importance"
                     style={{ maxWidth: '100%', height: 'auto', borderRadius: '8px' }}
                   />
@@ -1105,7 +1108,7 @@ const Results = ({ trainingResults }) => {
                   justifyContent: 'center'
                 }}>
                   <img 
-                    src={`data:image/png;base64,${coefficientsImage}`}
+                    src={coefficientsImage}
                     alt="Coefficients"
                     style={{ maxWidth: '100%', height: 'auto', borderRadius: '8px' }}
                   />